@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Columnar Parquet cache for repeated profiling runs on large CSVs.
+
+What it does
+------------
+- Streams a CSV ONCE (pyarrow's incremental reader) into a partitioned Parquet
+  dataset next to it: <stem>_parquet/part-00000.parquet, part-00001.parquet, ...
+- Every column is stored as a string, so leading zeros and formatting survive.
+- Malformed rows are handled like the uncached pandas passes
+  (on_bad_lines="skip"): rows with too many fields are dropped, short rows are
+  kept and padded with empty strings at their place in the file.
+- The sniffed encoding/delimiter/quotechar/header flag and the source file's
+  size + mtime are stored in the Parquet schema metadata.
+- The cache does not depend on the tool that built it: columns are stored
+  under positional names (column_1, column_2, ...), and the raw first record
+  is kept in the metadata ("header") instead of in the data. Each tool derives
+  its own column names from it, and a tool that reads the first record as data
+  (has_header False) puts it back in front of the cached rows.
+- csv_uniques.py and csv_preview.py (USE_PARQUET_CACHE = True) reuse a valid
+  cache instead of re-detecting and re-parsing the CSV; they read only the
+  columns/rows they need.
+- The cache is invalid as soon as the source size or mtime changes; it is then
+  rebuilt on the next opt-in run.
+
+Run this file directly to (re)build the cache for INPUT_CSV and print
+per-column stats (non-empty count, distinct count) straight from Parquet.
+"""
+
+from __future__ import annotations
+
+import csv
+import heapq
+import io
+import json
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:
+    print("The Parquet cache requires the 'pyarrow' package. Install it with: pip install pyarrow")
+    sys.exit(1)
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    print("This script requires the 'tqdm' package for progress bars. Install it with: pip install tqdm")
+    sys.exit(1)
+
+# ========= USER PARAMETER: set your input CSV path here =========
+INPUT_CSV = r"C:\Users\arsha\Desktop\idea_20\data\process_3_merged_unified_crs\observations_1901_2025_all_unified_crs.csv"
+# ================================================================
+
+# ---------- Configs you can tweak if needed ----------
+ROWS_PER_PART = 5_000_000             # rows per Parquet file in the dataset
+ROW_GROUP_ROWS = 1_000_000            # rows per row group inside each file
+READ_BLOCK_BYTES = 64 * 1024 * 1024   # pyarrow CSV streaming block size
+META_KEY = b"csv_cache"               # schema-metadata key holding the JSON info
+CACHE_VERSION = 2
+HEADER_SNIFF_BYTES = 2_000_000     # sample used when the caller does not pass has_header
+# ----------------------------------------------------
+
+
+def build_cache_dir(csv_path: Path) -> Path:
+    """Same folder, '<stem>_parquet' directory."""
+    return csv_path.with_name(f"{csv_path.stem}_parquet")
+
+
+def source_signature(csv_path: Path) -> Dict[str, int]:
+    st = csv_path.stat()
+    return {"source_size": st.st_size, "source_mtime_ns": st.st_mtime_ns}
+
+
+def load_cache_info(csv_path: Path) -> Optional[dict]:
+    """
+    Return the stored cache info if a cache exists AND still matches the
+    source size + mtime; otherwise None.
+    """
+    cache_dir = build_cache_dir(csv_path)
+    parts = sorted(cache_dir.glob("part-*.parquet"))
+    if not parts:
+        return None
+    try:
+        meta = pq.read_schema(parts[0]).metadata or {}
+        info = json.loads(meta[META_KEY].decode("utf-8"))
+    except Exception:
+        return None
+    if info.get("version") != CACHE_VERSION:
+        return None
+    if any(info.get(k) != v for k, v in source_signature(csv_path).items()):
+        return None
+    info["parts"] = [str(p) for p in parts]
+    return info
+
+
+def storage_columns(n_columns: int) -> List[str]:
+    """Positional column names used inside the Parquet dataset."""
+    return [f"column_{i + 1}" for i in range(n_columns)]
+
+
+def read_first_record(csv_path: Path, encoding: str, delimiter: str, quotechar: str = '"') -> List[str]:
+    """The raw first record (header or first data row), quote-aware."""
+    try:
+        csv.field_size_limit(10**9)
+    except OverflowError:
+        csv.field_size_limit(2_147_483_647)
+    with open(csv_path, "r", encoding=encoding, errors="replace", newline="") as f:
+        reader = csv.reader(f, delimiter=delimiter, quotechar=quotechar or '"',
+                            quoting=csv.QUOTE_MINIMAL if quotechar else csv.QUOTE_NONE)
+        return next(reader, [])
+
+
+def sniff_has_header(csv_path: Path, encoding: str) -> bool:
+    """csv.Sniffer's header guess (the csv_preview.py rule); True if it cannot tell."""
+    try:
+        with open(csv_path, "r", encoding=encoding, errors="replace", newline="") as f:
+            return csv.Sniffer().has_header(f.read(HEADER_SNIFF_BYTES))
+    except Exception:
+        return True
+
+
+def with_short_rows(batches: Iterable[pa.RecordBatch], invalid: Dict[int, Optional[List[str]]],
+                    schema: pa.Schema, first_record: int = 2) -> Iterator[pa.Table]:
+    """
+    One table per reader batch, with the rows the reader rejected put back at
+    their record numbers. `invalid` maps a record number (1-based, as pyarrow
+    counts them) to the padded fields of a short row, or None for a row with
+    too many fields (dropped). The reader reports a batch's rejected rows
+    before it yields the batch, so every gap is known when it is reached.
+    """
+    def row_batch(fields):
+        return pa.RecordBatch.from_arrays([pa.array([v], pa.string()) for v in fields], schema=schema)
+
+    pending: List[int] = []
+    record = first_record
+    for batch in batches:
+        for number in invalid.keys() - set(pending):
+            heapq.heappush(pending, number)
+        pieces = []
+        pos = 0
+        while pos < batch.num_rows or (pending and pending[0] == record):
+            if pending and pending[0] == record:
+                fields = invalid.pop(heapq.heappop(pending))
+                if fields is not None:
+                    pieces.append(row_batch(fields))
+                record += 1
+                continue
+            take = batch.num_rows - pos
+            if pending:
+                take = min(take, pending[0] - record)
+            pieces.append(batch.slice(pos, take))
+            pos += take
+            record += take
+        yield pa.Table.from_batches(pieces, schema=schema)
+    # Rejected rows after the last accepted one
+    tail = [invalid[n] for n in sorted(invalid) if invalid[n] is not None]
+    if tail:
+        yield pa.Table.from_batches([row_batch(fields) for fields in tail], schema=schema)
+
+
+def build_parquet_cache(
+    csv_path: Path,
+    encoding: str,
+    delimiter: str,
+    quotechar: str = '"',
+    has_header: Optional[bool] = None,
+) -> dict:
+    """
+    Stream the CSV once into the Parquet dataset (all columns as strings) and
+    return its cache info. The first record goes to info["header"], the rest
+    to the parts under storage_columns() names. `has_header` (sniffed here if
+    None) is only recorded; it does not change what is stored.
+    """
+    header = read_first_record(csv_path, encoding, delimiter, quotechar)
+    if not header:
+        raise ValueError("No columns detected in the input CSV (empty first record).")
+    if has_header is None:
+        has_header = sniff_has_header(csv_path, encoding)
+    columns = storage_columns(len(header))
+
+    cache_dir = build_cache_dir(csv_path)
+    tmp_dir = cache_dir.with_name(cache_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    tmp_dir.mkdir(parents=True)
+
+    info = {
+        "version": CACHE_VERSION,
+        "encoding": encoding,
+        "delimiter": delimiter,
+        "quotechar": quotechar,
+        "has_header": bool(has_header),
+        "header": list(header),
+        "columns": columns,
+        **source_signature(csv_path),
+    }
+    schema = pa.schema([pa.field(c, pa.string()) for c in columns])
+    schema = schema.with_metadata({META_KEY: json.dumps(info).encode("utf-8")})
+
+    # Rejected rows by record number: short rows re-parsed and padded, long rows None
+    invalid: Dict[int, Optional[List[str]]] = {}
+    unplaced = 0
+
+    def on_invalid_row(row) -> str:
+        nonlocal unplaced
+        if row.number is None:
+            unplaced += 1
+        elif row.actual_columns > row.expected_columns:
+            invalid[row.number] = None
+        else:
+            reader = csv.reader(io.StringIO(row.text, newline=""), delimiter=delimiter,
+                                quotechar=quotechar or '"',
+                                quoting=csv.QUOTE_MINIMAL if quotechar else csv.QUOTE_NONE)
+            fields = next(reader, [])[:row.expected_columns]
+            invalid[row.number] = fields + [""] * (row.expected_columns - len(fields))
+        return "skip"
+
+    source = open(csv_path, "rb")
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(
+            encoding=encoding,
+            column_names=columns,
+            skip_rows=1,  # the first record lives in info["header"]
+            block_size=READ_BLOCK_BYTES,
+        ),
+        parse_options=pacsv.ParseOptions(
+            delimiter=delimiter,
+            quote_char=quotechar or False,
+            newlines_in_values=True,
+            invalid_row_handler=on_invalid_row,
+        ),
+        convert_options=pacsv.ConvertOptions(
+            column_types={c: pa.string() for c in columns},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+    part_idx = 0
+    rows_in_part = 0
+    total_rows = 0
+    writer = None
+    file_size = csv_path.stat().st_size
+    try:
+        with tqdm(total=file_size, unit="B", unit_scale=True, unit_divisor=1024,
+                  desc="Building Parquet cache") as pbar:
+            batches = (pa.RecordBatch.from_arrays(b.columns, schema=schema) for b in reader)
+            for table in with_short_rows(batches, invalid, schema):
+                if writer is None or rows_in_part >= ROWS_PER_PART:
+                    if writer is not None:
+                        writer.close()
+                        part_idx += 1
+                    writer = pq.ParquetWriter(tmp_dir / f"part-{part_idx:05d}.parquet", schema)
+                    rows_in_part = 0
+                writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+                rows_in_part += table.num_rows
+                total_rows += table.num_rows
+                # Byte progress (approximate: the reader reads ahead)
+                pbar.update(min(file_size, source.tell()) - pbar.n)
+            pbar.update(file_size - pbar.n)
+        if unplaced:
+            tqdm.write(f"{unplaced} malformed row(s) without a record number were skipped.")
+        if writer is None:
+            # Single-record CSV: still write an empty part so the metadata is stored
+            writer = pq.ParquetWriter(tmp_dir / f"part-{part_idx:05d}.parquet", schema)
+            writer.write_table(schema.empty_table())
+    finally:
+        if writer is not None:
+            writer.close()
+        source.close()
+
+    if cache_dir.exists():
+        shutil.rmtree(cache_dir)
+    os.replace(tmp_dir, cache_dir)
+
+    info = load_cache_info(csv_path)
+    if info is None:
+        raise RuntimeError(f"Parquet cache was written but could not be validated: {cache_dir}")
+    info["rows"] = total_rows
+    return info
+
+
+def iter_cached_batches(
+    info: dict,
+    columns: Optional[List[str]] = None,
+    batch_rows: int = 200_000,
+) -> Iterator[pa.RecordBatch]:
+    """
+    Yield record batches (only `columns`, storage names, in file order) from a
+    valid cache. The first record is not included (see info["header"]).
+    """
+    for part in info["parts"]:
+        pf = pq.ParquetFile(part)
+        yield from pf.iter_batches(batch_size=batch_rows, columns=columns)
+
+
+def count_cached_rows(info: dict) -> int:
+    """Rows after the first record, from Parquet footers only (no data pages read)."""
+    return sum(pq.ParquetFile(p).metadata.num_rows for p in info["parts"])
+
+
+def cached_column_stats(info: dict, columns: Optional[List[str]] = None) -> Dict[str, dict]:
+    """Per-column rows / non-empty / distinct counts, one column at a time."""
+    stats = {}
+    for col in columns or info["columns"]:
+        chunks = [b.column(0) for b in iter_cached_batches(info, [col])]
+        arr = pa.chunked_array(chunks, type=pa.string())
+        trimmed = pc.utf8_trim_whitespace(arr)
+        empty = pc.sum(pc.equal(trimmed, "")).as_py() or 0
+        stats[col] = {
+            "rows": len(arr),
+            "non_empty": len(arr) - empty,
+            "distinct": len(pc.unique(trimmed)),
+        }
+    return stats
+
+
+def main():
+    raw_path = INPUT_CSV.strip()
+    if (raw_path.startswith('"') and raw_path.endswith('"')) or (raw_path.startswith("'") and raw_path.endswith("'")):
+        raw_path = raw_path[1:-1]
+    in_path = Path(raw_path).expanduser()
+    if not in_path.exists():
+        print(f"ERROR: File not found:\n  {in_path}")
+        sys.exit(1)
+
+    info = load_cache_info(in_path)
+    if info is None:
+        # Detect with the same rules as csv_uniques.py
+        import csv_uniques
+        encoding = csv_uniques.detect_encoding(in_path)
+        delimiter = csv_uniques.sniff_delimiter(csv_uniques.get_sample_text(in_path, encoding))
+        info = build_parquet_cache(in_path, encoding, delimiter)
+    else:
+        print("Parquet cache is up to date.")
+
+    print("------------------------------------------------------------")
+    print(f"Input file        : {in_path}")
+    print(f"Cache directory   : {build_cache_dir(in_path)}")
+    print(f"Encoding          : {info['encoding']}")
+    print(f"Delimiter         : {info['delimiter']!r}")
+    print(f"Header row        : {'yes' if info['has_header'] else 'no (first record is data)'}")
+    print(f"Rows              : {count_cached_rows(info)} (after the first record)")
+    print("------------------------------------------------------------")
+    print("Column stats:")
+    for name, (col, st) in zip(info["header"], cached_column_stats(info).items()):
+        print(f"  - {name or col}: {st['non_empty']} non-empty, {st['distinct']} distinct")
+
+
+if __name__ == "__main__":
+    main()
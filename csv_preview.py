@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 """
-Create a CSV "preview" file (header + first N data rows) with robust handling and progress bars.
+Create a CSV "preview" file (header + N data rows) with robust handling and progress bars.
 
 What it does
 ------------
@@ -11,12 +11,33 @@ What it does
 - Writes a preview CSV in the same folder with suffix "_preview" before the extension.
 - Keeps original header (if present) and writes up to PREVIEW_ROWS data rows.
 - Shows a tqdm progress bar over rows written, with live byte progress in the postfix.
+- PREVIEW_MODE picks which rows are previewed, without scanning the whole file:
+    "head"   : first PREVIEW_ROWS rows (default)
+    "sample" : PREVIEW_ROWS random rows; "seek" jumps to random byte offsets and
+               resyncs to the next record boundary (O(k) reads; rows are
+               length-weighted), "reservoir" streams once for an exactly
+               uniform sample
+    "tail"   : last PREVIEW_ROWS rows, read backwards in blocks from EOF
+    "offset" : PREVIEW_ROWS rows centred on byte PREVIEW_OFFSET_BYTES
+  Non-head previews get "_preview_<mode>" as suffix.
 
 Notes
 -----
 - Writer uses the *detected input dialect* so the delimiter/quoting match the source.
 - Output is encoded as UTF-8 with BOM ("utf-8-sig") for Excel compatibility.
 - If the file ends before PREVIEW_ROWS, the progress bar is finalized to the actual total.
+- Byte seeking needs an ASCII-compatible encoding (utf-8, cp1252, latin-1); for
+  UTF-16/32 files "sample" and "tail" fall back to a single streamed pass.
+- Record boundaries after a seek are found with quote parity (as in
+  csv_row_count.py): the quote state at the seek offset is unknown, so the
+  record breaks are worked out for both states, and a state is accepted when
+  the next few records each parse strictly as one record with the header's
+  field count. A wrong state cuts inside quoted fields and fails that check.
+- With USE_PARQUET_CACHE = True the preview is served from the string-typed
+  Parquet cache built by csv_parquet_cache.py (built on first use); while the
+  source size + mtime are unchanged, no detection or CSV parsing happens.
+  Cached rows are normalised like the pandas passes of csv_uniques.py: rows
+  with too many fields are dropped and short rows padded with empty fields.
 """
 
 from __future__ import annotations
@@ -24,9 +45,14 @@ from __future__ import annotations
 import csv
 import io
 import os
+import random
 import sys
+from collections import deque
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
+
+from csv_row_count import find_record_start, is_single_record
+from text_encoding import detect_file_encoding, is_seekable_encoding
 
 # Progress bars
 try:
@@ -45,56 +71,34 @@ SNIFF_SAMPLE_BYTES = 2_000_000
 ENCODING_SAMPLE_BYTES = 2_000_000
 DELIMITER_CANDIDATES = [",", "\t", ";", "|", "^", "~"]
 ROWCOUNT_READ_BLOCK_BYTES = 64 * 1024 * 1024  # used only for optional fast row counting (currently not used)
+USE_PARQUET_CACHE = False  # serve the preview from <stem>_parquet (needs pyarrow)
+PREVIEW_MODE = "head"      # "head" | "sample" | "tail" | "offset" (see module docstring)
+SAMPLE_METHOD = "seek"     # "seek" (O(k) random seeks) | "reservoir" (one streamed pass, exact)
+SAMPLE_SEED = 42           # fixed seed -> reproducible samples
+PREVIEW_OFFSET_BYTES = 0   # centre of the "offset" preview
+SEEK_BLOCK_BYTES = 64 * 1024  # bytes read per seek / backward step (doubles when rows are wider)
+RESYNC_CHECK_RECORDS = 3   # records that must parse cleanly to accept a boundary
 # --------------------------------------
 
 
-def build_output_path(input_path: Path) -> Path:
-    """Same folder, add '_preview' before the full extension chain."""
+def build_output_path(input_path: Path, mode: str = "head") -> Path:
+    """Same folder, add '_preview' (or '_preview_<mode>') before the full extension chain."""
     stem = input_path.stem
     suffix = "".join(input_path.suffixes) or ".csv"
-    return input_path.with_name(f"{stem}_preview{suffix}")
+    tag = "_preview" if mode == "head" else f"_preview_{mode}"
+    return input_path.with_name(f"{stem}{tag}{suffix}")
 
 
 def detect_encoding(path: Path, sample_bytes: int = ENCODING_SAMPLE_BYTES) -> str:
     """
-    Detect a reasonable text encoding for CSV reading.
+    Detect a reasonable text encoding for CSV reading (shared text_encoding layer).
     Priority:
       1) BOM-based detection (UTF-8-SIG, UTF-16 LE/BE, UTF-32 LE/BE)
       2) Try 'utf-8'
       3) Try 'cp1252'
       4) Fallback 'latin-1'
     """
-    with open(path, "rb") as fb:
-        raw = fb.read(sample_bytes)
-
-    # BOM checks
-    if raw.startswith(b"\xef\xbb\xbf"):
-        return "utf-8-sig"
-    if raw.startswith(b"\xff\xfe\x00\x00"):
-        return "utf-32-le"
-    if raw.startswith(b"\x00\x00\xfe\xff"):
-        return "utf-32-be"
-    if raw.startswith(b"\xff\xfe"):
-        return "utf-16-le"
-    if raw.startswith(b"\xfe\xff"):
-        return "utf-16-be"
-
-    # Try utf-8 strict
-    try:
-        raw.decode("utf-8")
-        return "utf-8"
-    except UnicodeDecodeError:
-        pass
-
-    # Try cp1252
-    try:
-        raw.decode("cp1252")
-        return "cp1252"
-    except UnicodeDecodeError:
-        pass
-
-    # Last resort
-    return "latin-1"
+    return detect_file_encoding(path, ["utf-8", "cp1252"], sample_bytes, fallback="latin-1")
 
 
 def sniff_dialect_and_header(path: Path, encoding: str, sample_bytes: int = SNIFF_SAMPLE_BYTES) -> tuple[csv.Dialect, bool]:
@@ -126,6 +130,65 @@ def increase_field_size_limit() -> None:
         csv.field_size_limit(2_147_483_647)
 
 
+def get_parquet_cache(input_csv_path: Path) -> dict:
+    """Load a valid Parquet cache for the CSV, building it first if needed."""
+    from csv_parquet_cache import build_parquet_cache, load_cache_info
+
+    info = load_cache_info(input_csv_path)
+    if info is not None:
+        return info
+
+    enc = detect_encoding(input_csv_path)
+    dialect, has_header = sniff_dialect_and_header(input_csv_path, enc)
+    return build_parquet_cache(
+        input_csv_path,
+        encoding=enc,
+        delimiter=dialect.delimiter,
+        quotechar=dialect.quotechar or '"',
+        has_header=has_header,
+    )
+
+
+def create_csv_preview_from_cache(input_csv_path: Path, info: dict, preview_rows: int = PREVIEW_ROWS) -> Path:
+    """
+    Write the preview from the Parquet cache (reads only the first row groups).
+    The first record (info["header"]) is written as the header, or as the
+    first data row when the file has no header.
+    """
+    from csv_parquet_cache import iter_cached_batches
+
+    output_path = build_output_path(input_csv_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    class CachedDialect(csv.excel):
+        delimiter = info["delimiter"]
+        quotechar = info["quotechar"] or '"'
+
+    limit = int(preview_rows)
+    with open(output_path, "w", encoding="utf-8-sig", newline="") as fout, \
+            tqdm(total=limit, unit="row", desc="Writing preview (Parquet cache)", leave=True) as pbar:
+        writer = csv.writer(fout, CachedDialect)
+        rows_written = 0
+        if info["has_header"]:
+            writer.writerow(info["header"])
+        elif limit > 0:
+            writer.writerow(info["header"])
+            rows_written = 1
+            pbar.update(1)
+        for batch in iter_cached_batches(info, batch_rows=max(1, min(limit, 65_536))):
+            if rows_written >= limit:
+                break
+            take = batch.slice(0, limit - rows_written)
+            writer.writerows(zip(*(col.to_pylist() for col in take.columns)))
+            rows_written += take.num_rows
+            pbar.update(take.num_rows)
+        if rows_written < limit:
+            pbar.total = rows_written
+            pbar.refresh()
+
+    return output_path
+
+
 def create_csv_preview(input_csv_path: Path, preview_rows: int = PREVIEW_ROWS) -> Path:
     """
     Create a CSV preview with the same header/columns (if present), limited to `preview_rows` data rows.
@@ -219,6 +282,230 @@ def create_csv_preview(input_csv_path: Path, preview_rows: int = PREVIEW_ROWS) -
     return output_path
 
 
+# -----------------------------------------------------------------------------
+#  Seek-based previews (sample / tail / offset)
+# -----------------------------------------------------------------------------
+
+def parse_records(data: bytes, encoding: str, dialect, complete: bool,
+                  limit: Optional[int] = None) -> List[list]:
+    """
+    Parse raw bytes into CSV records (at most `limit`). Unless `complete` (the
+    bytes end on a record boundary / EOF), the last record may be cut off and
+    is dropped.
+    """
+    text = data.decode(encoding, errors="replace")
+    reader = csv.reader(io.StringIO(text, newline=""), dialect)
+    if limit is None:
+        rows = list(reader)
+    else:
+        # One extra row tells whether the last kept row is complete
+        rows = []
+        try:
+            for row in reader:
+                rows.append(row)
+                if len(rows) > limit:
+                    return rows[:limit]
+        except csv.Error:
+            pass  # bad quoting in a cut-off tail
+    if not complete and rows:
+        rows.pop()
+    return rows
+
+
+def first_record_end(path: Path, dialect) -> int:
+    """Byte offset just past the first record (quote-aware), i.e. the data start."""
+    quote = ord((getattr(dialect, "quotechar", None) or '"')[0])
+    newline = ord("\n")
+    in_quotes = False
+    pos = 0
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(SEEK_BLOCK_BYTES)
+            if not block:
+                return pos
+            for i, b in enumerate(block):
+                if b == quote:
+                    in_quotes = not in_quotes
+                elif b == newline and not in_quotes:
+                    return pos + i + 1
+            pos += len(block)
+
+
+def resync_to_record(f, offset: int, end: int, encoding: str, dialect, n_fields: Optional[int]) -> int:
+    """
+    First record start at or after `offset` (and before `end`), by quote
+    parity (csv_row_count.find_record_start): a state is accepted when the
+    next records each parse strictly as one record with the expected field
+    count. Falls back to the first newline if no single state is confirmed.
+    """
+    quote = ord((getattr(dialect, "quotechar", None) or '"')[0])
+
+    def accept(piece: bytes) -> bool:
+        return is_single_record(piece, encoding, n_fields, dialect)
+
+    start = find_record_start(f, offset, end, quote, accept, RESYNC_CHECK_RECORDS, SEEK_BLOCK_BYTES)
+    if start is not None:
+        return start
+    pos = offset
+    while pos < end:
+        f.seek(pos)
+        data = f.read(min(SEEK_BLOCK_BYTES, end - pos))
+        nl = data.find(b"\n")
+        if nl != -1:
+            return pos + nl + 1
+        pos += len(data)
+    return end
+
+
+def read_records_from(f, start: int, end: int, n: int, encoding: str, dialect) -> List[list]:
+    """Up to n records starting at byte `start` (a record boundary)."""
+    block = SEEK_BLOCK_BYTES
+    while True:
+        f.seek(start)
+        data = f.read(min(block, end - start))
+        complete = start + len(data) >= end
+        rows = parse_records(data, encoding, dialect, complete=complete, limit=n)
+        if len(rows) >= n or complete:
+            return rows
+        block *= 2
+
+
+def read_records_before(f, end: int, n: int, data_start: int, encoding: str, dialect,
+                        n_fields: Optional[int]) -> List[list]:
+    """
+    The last n records ending at byte `end` (a record boundary), reading
+    backwards in growing blocks and resyncing on record boundaries.
+    """
+    block = SEEK_BLOCK_BYTES
+    while True:
+        start = max(data_start, end - block)
+        if start > data_start:
+            start = resync_to_record(f, start, end, encoding, dialect, n_fields)
+        f.seek(start)
+        rows = parse_records(f.read(end - start), encoding, dialect, complete=True)
+        if len(rows) >= n or start <= data_start:
+            return rows[-n:] if n else []
+        block *= 2
+
+
+def stream_records(path: Path, encoding: str, dialect, has_header: bool):
+    """Yield data records in one streamed pass (fallback for non-seekable encodings)."""
+    with open(path, "r", encoding=encoding, errors="replace", newline="") as f:
+        reader = csv.reader(f, dialect)
+        if has_header:
+            next(reader, None)
+        yield from reader
+
+
+def sample_records(path: Path, n: int, encoding: str, dialect, has_header: bool,
+                   n_fields: Optional[int], method: str = SAMPLE_METHOD, seed: int = SAMPLE_SEED) -> List[list]:
+    """n random data records, returned in file order."""
+    rng = random.Random(seed)
+    if method == "reservoir" or not is_seekable_encoding(encoding):
+        # Algorithm R: exactly uniform, one streamed pass
+        reservoir = []
+        for i, row in enumerate(tqdm(stream_records(path, encoding, dialect, has_header),
+                                     unit="row", desc="Sampling (reservoir)")):
+            if i < n:
+                reservoir.append((i, row))
+            else:
+                j = rng.randint(0, i)
+                if j < n:
+                    reservoir[j] = (i, row)
+        return [row for _, row in sorted(reservoir, key=lambda t: t[0])]
+
+    size = os.path.getsize(path)
+    data_start = first_record_end(path, dialect) if has_header else 0
+    if data_start >= size:
+        return []
+    picked = {}
+    attempts = 0
+    with open(path, "rb") as f, tqdm(total=n, unit="row", desc="Sampling (seek)") as pbar:
+        # Random offsets; duplicates (same record hit twice) are retried a few times
+        while len(picked) < n and attempts < n * 4:
+            attempts += 1
+            offset = rng.randrange(data_start, size)
+            if offset == data_start:
+                start = data_start
+            else:
+                start = resync_to_record(f, offset - 1, size, encoding, dialect, n_fields)
+            if start >= size or start in picked:
+                continue
+            rows = read_records_from(f, start, size, 1, encoding, dialect)
+            if rows:
+                picked[start] = rows[0]
+                pbar.update(1)
+    return [picked[k] for k in sorted(picked)]
+
+
+def tail_records(path: Path, n: int, encoding: str, dialect, has_header: bool,
+                 n_fields: Optional[int]) -> List[list]:
+    """The last n data records."""
+    if not is_seekable_encoding(encoding):
+        return list(deque(stream_records(path, encoding, dialect, has_header), maxlen=n))
+    size = os.path.getsize(path)
+    data_start = first_record_end(path, dialect) if has_header else 0
+    with open(path, "rb") as f:
+        return read_records_before(f, size, n, data_start, encoding, dialect, n_fields)
+
+
+def records_around_offset(path: Path, offset: int, n: int, encoding: str, dialect, has_header: bool,
+                          n_fields: Optional[int]) -> List[list]:
+    """About n data records centred on byte `offset` (topped up from the other side near either end)."""
+    if not is_seekable_encoding(encoding):
+        raise ValueError(f"Offset previews need an ASCII-compatible encoding, not {encoding!r}.")
+    size = os.path.getsize(path)
+    data_start = first_record_end(path, dialect) if has_header else 0
+    offset = min(max(offset, data_start), size)
+    with open(path, "rb") as f:
+        start = offset if offset == data_start else resync_to_record(f, offset - 1, size, encoding, dialect, n_fields)
+        after = read_records_from(f, start, size, n - n // 2, encoding, dialect) if start < size else []
+        before = read_records_before(f, start, n - len(after), data_start, encoding, dialect, n_fields) if start > data_start else []
+        if len(before) + len(after) < n and start < size:
+            after = read_records_from(f, start, size, n - len(before), encoding, dialect)
+    return before + after
+
+
+def create_csv_preview_mode(input_csv_path: Path, mode: str, preview_rows: int = PREVIEW_ROWS) -> Path:
+    """
+    Write a "sample", "tail" or "offset" preview (see PREVIEW_MODE) to
+    <same folder>/<original_stem>_preview_<mode><original_suffix>.
+    """
+    if not input_csv_path.exists():
+        raise FileNotFoundError(f"Input CSV not found: {input_csv_path}")
+
+    output_path = build_output_path(input_csv_path, mode)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    increase_field_size_limit()
+
+    enc = detect_encoding(input_csv_path)
+    dialect, has_header = sniff_dialect_and_header(input_csv_path, enc)
+    with open(input_csv_path, "r", encoding=enc, errors="replace", newline="") as f:
+        first_row = next(csv.reader(f, dialect), None)
+    if first_row is None:
+        return output_path
+    n_fields = len(first_row)
+    n = int(preview_rows)
+
+    if mode == "sample":
+        rows = sample_records(input_csv_path, n, enc, dialect, has_header, n_fields)
+    elif mode == "tail":
+        rows = tail_records(input_csv_path, n, enc, dialect, has_header, n_fields)
+    elif mode == "offset":
+        rows = records_around_offset(input_csv_path, PREVIEW_OFFSET_BYTES, n, enc, dialect, has_header, n_fields)
+    else:
+        raise ValueError(f"Unknown PREVIEW_MODE: {mode!r}")
+
+    with open(output_path, "w", encoding="utf-8-sig", newline="") as fout:
+        writer = csv.writer(fout, dialect)
+        if has_header:
+            writer.writerow(first_row)
+        for row in tqdm(rows, unit="row", desc=f"Writing preview ({mode})"):
+            writer.writerow(row)
+
+    return output_path
+
+
 def main():
     # Only input is the CSV path constant at the top
     raw_path = INPUT_CSV.strip()
@@ -232,23 +519,39 @@ def main():
         print("ERROR: File not found.")
         sys.exit(1)
 
-    enc = detect_encoding(in_path)
-    dialect, has_header = sniff_dialect_and_header(in_path, enc)
-    out_path = build_output_path(in_path)
+    cache_info = None
+    if USE_PARQUET_CACHE:
+        try:
+            cache_info = get_parquet_cache(in_path)
+        except Exception as e:
+            tqdm.write("Failed to build/load the Parquet cache.")
+            tqdm.write(f"Reason: {e}")
+            sys.exit(1)
+        enc, delimiter, has_header = cache_info["encoding"], cache_info["delimiter"], cache_info["has_header"]
+    else:
+        enc = detect_encoding(in_path)
+        dialect, has_header = sniff_dialect_and_header(in_path, enc)
+        try:
+            delimiter = getattr(dialect, "delimiter", ",")
+        except Exception:
+            delimiter = ","
+    out_path = build_output_path(in_path, PREVIEW_MODE)
 
     print(f"Detected encoding : {enc}")
-    try:
-        delimiter = getattr(dialect, "delimiter", ",")
-    except Exception:
-        delimiter = ","
     print(f"Detected delimiter: {repr(delimiter)}")
     print(f"Has header?       : {has_header}")
+    print(f"Preview mode      : {PREVIEW_MODE}")
     print(f"Preview rows      : {PREVIEW_ROWS}")
     print(f"Output file       : {out_path}")
     print("------------------------------------------------------------")
 
     try:
-        result = create_csv_preview(in_path, preview_rows=PREVIEW_ROWS)
+        if PREVIEW_MODE != "head":
+            result = create_csv_preview_mode(in_path, PREVIEW_MODE, preview_rows=PREVIEW_ROWS)
+        elif cache_info is not None:
+            result = create_csv_preview_from_cache(in_path, cache_info, preview_rows=PREVIEW_ROWS)
+        else:
+            result = create_csv_preview(in_path, preview_rows=PREVIEW_ROWS)
     except Exception as e:
         tqdm.write("Failed to create preview.")
         tqdm.write(f"Reason: {e}")
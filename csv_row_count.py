@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Quote-aware CSV record counting: mmap + parallel threads, cached per file.
+
+What it does
+------------
+- Memory-maps the file and splits it into byte ranges scanned by a thread pool
+  (numpy releases the GIL in its byte-wise kernels, so threads scale).
+- Each range is summarised for BOTH possible states at its start (outside /
+  inside a quoted field): record-ending newlines, the first record break, and
+  the parity of quote characters. Chaining the summaries in file order
+  resolves the real state at every boundary, so newlines inside quoted fields
+  are never counted as rows.
+- The result is cached in a small JSON sidecar (<file>.rowcount.json) keyed by
+  file size + mtime, so repeated runs on an unchanged file cost one stat().
+- find_record_start() applies the same two-state idea after a seek: the tools
+  that jump into the middle of a file (csv_preview.py, csv_uniques.py) use it
+  to find the next record start without reading what comes before.
+
+Run this file directly to count the records of INPUT_CSV.
+"""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+import mmap
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    print("This script requires the 'numpy' package. Install it with: pip install numpy")
+    sys.exit(1)
+
+try:
+    from tqdm import tqdm
+except ImportError:
+    print("This script requires the 'tqdm' package for progress bars. Install it with: pip install tqdm")
+    sys.exit(1)
+
+# ========= USER PARAMETER: set your input CSV path here =========
+INPUT_CSV = r"C:\Users\arsha\Desktop\idea_20\data\process_3_merged_unified_crs\observations_1901_2025_all_unified_crs.csv"
+# ================================================================
+
+# ---------- Configs you can tweak if needed ----------
+ROWCOUNT_THREADS = os.cpu_count() or 1
+ROWCOUNT_RANGE_BYTES = 64 * 1024 * 1024   # bytes per scheduled range
+ROWCOUNT_BLOCK_BYTES = 8 * 1024 * 1024    # numpy working block inside a range (~5x this in RAM per thread)
+RESYNC_BLOCK_BYTES = 64 * 1024            # first read after a seek (doubles while undecided)
+RESYNC_CHECK_RECORDS = 3                  # records that must parse cleanly to accept a state
+CACHE_SUFFIX = ".rowcount.json"
+# ----------------------------------------------------
+
+NEWLINE = ord("\n")
+
+
+def scan_range(buf, start: int, end: int, quote: int) -> dict:
+    """
+    Summarise buf[start:end] for both quote states at `start`
+    (index 0 = outside quotes, 1 = inside a quoted field):
+      - newlines[h]   : record-ending newlines in the range
+      - first_break[h]: offset just past the first record-ending newline
+      - quotes        : parity (0/1) of quote characters in the range
+    """
+    first_break: List[Optional[int]] = [None, None]
+    newlines = [0, 0]
+    parity = False
+    pos = start
+    while pos < end:
+        stop = min(end, pos + ROWCOUNT_BLOCK_BYTES)
+        arr = np.frombuffer(buf, dtype=np.uint8, count=stop - pos, offset=pos)
+        # inside[i]: odd number of quotes in [start, i] -> toggled state at byte i
+        inside = np.bitwise_xor.accumulate(arr == quote)
+        if parity:
+            np.logical_not(inside, out=inside)
+        is_nl = arr == NEWLINE
+        for h, mask in ((0, is_nl & ~inside), (1, is_nl & inside)):
+            n = int(np.count_nonzero(mask))
+            if n:
+                newlines[h] += n
+                if first_break[h] is None:
+                    first_break[h] = pos + int(np.argmax(mask)) + 1
+        parity = bool(inside[-1])
+        del arr, inside, is_nl, mask
+        pos = stop
+    return {"first_break": first_break, "newlines": newlines, "quotes": int(parity)}
+
+
+def record_breaks(buf, start: int, end: int, quote: int, state: int,
+                  every: int = 1, phase: int = 0) -> np.ndarray:
+    """
+    Offsets just past the record-ending newlines in buf[start:end], given the
+    quote state at `start`. Only every `every`-th break is kept, counting from
+    local break number `phase` (so strided offsets line up across ranges).
+    """
+    out = []
+    parity = bool(state)
+    seen = 0
+    pos = start
+    while pos < end:
+        stop = min(end, pos + ROWCOUNT_BLOCK_BYTES)
+        arr = np.frombuffer(buf, dtype=np.uint8, count=stop - pos, offset=pos)
+        inside = np.bitwise_xor.accumulate(arr == quote)
+        if parity:
+            np.logical_not(inside, out=inside)
+        breaks = np.flatnonzero((arr == NEWLINE) & ~inside)
+        first = (phase - seen) % every
+        out.append(breaks[first::every].astype(np.uint64) + np.uint64(pos + 1))
+        seen += len(breaks)
+        parity = bool(inside[-1])
+        del arr, inside, breaks
+        pos = stop
+    return np.concatenate(out) if out else np.empty(0, dtype=np.uint64)
+
+
+def is_single_record(data: bytes, encoding: str, n_fields: Optional[int] = None,
+                     dialect="excel", **fmtparams) -> bool:
+    """True if `data` parses strictly as exactly one record (with n_fields fields)."""
+    text = data.decode(encoding, errors="replace")
+    try:
+        rows = list(csv.reader(io.StringIO(text, newline=""), dialect, strict=True, **fmtparams))
+    except csv.Error:
+        return False
+    return len(rows) == 1 and (n_fields is None or len(rows[0]) == n_fields)
+
+
+def find_record_start(f, offset: int, limit: int, quote: int, accept: Callable[[bytes], bool],
+                      check_records: int = RESYNC_CHECK_RECORDS, block_bytes: int = RESYNC_BLOCK_BYTES,
+                      limit_is_boundary: bool = True) -> Optional[int]:
+    """
+    First record start after byte `offset` of the open binary file `f`, found
+    without reading anything before `offset`. The quote state there is
+    unknown, so record_breaks() runs for both states over a window read at
+    `offset` (doubling up to `limit`). A state passes when accept(piece) holds
+    for the next `check_records` pieces between its breaks: breaks of the
+    wrong state fall inside quoted fields, so its pieces run over several
+    records, end in an open quote or have the wrong field count.
+
+    Returns the start of the only passing state; None if both pass
+    (ambiguous) or none is confirmed before `limit`. With `limit_is_boundary`
+    the bytes at `limit` end a record (or the file), so fewer, shorter final
+    pieces still count there.
+    """
+    block = block_bytes
+    while True:
+        f.seek(offset)
+        data = f.read(min(block, limit - offset))
+        at_limit = offset + len(data) >= limit
+        at_end = at_limit and limit_is_boundary
+        passed = []
+        for state in (0, 1):  # outside / inside a quoted field at `offset`
+            breaks = record_breaks(data, 0, len(data), quote, state).tolist()
+            if not breaks:
+                continue
+            if at_end and breaks[-1] < len(data):
+                breaks.append(len(data))  # last record without a trailing newline
+            pieces = list(zip(breaks, breaks[1:]))[:check_records]
+            if (len(pieces) == check_records or at_end) and all(accept(data[a:b]) for a, b in pieces):
+                passed.append(offset + breaks[0])
+        if len(passed) == 1:
+            return passed[0]
+        if passed or at_limit:
+            return None
+        block *= 2  # records wider than the window: look further
+
+
+def scan_ranges(file_path: Path, ranges: List[Tuple[int, int]], quotechar: str = '"',
+                n_threads: int = ROWCOUNT_THREADS, desc: Optional[str] = None) -> List[dict]:
+    """Scan several byte ranges of a file in parallel threads over one mmap."""
+    if not ranges:
+        return []
+    quote = ord(quotechar)
+    with file_path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        with ThreadPoolExecutor(max_workers=n_threads) as pool:
+            futures = [pool.submit(scan_range, mm, a, b, quote) for a, b in ranges]
+            summaries = []
+            with tqdm(total=sum(b - a for a, b in ranges), unit="B", unit_scale=True, unit_divisor=1024,
+                      desc=desc or "Counting rows (quote-aware)", leave=False) as pbar:
+                for (a, b), fut in zip(ranges, futures):
+                    summaries.append(fut.result())
+                    pbar.update(b - a)
+    return summaries
+
+
+def split_ranges(start: int, end: int, range_bytes: int = ROWCOUNT_RANGE_BYTES) -> List[Tuple[int, int]]:
+    cuts = list(range(start, end, max(1, range_bytes))) + [end]
+    return [(a, b) for a, b in zip(cuts[:-1], cuts[1:]) if b > a]
+
+
+def chain_states(summaries: List[dict], state: int = 0) -> Tuple[int, List[int]]:
+    """
+    Walk range summaries in file order. Returns (record-ending newline count,
+    quote state at the start of each range).
+    """
+    total = 0
+    states = []
+    for s in summaries:
+        states.append(state)
+        total += s["newlines"][state]
+        state = (state + s["quotes"]) % 2
+    return total, states
+
+
+def cache_path_for(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + CACHE_SUFFIX)
+
+
+def load_cached_count(file_path: Path, quotechar: str = '"') -> Optional[int]:
+    """Cached record count if size, mtime and quotechar still match."""
+    try:
+        st = file_path.stat()
+        with cache_path_for(file_path).open("r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (cached.get("size") == st.st_size and cached.get("mtime_ns") == st.st_mtime_ns
+            and cached.get("quotechar") == quotechar):
+        return int(cached["records"])
+    return None
+
+
+def save_cached_count(file_path: Path, records: int, quotechar: str = '"') -> None:
+    st = file_path.stat()
+    try:
+        with cache_path_for(file_path).open("w", encoding="utf-8") as f:
+            json.dump({"size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                       "quotechar": quotechar, "records": records}, f)
+    except OSError:
+        pass  # read-only folder: counting still works, just not cached
+
+
+def count_records(file_path: Path, quotechar: str = '"', use_cache: bool = True,
+                  n_threads: int = ROWCOUNT_THREADS) -> int:
+    """
+    Number of CSV records in the file (header included), honouring newlines
+    inside quoted fields. A final record without a trailing newline counts.
+    """
+    if use_cache:
+        cached = load_cached_count(file_path, quotechar)
+        if cached is not None:
+            return cached
+
+    size = file_path.stat().st_size
+    records = 0
+    if size:
+        summaries = scan_ranges(file_path, split_ranges(0, size), quotechar, n_threads)
+        records, _ = chain_states(summaries)
+        with file_path.open("rb") as f:
+            f.seek(size - 1)
+            if f.read(1) != b"\n":
+                records += 1
+
+    if use_cache:
+        save_cached_count(file_path, records, quotechar)
+    return records
+
+
+def main():
+    raw_path = INPUT_CSV.strip()
+    if (raw_path.startswith('"') and raw_path.endswith('"')) or (raw_path.startswith("'") and raw_path.endswith("'")):
+        raw_path = raw_path[1:-1]
+    in_path = Path(raw_path).expanduser()
+    if not in_path.exists():
+        print(f"ERROR: File not found:\n  {in_path}")
+        sys.exit(1)
+
+    records = count_records(in_path)
+    print(f"Records (incl. header): {records}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Sparse row-offset index for large CSVs: jump to any row without re-reading
+the file from the start.
+
+What it does
+------------
+- Records the byte offset of every INDEX_STRIDE-th record (quote-aware, so
+  newlines inside quoted fields never start a record) in a compact binary
+  sidecar next to the CSV: <file>.rowindex (a flat array('Q') of uint64).
+- Building reuses the mmap + thread scan of csv_row_count.py: one pass
+  resolves the quote state at every range start, a second pass collects the
+  strided record offsets. The record count is stored as well (and shared with
+  the csv_row_count.py cache).
+- The sidecar is keyed by file size + mtime + stride + quotechar; a stale one
+  is rebuilt on the next get_row_index().
+- RowIndex.offset_of(record) is exact: seek to the nearest indexed record and
+  scan at most INDEX_STRIDE records forward.
+- Rows are read with the csv_preview.py reading path (detected encoding and
+  dialect, seek + parse), so any tool can page through the file or split it
+  into exactly balanced chunks (balanced_chunks) for parallel processing.
+
+Record numbers count the header (if any) as record 0. Byte seeking needs an
+ASCII-compatible encoding (utf-8, cp1252, latin-1), as in csv_preview.py.
+
+Run this file directly to build/load the index for INPUT_CSV, print the
+balanced chunk plan and (optionally) page through the rows interactively.
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    print("This script requires the 'numpy' package. Install it with: pip install numpy")
+    sys.exit(1)
+
+from csv_preview import (
+    detect_encoding,
+    increase_field_size_limit,
+    is_seekable_encoding,
+    read_records_from,
+    sniff_dialect_and_header,
+)
+from csv_row_count import (
+    ROWCOUNT_THREADS,
+    chain_states,
+    record_breaks,
+    save_cached_count,
+    scan_ranges,
+    split_ranges,
+)
+
+# ========= USER PARAMETER: set your input CSV path here =========
+INPUT_CSV = r"C:\Users\arsha\Desktop\idea_20\data\process_3_merged_unified_crs\observations_1901_2025_all_unified_crs.csv"
+# ================================================================
+
+# ---------- Configs you can tweak if needed ----------
+INDEX_STRIDE = 10_000        # index every K-th record (8 bytes per entry)
+INDEX_SUFFIX = ".rowindex"
+N_CHUNKS = os.cpu_count() or 1   # balanced chunks printed by main()
+PAGE_ROWS = 20               # rows per page in the interactive pager
+INTERACTIVE_PAGER = False    # True -> page through rows after building the index
+# ----------------------------------------------------
+
+INDEX_MAGIC = 0x5844495744525343  # b"CSRDWIDX" (little endian)
+INDEX_VERSION = 1
+HEADER_FIELDS = 7  # magic, version, size, mtime_ns, stride, records, quote
+
+
+class RowIndex:
+    """Byte offsets of records 0, K, 2K, ... of one CSV file."""
+
+    def __init__(self, path: Path, offsets: array, stride: int, records: int, quotechar: str = '"'):
+        self.path = path
+        self.offsets = offsets
+        self.stride = stride
+        self.records = records
+        self.quotechar = quotechar
+        self.size = path.stat().st_size
+
+    def offset_of(self, record: int) -> int:
+        """Exact byte offset where `record` starts (file size for record == records)."""
+        if record < 0 or record > self.records:
+            raise IndexError(f"record {record} out of range (file has {self.records})")
+        if record == self.records:
+            return self.size
+        slot, skip = divmod(record, self.stride)
+        start = self.offsets[slot]
+        if skip == 0:
+            return start
+        end = self.offsets[slot + 1] if slot + 1 < len(self.offsets) else self.size
+        # Record starts are always outside quotes, so the scan can begin in state 0
+        with self.path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            breaks = record_breaks(mm, start, end, ord(self.quotechar), 0)
+        return int(breaks[skip - 1])
+
+    def read_records(self, first: int, n: int, encoding: str, dialect) -> List[list]:
+        """Parse n records starting at record number `first`."""
+        if not is_seekable_encoding(encoding):
+            raise ValueError(f"Row access by byte offset needs an ASCII-compatible encoding, not {encoding!r}.")
+        first = min(max(first, 0), self.records)
+        with self.path.open("rb") as f:
+            return read_records_from(f, self.offset_of(first), self.size, n, encoding, dialect)
+
+    def balanced_chunks(self, n_chunks: int, first_record: int = 0) -> List[Tuple[int, int, int, int]]:
+        """
+        Split records [first_record, records) into n_chunks runs whose record
+        counts differ by at most one. Returns (start_byte, end_byte,
+        first_record, n_records) per chunk; byte ranges are contiguous.
+        """
+        total = max(0, self.records - first_record)
+        n_chunks = max(1, min(n_chunks, total or 1))
+        bounds = [first_record + (total * i) // n_chunks for i in range(n_chunks + 1)]
+        offsets = [self.offset_of(r) for r in bounds]
+        return [(offsets[i], offsets[i + 1], bounds[i], bounds[i + 1] - bounds[i]) for i in range(n_chunks)]
+
+
+def index_path_for(file_path: Path) -> Path:
+    return file_path.with_name(file_path.name + INDEX_SUFFIX)
+
+
+def build_row_index(file_path: Path, stride: int = INDEX_STRIDE, quotechar: str = '"',
+                    n_threads: int = ROWCOUNT_THREADS) -> RowIndex:
+    """Scan the file (two mmap passes) and write the sidecar index."""
+    size = file_path.stat().st_size
+    offsets = array("Q")
+    records = 0
+    if size:
+        ranges = split_ranges(0, size)
+        summaries = scan_ranges(file_path, ranges, quotechar, n_threads, desc="Indexing rows (pass 1/2)")
+        records, states = chain_states(summaries)
+
+        # Newline m ends record m and starts record m + 1; keep those with (m + 1) % stride == 0
+        bases = []
+        seen = 0
+        for s, state in zip(summaries, states):
+            bases.append(seen)
+            seen += s["newlines"][state]
+        quote = ord(quotechar)
+        with file_path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            with ThreadPoolExecutor(max_workers=n_threads) as pool:
+                futures = [pool.submit(record_breaks, mm, a, b, quote, state, stride, (stride - 1 - base) % stride)
+                           for (a, b), state, base in zip(ranges, states, bases)]
+                parts = [np.zeros(1, dtype=np.uint64)] + [fut.result() for fut in futures]
+            last_byte = mm[size - 1:size]
+        found = np.concatenate(parts)
+        offsets.frombytes(found[found < size].tobytes())  # a break at EOF starts no record
+        if last_byte != b"\n":
+            records += 1
+
+    save_row_index(file_path, offsets, stride, records, quotechar)
+    save_cached_count(file_path, records, quotechar)
+    return RowIndex(file_path, offsets, stride, records, quotechar)
+
+
+def save_row_index(file_path: Path, offsets: array, stride: int, records: int, quotechar: str = '"') -> None:
+    st = file_path.stat()
+    data = array("Q", [INDEX_MAGIC, INDEX_VERSION, st.st_size, st.st_mtime_ns, stride, records, ord(quotechar)])
+    data.extend(offsets)
+    try:
+        with index_path_for(file_path).open("wb") as f:
+            data.tofile(f)
+    except OSError:
+        pass  # read-only folder: the in-memory index still works
+
+
+def load_row_index(file_path: Path, stride: Optional[int] = None, quotechar: str = '"') -> Optional[RowIndex]:
+    """Sidecar index if it still matches the file (and stride / quotechar); otherwise None."""
+    idx_path = index_path_for(file_path)
+    try:
+        st = file_path.stat()
+        n_items = idx_path.stat().st_size // 8
+        data = array("Q")
+        with idx_path.open("rb") as f:
+            data.fromfile(f, n_items)
+    except (OSError, EOFError):
+        return None
+    if len(data) < HEADER_FIELDS:
+        return None
+    magic, version, size, mtime_ns, k, records, quote = data[:HEADER_FIELDS]
+    if (magic != INDEX_MAGIC or version != INDEX_VERSION or size != st.st_size or mtime_ns != st.st_mtime_ns
+            or quote != ord(quotechar) or (stride is not None and k != stride)):
+        return None
+    return RowIndex(file_path, data[HEADER_FIELDS:], k, records, quotechar)
+
+
+def get_row_index(file_path: Path, stride: int = INDEX_STRIDE, quotechar: str = '"') -> RowIndex:
+    """Load the sidecar index, (re)building it when missing or stale."""
+    index = load_row_index(file_path, stride, quotechar)
+    if index is None:
+        index = build_row_index(file_path, stride, quotechar)
+    return index
+
+
+def run_pager(index: RowIndex, encoding: str, dialect, has_header: bool) -> None:
+    """Simple console pager: enter a row number to jump, blank for the next page, q to quit."""
+    first_data = 1 if has_header else 0
+    n_rows = index.records - first_data
+    row = 0
+    while True:
+        rows = index.read_records(first_data + row, PAGE_ROWS, encoding, dialect)
+        for i, r in enumerate(rows):
+            print(f"{row + i:>12}: {r}")
+        answer = input(f"[rows {row}..{row + len(rows) - 1} of {n_rows}] row number / Enter / q: ").strip()
+        if answer.lower() == "q":
+            return
+        if answer:
+            try:
+                row = min(max(int(answer), 0), max(n_rows - 1, 0))
+            except ValueError:
+                print("Not a row number.")
+        elif row + PAGE_ROWS < n_rows:
+            row += PAGE_ROWS
+
+
+def main():
+    raw_path = INPUT_CSV.strip()
+    if (raw_path.startswith('"') and raw_path.endswith('"')) or (raw_path.startswith("'") and raw_path.endswith("'")):
+        raw_path = raw_path[1:-1]
+    in_path = Path(raw_path).expanduser()
+    if not in_path.exists():
+        print(f"ERROR: File not found:\n  {in_path}")
+        sys.exit(1)
+
+    increase_field_size_limit()
+    enc = detect_encoding(in_path)
+    dialect, has_header = sniff_dialect_and_header(in_path, enc)
+    quotechar = getattr(dialect, "quotechar", None) or '"'
+    index = get_row_index(in_path, INDEX_STRIDE, quotechar)
+    first_data = 1 if has_header else 0
+
+    print("------------------------------------------------------------")
+    print(f"Input file        : {in_path}")
+    print(f"Index file        : {index_path_for(in_path)}")
+    print(f"Encoding          : {enc}")
+    print(f"Records           : {index.records} (header: {'yes' if has_header else 'no'})")
+    print(f"Stride            : {index.stride} ({len(index.offsets)} offsets)")
+    print("------------------------------------------------------------")
+    print(f"Balanced chunks ({N_CHUNKS}):")
+    for start, end, first, n in index.balanced_chunks(N_CHUNKS, first_data):
+        print(f"  rows {first - first_data:>12} .. {first - first_data + n - 1:>12}  bytes {start:>14} .. {end:>14}")
+
+    if INTERACTIVE_PAGER:
+        run_pager(index, enc, dialect, has_header)
+
+
+if __name__ == "__main__":
+    main()
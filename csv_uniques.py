@@ -9,18 +9,36 @@ What it does
 - Detects delimiter (csv.Sniffer + fallback).
 - Streams the file in chunks (so huge files are OK).
 - Shows detailed tqdm progress bars:
-    1) Optional fast pass to count total rows (by counting newlines).
+    1) Optional quote-aware row count (parallel mmap scan, cached per file).
     2) Main pass that processes rows in chunks and updates progress.
 - Writes an output CSV in the same folder with suffix "_unique_values",
   preserving original headers; each column lists only its unique values.
 - Uses the input delimiter for the output as well.
+- Optional parallel mode (USE_PARALLEL_SCAN): the file is split into
+  record-aligned byte ranges without reading it first: the reader seeks to
+  each nominal cut and resyncs to the next record start with quote parity
+  (see plan_byte_ranges), then each range is parsed by the C (or
+  pyarrow) engine in a worker process and deduplicated per column with
+  pd.unique; the per-range results are merged in file order, so the output
+  keeps first-appearance order exactly like the serial pass. UTF-16/32 files
+  cannot be split on byte offsets and always take the serial pass.
+- Optional sketch mode (SKETCH_MODE) for bounded memory on high-cardinality
+  columns: each column keeps exact values (with counts) only up to
+  SKETCH_MAX_UNIQUES; past that cap it switches to a Space-Saving top-K
+  summary, and a HyperLogLog sketch estimates its distinct count. Truncated
+  columns list their top-K most frequent values, and a companion
+  "_unique_values_summary" CSV marks which columns were truncated.
+- Optional Parquet cache (USE_PARQUET_CACHE, see csv_parquet_cache.py): the
+  first run streams the CSV into a string-typed Parquet dataset next to it;
+  later runs skip encoding/dialect detection and CSV parsing entirely while
+  the source size + mtime are unchanged.
 
 Notes
 -----
 - Everything is read as text (dtype=str) to preserve formatting like leading zeros.
 - Blank/NA values are normalized to empty string and included at most once per column.
-- Row counting is based on newline characters; if your CSV contains embedded newlines
-  inside quoted fields, the pre-count may be approximate (progress still works).
+- Row counting is quote-aware (embedded newlines inside quoted fields are not
+  counted) and cached in a "<file>.rowcount.json" sidecar keyed by size + mtime.
 """
 
 from __future__ import annotations
@@ -29,6 +47,9 @@ import os
 import sys
 import io
 import csv
+import heapq
+import math
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Tuple
 
@@ -37,6 +58,7 @@ try:
 except ImportError:
     print("This script requires the 'pandas' package. Install it with: pip install pandas")
     sys.exit(1)
+import numpy as np
 
 try:
     from tqdm import tqdm
@@ -44,6 +66,9 @@ except ImportError:
     print("This script requires the 'tqdm' package for progress bars. Install it with: pip install tqdm")
     sys.exit(1)
 
+from csv_row_count import count_records, find_record_start, is_single_record, load_cached_count, scan_ranges
+from text_encoding import detect_file_encoding, is_seekable_encoding
+
 # ========= USER PARAMETER: set your input CSV path here =========
 INPUT_CSV = r"C:\Users\arsha\Desktop\idea_20\data\process_3_merged_unified_crs\observations_1901_2025_all_unified_crs.csv"
 # ================================================================
@@ -51,23 +76,26 @@ INPUT_CSV = r"C:\Users\arsha\Desktop\idea_20\data\process_3_merged_unified_crs\o
 # ---------- Configs you can tweak if needed ----------
 CHUNK_ROWS = 200_000                       # streaming chunk size
 DELIMITER_CANDIDATES = [",", "\t", ";", "|", "^", "~"]
-ENCODING_CANDIDATES = ["utf-8-sig", "utf-8", "cp1252", "latin-1"]
+ENCODING_CANDIDATES = ["utf-8", "cp1252", "latin-1"]  # tried after the BOM check
 COUNT_TOTAL_ROWS = True                    # set False to skip pre-count pass
-ROWCOUNT_READ_BLOCK_BYTES = 64 * 1024 * 1024  # 64 MiB blocks for fast counting
+USE_PARALLEL_SCAN = True                   # set False for the single-process streaming pass
+PARALLEL_WORKERS = os.cpu_count() or 1     # worker processes for the parallel scan
+PARALLEL_RANGE_BYTES = 128 * 1024 * 1024   # target size of each parsed byte range
+PARALLEL_ENGINE = "c"                      # "c" or "pyarrow" (pyarrow skips short rows)
+RESYNC_BLOCK_BYTES = 64 * 1024             # first read at each range cut (doubles while undecided)
+RESYNC_CHECK_RECORDS = 3                   # records that must parse cleanly to accept a cut
+QUOTECHAR = '"'
+SKETCH_MODE = False                        # bounded-memory profiling (see module docstring)
+SKETCH_MAX_UNIQUES = 100_000               # exact values kept per column before truncating
+SKETCH_TOP_K = 1_000                       # frequent values tracked once a column is truncated
+HLL_PRECISION = 14                         # 2^14 registers -> ~0.8% distinct-count error
+USE_PARQUET_CACHE = False                  # build/reuse a <stem>_parquet cache (needs pyarrow)
 # ----------------------------------------------------
 
 
 def detect_encoding(file_path: Path, max_bytes: int = 2_000_000) -> str:
-    """Best-effort encoding detection by trial decoding."""
-    with file_path.open("rb") as f:
-        sample = f.read(max_bytes)
-    for enc in ENCODING_CANDIDATES:
-        try:
-            sample.decode(enc)
-            return enc
-        except UnicodeDecodeError:
-            continue
-    return "latin-1"
+    """Best-effort encoding detection: BOM, then trial decoding (shared text_encoding layer)."""
+    return detect_file_encoding(file_path, ENCODING_CANDIDATES, max_bytes, fallback="latin-1")
 
 
 def get_sample_text(file_path: Path, encoding: str, max_bytes: int = 2_000_000) -> str:
@@ -95,36 +123,19 @@ def sniff_delimiter(sample_text: str) -> str:
 
 def normalize_value(x) -> str:
     """Normalize values (treat None/NaN/whitespace-only as empty string)."""
-    if x is None:
-        return ""
+    if x is None or (isinstance(x, float) and math.isnan(x)):
+        return ""  # short rows are padded with NaN
     s = str(x).strip()
     return s
 
 
 def fast_count_rows(file_path: Path) -> int:
     """
-    Fast row count based on newline characters.
-    Returns total lines in file (including header line, if present).
+    Quote-aware record count (see csv_row_count.py): parallel mmap scan,
+    cached by file size + mtime so reruns on an unchanged file are free.
+    Returns total records in file (including header line, if present).
     """
-    file_size = file_path.stat().st_size
-    total_newlines = 0
-    with file_path.open("rb") as f, tqdm(
-        total=file_size,
-        unit="B",
-        unit_scale=True,
-        unit_divisor=1024,
-        desc="Counting rows (fast pass)",
-        leave=False,
-    ) as pbar:
-        while True:
-            chunk = f.read(ROWCOUNT_READ_BLOCK_BYTES)
-            if not chunk:
-                break
-            total_newlines += chunk.count(b"\n")
-            pbar.update(len(chunk))
-    # If the file doesn't end with a newline, we may have one more row
-    # Most CSV writers end with newline; keep the simple count.
-    return total_newlines
+    return count_records(file_path, QUOTECHAR)
 
 
 def read_headers(file_path: Path, delimiter: str, encoding: str) -> List[str]:
@@ -154,6 +165,14 @@ def read_headers(file_path: Path, delimiter: str, encoding: str) -> List[str]:
     return cols
 
 
+def headers_from_record(record: List[str], delimiter: str) -> List[str]:
+    """Column names read_headers() would give for this raw header record (pandas-mangled)."""
+    buf = io.StringIO()
+    csv.writer(buf, delimiter=delimiter, quotechar=QUOTECHAR).writerow(record)
+    buf.seek(0)
+    return list(pd.read_csv(buf, sep=delimiter, nrows=0, dtype=str, engine="python").columns)
+
+
 def unique_values_per_column(
     file_path: Path,
     encoding: str,
@@ -168,6 +187,41 @@ def unique_values_per_column(
     seen: Dict[str, set] = {col: set() for col in columns}
     values: Dict[str, List[str]] = {col: [] for col in columns}
 
+    iterator = iter_csv_chunks(file_path, encoding, delimiter)
+
+    # Progress bar over rows (excluding header)
+    desc = "Processing rows"
+    total = total_rows_no_header if (isinstance(total_rows_no_header, int) and total_rows_no_header >= 0) else None
+    with tqdm(total=total, unit="rows", desc=desc) as row_bar:
+        processed = 0
+        for chunk in iterator:
+            # Ensure all expected columns exist
+            missing = [c for c in columns if c not in chunk.columns]
+            for c in missing:
+                chunk[c] = ""
+
+            for col in columns:
+                for raw in chunk[col]:
+                    val = normalize_value(raw)
+                    if val not in seen[col]:
+                        seen[col].add(val)
+                        values[col].append(val)
+
+            # update progress
+            n = len(chunk.index)
+            processed += n
+            row_bar.update(n)
+
+        # If total was unknown and we finished, make the bar complete for neatness
+        if total is None:
+            row_bar.total = processed
+            row_bar.refresh()
+
+    return values
+
+
+def iter_csv_chunks(file_path: Path, encoding: str, delimiter: str):
+    """Streaming chunk iterator used by the single-process passes."""
     read_kwargs = dict(
         sep=delimiter,
         encoding=encoding,
@@ -193,38 +247,376 @@ def unique_values_per_column(
             na_filter=False,
             **read_kwargs,
         )
+    return iterator
+
+
+class HyperLogLog:
+    """HyperLogLog distinct-count sketch over 64-bit pandas value hashes."""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.p = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add(self, series: pd.Series) -> None:
+        if series.empty:
+            return
+        hashes = pd.util.hash_pandas_object(series, index=False).to_numpy(dtype=np.uint64)
+        q = 64 - self.p
+        idx = (hashes >> np.uint64(q)).astype(np.int64)
+        rest = hashes & np.uint64((1 << q) - 1)
+        # rank = position of the leading 1-bit within the remaining q bits (q + 1 if all zero)
+        rank = np.full(rest.shape, q + 1, dtype=np.uint8)
+        nz = rest != 0
+        rank[nz] = (q - np.floor(np.log2(rest[nz].astype(np.float64)))).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other: "HyperLogLog") -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = float(len(self.registers))
+        alpha = 0.7213 / (1.0 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # small-range (linear counting) correction
+        return raw
+
+
+class SpaceSaving:
+    """Mergeable Space-Saving top-K summary; counts are upper bounds."""
+
+    def __init__(self, k: int = SKETCH_TOP_K, counts: Dict[str, int] | None = None):
+        self.k = k
+        self.counts: Dict[str, int] = {}
+        if counts:
+            self.counts = dict(heapq.nlargest(k, counts.items(), key=lambda kv: kv[1]))
+
+    def floor(self) -> int:
+        """Largest count an untracked value could have."""
+        return min(self.counts.values()) if len(self.counts) >= self.k else 0
+
+    def merge_counts(self, counts: Dict[str, int], other_floor: int = 0) -> None:
+        own_floor = self.floor()
+        merged = {v: c + counts.get(v, other_floor) for v, c in self.counts.items()}
+        for v, c in counts.items():
+            if v not in merged:
+                merged[v] = c + own_floor
+        self.counts = dict(heapq.nlargest(self.k, merged.items(), key=lambda kv: kv[1]))
+
+    def merge(self, other: "SpaceSaving") -> None:
+        self.merge_counts(other.counts, other.floor())
+
+    def top(self) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda kv: kv[1], reverse=True)
+
+
+class ColumnSketch:
+    """
+    Bounded-memory profile of one column: exact value counts (first-appearance
+    order) until `cap` distinct values, then a Space-Saving top-K summary.
+    A HyperLogLog sketch runs throughout for the distinct-count estimate.
+    """
 
-    # Progress bar over rows (excluding header)
-    desc = "Processing rows"
+    def __init__(self, cap: int = SKETCH_MAX_UNIQUES, top_k: int = SKETCH_TOP_K):
+        self.cap = cap
+        self.top_k = top_k
+        self.counts: Dict[str, int] | None = {}
+        self.top: SpaceSaving | None = None
+        self.hll = HyperLogLog()
+
+    @property
+    def truncated(self) -> bool:
+        return self.counts is None
+
+    def _truncate(self) -> None:
+        self.top = SpaceSaving(self.top_k, self.counts)
+        self.counts = None
+
+    def _add_counts(self, counts: Dict[str, int], floor: int = 0) -> None:
+        if self.counts is not None:
+            for v, c in counts.items():
+                self.counts[v] = self.counts.get(v, 0) + c
+            if len(self.counts) <= self.cap:
+                return
+            self._truncate()
+            return
+        self.top.merge_counts(counts, floor)
+
+    def update(self, series: pd.Series) -> None:
+        self.hll.add(series)
+        self._add_counts(series.value_counts(sort=False).to_dict())
+
+    def merge(self, other: "ColumnSketch") -> None:
+        """Fold in the sketch of a LATER part of the file."""
+        self.hll.merge(other.hll)
+        if other.truncated:
+            if not self.truncated:
+                self._truncate()
+            self.top.merge(other.top)
+        else:
+            self._add_counts(other.counts)
+
+    def distinct(self) -> int:
+        return len(self.counts) if self.counts is not None else int(round(self.hll.estimate()))
+
+    def output_values(self) -> List[str]:
+        if self.counts is not None:
+            return list(self.counts)
+        return [v for v, _ in self.top.top()]
+
+
+def sketch_values_per_column(
+    file_path: Path,
+    encoding: str,
+    delimiter: str,
+    columns: List[str],
+    total_rows_no_header: int | None,
+) -> Dict[str, ColumnSketch]:
+    """Single-process streaming pass in sketch mode."""
+    sketches = {col: ColumnSketch() for col in columns}
     total = total_rows_no_header if (isinstance(total_rows_no_header, int) and total_rows_no_header >= 0) else None
-    with tqdm(total=total, unit="rows", desc=desc) as row_bar:
+    with tqdm(total=total, unit="rows", desc="Processing rows (sketch)") as row_bar:
         processed = 0
-        for chunk in iterator:
-            # Ensure all expected columns exist
-            missing = [c for c in columns if c not in chunk.columns]
-            for c in missing:
-                chunk[c] = ""
-
+        for chunk in iter_csv_chunks(file_path, encoding, delimiter):
             for col in columns:
-                for raw in chunk[col]:
-                    val = normalize_value(raw)
-                    if val not in seen[col]:
-                        seen[col].add(val)
-                        values[col].append(val)
-
-            # update progress
+                if col not in chunk.columns:
+                    chunk[col] = ""
+                sketches[col].update(chunk[col].fillna("").astype(str).str.strip())
             n = len(chunk.index)
             processed += n
             row_bar.update(n)
-
-        # If total was unknown and we finished, make the bar complete for neatness
         if total is None:
             row_bar.total = processed
             row_bar.refresh()
+    return sketches
+
+
+def plan_byte_ranges(file_path: Path, n_workers: int, encoding: str, delimiter: str,
+                     n_fields: int) -> Tuple[List[Tuple[int, int]], int | None]:
+    """
+    Split the data part of the file (after the header record) into
+    record-aligned byte ranges without a pass over the file: each nominal cut
+    is moved to the next record start by csv_row_count.find_record_start(),
+    which reads a few KiB there. A cut that cannot be confirmed is dropped (its range merges
+    with the previous one), so ranges are always record-aligned. Also returns
+    the number of data rows if csv_row_count.py has it cached, else None.
+    """
+    file_size = file_path.stat().st_size
+    if file_size == 0:
+        return [], 0
+
+    # Header record end (quote-aware, from the start of the file)
+    head = scan_ranges(file_path, [(0, min(file_size, 16 * 1024 * 1024))], QUOTECHAR, desc="Reading header")
+    data_start = head[0]["first_break"][0] if head and head[0]["first_break"][0] is not None else file_size
+    if data_start >= file_size:
+        return [], 0
+
+    try:
+        csv.field_size_limit(10**9)
+    except OverflowError:
+        csv.field_size_limit(2_147_483_647)
+
+    n_ranges = max(n_workers, -(-(file_size - data_start) // PARALLEL_RANGE_BYTES))
+    step = -(-(file_size - data_start) // n_ranges)
+    cuts = list(range(data_start + step, file_size, step))
+    starts = [data_start]
+
+    def accept(piece: bytes) -> bool:
+        return is_single_record(piece, encoding, n_fields, delimiter=delimiter, quotechar=QUOTECHAR)
+
+    with file_path.open("rb") as f:
+        for cut, limit in zip(cuts, cuts[1:] + [file_size]):
+            # A cut exactly on a record start: resync from the byte before it
+            start = find_record_start(f, cut - 1, limit, ord(QUOTECHAR), accept, RESYNC_CHECK_RECORDS,
+                                      RESYNC_BLOCK_BYTES, limit_is_boundary=limit == file_size)
+            if start is not None and start > starts[-1]:
+                starts.append(start)
+
+    ranges = [(a, b) for a, b in zip(starts, starts[1:] + [file_size]) if b > a]
+    records = load_cached_count(file_path, QUOTECHAR)
+    return ranges, (max(0, records - 1) if records is not None else None)
+
+
+def unique_values_in_range(
+    file_path: Path,
+    start: int,
+    end: int,
+    encoding: str,
+    delimiter: str,
+    columns: List[str],
+    engine: str,
+) -> Tuple[Dict[str, List[str]], int]:
+    """Worker: parse one byte range and return per-column uniques (first-appearance order)."""
+    chunk = read_byte_range(file_path, start, end, encoding, delimiter, columns, engine)
+    uniques = {}
+    for col in columns:
+        uniques[col] = pd.unique(chunk[col].fillna("").str.strip()).tolist()
+    return uniques, len(chunk.index)
+
+
+def sketch_values_in_range(
+    file_path: Path,
+    start: int,
+    end: int,
+    encoding: str,
+    delimiter: str,
+    columns: List[str],
+    engine: str,
+) -> Tuple[Dict[str, ColumnSketch], int]:
+    """Worker: parse one byte range and return a ColumnSketch per column."""
+    chunk = read_byte_range(file_path, start, end, encoding, delimiter, columns, engine)
+    sketches = {}
+    for col in columns:
+        sketches[col] = ColumnSketch()
+        sketches[col].update(chunk[col].fillna("").str.strip())
+    return sketches, len(chunk.index)
+
+
+def read_byte_range(
+    file_path: Path,
+    start: int,
+    end: int,
+    encoding: str,
+    delimiter: str,
+    columns: List[str],
+    engine: str,
+) -> pd.DataFrame:
+    """Parse the records in [start, end) (no header) as strings."""
+    with file_path.open("rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return pd.read_csv(
+        io.BytesIO(data),
+        header=None,
+        names=columns,
+        sep=delimiter,
+        encoding=encoding,
+        dtype=str,
+        keep_default_na=False,
+        na_filter=False,
+        on_bad_lines="skip",
+        engine=engine,
+    )
+
+
+def unique_values_from_cache(info: dict, columns: List[str]) -> Dict[str, List[str]]:
+    """
+    Unique values per column read from a valid Parquet cache (Arrow kernels).
+    `columns` are this tool's names for the cache's positional columns; the
+    first record (info["header"]) is the header, as in the CSV passes.
+    """
+    import pyarrow.compute as pc
+    from csv_parquet_cache import count_cached_rows, iter_cached_batches
+
+    seen: Dict[str, set] = {col: set() for col in columns}
+    values: Dict[str, List[str]] = {col: [] for col in columns}
+    stored = info["columns"][:len(columns)]
+    with tqdm(total=count_cached_rows(info), unit="rows", desc="Processing rows (Parquet cache)") as row_bar:
+        for batch in iter_cached_batches(info, stored, batch_rows=CHUNK_ROWS):
+            for i, col in enumerate(columns):
+                col_seen = seen[col]
+                col_values = values[col]
+                for val in pc.unique(pc.utf8_trim_whitespace(batch.column(i))).to_pylist():
+                    if val not in col_seen:
+                        col_seen.add(val)
+                        col_values.append(val)
+            row_bar.update(batch.num_rows)
+    return values
+
+
+def sketch_values_from_cache(info: dict, columns: List[str]) -> Dict[str, ColumnSketch]:
+    """Sketch mode over a valid Parquet cache."""
+    from csv_parquet_cache import count_cached_rows, iter_cached_batches
+
+    sketches = {col: ColumnSketch() for col in columns}
+    stored = info["columns"][:len(columns)]
+    with tqdm(total=count_cached_rows(info), unit="rows", desc="Processing rows (Parquet cache, sketch)") as row_bar:
+        for batch in iter_cached_batches(info, stored, batch_rows=CHUNK_ROWS):
+            for i, col in enumerate(columns):
+                sketches[col].update(batch.column(i).to_pandas().str.strip())
+            row_bar.update(batch.num_rows)
+    return sketches
+
+
+def map_byte_ranges(worker, file_path: Path, encoding: str, delimiter: str, columns: List[str], n_workers: int):
+    """
+    Run `worker` over record-aligned byte ranges in a process pool and yield
+    its per-range results strictly in file order (with a row progress bar).
+    """
+    ranges, total_rows = plan_byte_ranges(file_path, n_workers, encoding, delimiter, len(columns))
+
+    engine = PARALLEL_ENGINE
+    if engine == "pyarrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            tqdm.write("pyarrow not installed; falling back to the C parser.")
+            engine = "c"
+
+    n = len(ranges)
+    with ProcessPoolExecutor(max_workers=n_workers) as pool, \
+            tqdm(total=total_rows, unit="rows", desc=f"Processing rows ({n_workers} workers)") as row_bar:
+        results = pool.map(
+            worker,
+            [file_path] * n,
+            [a for a, _ in ranges],
+            [b for _, b in ranges],
+            [encoding] * n,
+            [delimiter] * n,
+            [columns] * n,
+            [engine] * n,
+        )
+        # pool.map yields in submission order -> merge in file order
+        for result, n_rows in results:
+            yield result
+            row_bar.update(n_rows)
+        # Without a cached row count the total is only known now
+        if total_rows is None:
+            row_bar.total = row_bar.n
+            row_bar.refresh()
 
+
+def unique_values_per_column_parallel(
+    file_path: Path,
+    encoding: str,
+    delimiter: str,
+    columns: List[str],
+    n_workers: int,
+) -> Dict[str, List[str]]:
+    """
+    Parallel counterpart of unique_values_per_column. Ranges are parsed in
+    worker processes and merged strictly in file order, so each column keeps
+    its global order of first appearance.
+    """
+    seen: Dict[str, set] = {col: set() for col in columns}
+    values: Dict[str, List[str]] = {col: [] for col in columns}
+    for uniques in map_byte_ranges(unique_values_in_range, file_path, encoding, delimiter, columns, n_workers):
+        for col in columns:
+            col_seen = seen[col]
+            col_values = values[col]
+            for val in uniques[col]:
+                if val not in col_seen:
+                    col_seen.add(val)
+                    col_values.append(val)
     return values
 
 
+def sketch_values_per_column_parallel(
+    file_path: Path,
+    encoding: str,
+    delimiter: str,
+    columns: List[str],
+    n_workers: int,
+) -> Dict[str, ColumnSketch]:
+    """Parallel sketch mode: per-range sketches merged in file order."""
+    sketches = {col: ColumnSketch() for col in columns}
+    for partial in map_byte_ranges(sketch_values_in_range, file_path, encoding, delimiter, columns, n_workers):
+        for col in columns:
+            sketches[col].merge(partial[col])
+    return sketches
+
+
 def write_unique_values_csv(
     output_path: Path,
     values: Dict[str, List[str]],
@@ -245,6 +637,33 @@ def write_unique_values_csv(
     df_out.to_csv(output_path, index=False, sep=delimiter, encoding=encoding)
 
 
+def write_sketch_summary_csv(
+    output_path: Path,
+    sketches: Dict[str, ColumnSketch],
+    columns: List[str],
+    encoding: str = "utf-8-sig",
+) -> None:
+    """One row per input column: truncated flag, distinct count (exact or HLL estimate)."""
+    rows = []
+    for col in columns:
+        sk = sketches[col]
+        rows.append({
+            "column": col,
+            "truncated": sk.truncated,
+            "distinct_count": sk.distinct(),
+            "distinct_is_estimate": sk.truncated,
+            "values_written": "top_k" if sk.truncated else "all",
+        })
+    pd.DataFrame(rows).to_csv(output_path, index=False, encoding=encoding)
+
+
+def build_summary_path(input_path: Path) -> Path:
+    """Same folder, add '_unique_values_summary' before the original extension(s)."""
+    stem = input_path.stem
+    suffix = "".join(input_path.suffixes) or ".csv"
+    return input_path.with_name(f"{stem}_unique_values_summary{suffix}")
+
+
 def build_output_path(input_path: Path) -> Path:
     """Same folder, add '_unique_values' before the original extension(s)."""
     stem = input_path.stem
@@ -266,10 +685,20 @@ def main():
         print(f"ERROR: File not found:\n  {in_path}")
         sys.exit(1)
 
+    # Reuse a valid Parquet cache (skips detection and CSV parsing)
+    cache_info = None
+    if USE_PARQUET_CACHE:
+        from csv_parquet_cache import build_parquet_cache, load_cache_info
+        cache_info = load_cache_info(in_path)
+
     # Detect encoding & delimiter
-    encoding = detect_encoding(in_path)
-    sample_text = get_sample_text(in_path, encoding=encoding)
-    delimiter = sniff_delimiter(sample_text)
+    if cache_info is not None:
+        encoding = cache_info["encoding"]
+        delimiter = cache_info["delimiter"]
+    else:
+        encoding = detect_encoding(in_path)
+        sample_text = get_sample_text(in_path, encoding=encoding)
+        delimiter = sniff_delimiter(sample_text)
     out_path = build_output_path(in_path)
 
     print("------------------------------------------------------------")
@@ -277,26 +706,70 @@ def main():
     print(f"Detected encoding : {encoding}")
     print(f"Detected delimiter: {repr(delimiter)}")
     print(f"Output file       : {out_path}")
+    if USE_PARQUET_CACHE:
+        print(f"Parquet cache     : {'valid' if cache_info is not None else 'building'}")
     print("------------------------------------------------------------")
 
     # Read headers
-    columns = read_headers(in_path, delimiter, encoding)
-
-    # Optional: fast row count pass (to display a determinate progress bar)
+    if cache_info is not None:
+        columns = headers_from_record(cache_info["header"], delimiter)
+    else:
+        columns = read_headers(in_path, delimiter, encoding)
+        if USE_PARQUET_CACHE:
+            cache_info = build_parquet_cache(in_path, encoding, delimiter, QUOTECHAR)
+
+    parallel = USE_PARALLEL_SCAN and PARALLEL_WORKERS > 1 and cache_info is None
+    # Byte ranges need an ASCII-compatible encoding; UTF-16/32 files take the serial pass
+    parallel = parallel and is_seekable_encoding(encoding)
+
+    # Optional: fast row count pass (to display a determinate progress bar).
+    # The parallel scan skips it and uses the cached count if there is one.
     total_rows_no_header = None
-    if COUNT_TOTAL_ROWS:
+    if COUNT_TOTAL_ROWS and not parallel and cache_info is None:
         total_lines_including_header = fast_count_rows(in_path)
         total_rows_no_header = max(0, total_lines_including_header - 1)
 
     # Main pass
     try:
-        values = unique_values_per_column(
-            in_path,
-            encoding=encoding,
-            delimiter=delimiter,
-            columns=columns,
-            total_rows_no_header=total_rows_no_header,
-        )
+        if SKETCH_MODE:
+            if cache_info is not None:
+                sketches = sketch_values_from_cache(cache_info, columns)
+            elif parallel:
+                sketches = sketch_values_per_column_parallel(
+                    in_path,
+                    encoding=encoding,
+                    delimiter=delimiter,
+                    columns=columns,
+                    n_workers=PARALLEL_WORKERS,
+                )
+            else:
+                sketches = sketch_values_per_column(
+                    in_path,
+                    encoding=encoding,
+                    delimiter=delimiter,
+                    columns=columns,
+                    total_rows_no_header=total_rows_no_header,
+                )
+            values = {col: sketches[col].output_values() for col in columns}
+            write_sketch_summary_csv(build_summary_path(in_path), sketches, columns)
+        elif cache_info is not None:
+            values = unique_values_from_cache(cache_info, columns)
+        elif parallel:
+            values = unique_values_per_column_parallel(
+                in_path,
+                encoding=encoding,
+                delimiter=delimiter,
+                columns=columns,
+                n_workers=PARALLEL_WORKERS,
+            )
+        else:
+            values = unique_values_per_column(
+                in_path,
+                encoding=encoding,
+                delimiter=delimiter,
+                columns=columns,
+                total_rows_no_header=total_rows_no_header,
+            )
         write_unique_values_csv(out_path, values, columns, delimiter=delimiter, encoding="utf-8-sig")
     except Exception as e:
         tqdm.write("Failed to build unique-values CSV.")
@@ -307,7 +780,11 @@ def main():
     tqdm.write("Done.")
     tqdm.write("Unique counts per column:")
     for col in columns:
-        tqdm.write(f"  - {col}: {len(values[col])} unique value(s)")
+        if SKETCH_MODE and sketches[col].truncated:
+            tqdm.write(f"  - {col}: ~{sketches[col].distinct()} unique value(s) "
+                       f"(truncated; top {len(values[col])} written)")
+        else:
+            tqdm.write(f"  - {col}: {len(values[col])} unique value(s)")
 
 
 if __name__ == "__main__":
@@ -3,10 +3,13 @@
 # python process_5.py
 
 import os
-import numpy as np
+import sys
 import rasterio
-from pymannkendall import original_test
-from tqdm import tqdm  # Progress bar library
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # raster_catalog.py lives in the repository root
+from raster_catalog import catalog_files
+from fdr_raster import fdr_correct_raster
+from mk_trend import TrendStore
 
 # Input and output directories
 #input_dir = r"D:\Publications\Bhaleka_1\data\daymet_srad\processed_nwt_clipped_annual_mean"
@@ -20,11 +23,22 @@ output_dir = r"D:\Publications\Bhaleka_1\data\daymet_srad\processed_nwt_clipped_
 # Ensure output directory exists
 os.makedirs(output_dir, exist_ok=True)
 
-# Function to filter files by year range
-def filter_files_by_year(tif_files, start_year, end_year):
-    return [f for f in tif_files if start_year <= int(f.split('_')[2].split('.')[0]) <= end_year]
+# Mann-Kendall test: "original", or an autocorrelation-corrected variant
+# ("hamed_rao", "yue_wang", "prewhitening", "trend_free_prewhitening"; see mk_trend.py)
+mk_test = "original"
+tag = "" if mk_test == "original" else f"{mk_test}_"  # variants get their own output names
+
+# Benjamini-Hochberg FDR q-values + significance mask next to each p_value raster (None: skip)
+fdr_alpha = 0.05
+
+# Confidence bounds of Sen's slope (None: skip): "analytic" (Gilbert 1987) writes
+# sen_slope_lower_* / sen_slope_upper_*; "bootstrap" adds the moving-block bootstrap
+# bounds sen_slope_boot_lower_* / sen_slope_boot_upper_* (ci_resamples per pixel, slower)
+slope_ci = None
+ci_resamples = 1000
 
 # Define the year range for the analysis
+# (several windows/seasons in one pass over the rasters: mk_trend_windows.py in the repository root)
 #start_year = 1980
 #end_year = 2023
 
@@ -37,41 +51,15 @@ def filter_files_by_year(tif_files, start_year, end_year):
 start_year = 2006
 end_year = 2023
 
-# Get list of all .tif files in the input directory and filter by year range
-tif_files = [f for f in os.listdir(input_dir) if f.endswith('.tif')]
-filtered_files = filter_files_by_year(tif_files, start_year, end_year)
-years = sorted([int(f.split('_')[2].split('.')[0]) for f in filtered_files])
-
-# Read the data into a 3D numpy array
-data_stack = []
-for year in tqdm(years, desc="Reading data"):
-    file_path = os.path.join(input_dir, f"daymet_srad_{year}.tif")
-    with rasterio.open(file_path) as src:
-        data = src.read(1)
-        data[data == src.nodata] = np.nan
-        data_stack.append(data)
-
-data_stack = np.stack(data_stack, axis=-1)
-
-# Initialize arrays for the results
-sen_slope = np.full(data_stack.shape[:-1], np.nan)
-p_value = np.full(data_stack.shape[:-1], np.nan)
-kendall_tau = np.full(data_stack.shape[:-1], np.nan)
-
-# Perform Mann-Kendall test on each pixel
-total_pixels = data_stack.shape[0] * data_stack.shape[1]
-with tqdm(total=total_pixels, desc="Performing Mann-Kendall test") as pbar:
-    for i in range(data_stack.shape[0]):
-        for j in range(data_stack.shape[1]):
-            pixel_values = data_stack[i, j, :]
-            if np.isnan(pixel_values).all():
-                pbar.update(1)
-                continue
-            result = original_test(pixel_values[~np.isnan(pixel_values)])
-            sen_slope[i, j] = result.slope
-            p_value[i, j] = result.p
-            kendall_tau[i, j] = result.Tau
-            pbar.update(1)
+# Annual rasters within the year range, sorted by year (from the raster catalog)
+entries = catalog_files(input_dir, "daymet_srad", kind="annual", start_year=start_year, end_year=end_year)
+
+# Every annual raster is kept in an incremental trend store next to the outputs:
+# only years not stored yet are read, then the analysis window is queried
+store = TrendStore(os.path.join(output_dir, ".trend_store"))
+store.sync(catalog_files(input_dir, "daymet_srad", kind="annual"))
+sen_slope, p_value, kendall_tau = store.query(start_year, end_year, desc="Performing Mann-Kendall test",
+                                              test=mk_test)
 
 # Function to save a raster
 def save_raster(data, template_file, output_file, nodata_value=3.4e+38):
@@ -82,9 +70,21 @@ def save_raster(data, template_file, output_file, nodata_value=3.4e+38):
             dst.write(data.astype(rasterio.float32), 1)
 
 # Save the results
-template_file = os.path.join(input_dir, filtered_files[0])
-save_raster(sen_slope, template_file, os.path.join(output_dir, f'sen_slope_{start_year}-{end_year}.tif'))
-save_raster(p_value, template_file, os.path.join(output_dir, f'p_value_{start_year}-{end_year}.tif'))
-save_raster(kendall_tau, template_file, os.path.join(output_dir, f'kendall_tau_{start_year}-{end_year}.tif'))
+template_file = entries[0].path
+save_raster(sen_slope, template_file, os.path.join(output_dir, f'sen_slope_{tag}{start_year}-{end_year}.tif'))
+p_value_file = os.path.join(output_dir, f'p_value_{tag}{start_year}-{end_year}.tif')
+save_raster(p_value, template_file, p_value_file)
+save_raster(kendall_tau, template_file, os.path.join(output_dir, f'kendall_tau_{tag}{start_year}-{end_year}.tif'))
+
+# Multiple-testing correction of the p-values (Benjamini-Hochberg FDR)
+if fdr_alpha is not None:
+    fdr_correct_raster(p_value_file, alpha=fdr_alpha)
+
+# Confidence bounds of Sen's slope, from the same trend store
+if slope_ci is not None:
+    bounds = store.slope_ci(start_year, end_year, n_boot=ci_resamples if slope_ci == "bootstrap" else 0,
+                            desc="Sen's slope confidence bounds")
+    for key, data in bounds.items():
+        save_raster(data, template_file, os.path.join(output_dir, f'sen_slope_{key}_{tag}{start_year}-{end_year}.tif'))
 
 print("Trend analysis completed and rasters saved.")
@@ -15,8 +15,9 @@ from datetime import datetime, timedelta
 input_dir = "D:\\Publications\\Bhaleka_1\\data\\daymet_srad\\raw"
 output_dir = "E:\\temp"
 
-# Function to process each netCDF file
-def process_nc_file(nc_file):
+# Function to process each netCDF file; yields the path of every daily raster
+# as soon as it is written (the pipeline runner streams them to clipping)
+def process_nc_file(nc_file, output_dir=output_dir):
     with Dataset(nc_file, 'r') as src:
         x = src.variables['x'][:]
         y = src.variables['y'][:]
@@ -62,12 +63,15 @@ def process_nc_file(nc_file):
                     transform=transform,
                 ) as dst:
                     dst.write(srad_day, 1)
+                yield output_filename
 
             except Exception as e:
                 print(f"Error processing {output_filename}: {e}")
                 continue
 
 # Process all nc files in the input directory
-nc_files = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith('.nc')]
-for nc_file in nc_files:
-    process_nc_file(nc_file)
+if __name__ == "__main__":
+    nc_files = [os.path.join(input_dir, f) for f in os.listdir(input_dir) if f.endswith('.nc')]
+    for nc_file in nc_files:
+        for _ in process_nc_file(nc_file):
+            pass
@@ -0,0 +1,144 @@
+# conda activate tempenv2
+# D:
+# cd "D:\Publications\Bhaleka_1\data\daymet_srad\"
+# python run_pipeline.py
+#
+# Runs process_1.py ... process_6.py (nc_to_tif, clipping, annual and seasonal
+# means, Mann-Kendall tests) as one pipeline for both regions: only stale stages
+# run, the regions and the annual/seasonal branches run concurrently, and each
+# daily raster is clipped as soon as nc_to_tif has written it (see pipeline.py).
+# The raw netCDF files are downloaded by hand; raw_dir is the pipeline's source.
+# With cache_dir set, every converted, clipped, mean and trend output is also kept
+# in a content-addressed cache (stage_cache.py): changing end_year or a region
+# serves the outputs whose inputs and settings were seen before.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # raster_catalog.py lives in the repository root
+from pipeline import (Pipeline, Node, Port, NETCDF, DAILY_RASTER, ANNUAL_RASTER, SEASONAL_RASTER,
+                      TREND_RASTER)
+from raster_catalog import catalog_files, season_of, season_year, SEASONS
+from raster_accumulate import update_group_means
+from stage_cache import StageCache, shapefile_digest
+
+# Directories
+data_dir = r"D:\Publications\Bhaleka_1\data\daymet_srad"
+raw_dir = os.path.join(data_dir, "raw")
+temp_dir = r"E:\temp"   # daily rasters from nc_to_tif (kept: the pipeline compares them with the raw files)
+state_dir = os.path.join(data_dir, ".pipeline")
+
+# Regions: name -> clipping shapefile (outputs go to processed_<name>_clipped...)
+regions = {
+    "nwt": os.path.join(data_dir, "nwt_shapefile", "nwt_shapefile.shp"),
+    "ns": os.path.join(data_dir, "ns_shapefile", "ns_shapefile.shp"),
+}
+
+# Mann-Kendall settings (as in the *_mk_test.py scripts, several windows in one pass)
+windows = [(1980, 2023), (1980, 2000), (2001, 2023), (2006, 2023)]
+seasons = ["autumn", "summer", "spring", "winter"]
+mk_test = "original"
+fdr_alpha = 0.05
+slope_ci = None
+mk_tile_workers = max(1, (os.cpu_count() or 1) // 4)  # up to four trend nodes run at once
+
+# Stage output cache (None: no cache), its size limit and how hits are served
+cache_dir = r"D:\Publications\Bhaleka_1\data\.stage_cache"
+cache_max_gb = 200
+cache_link_mode = "hardlink"   # or "copy"
+
+# True: run every stage again, stale or not
+force = False
+
+DATASET = "daymet_srad"
+
+
+def convert(nc_file):
+    from nc_to_tif import process_nc_file
+    return process_nc_file(nc_file, temp_dir)
+
+
+def clipper(output_directory, shapefile):
+    def clip(daily_raster):
+        from clipping import clip_project
+        os.makedirs(output_directory, exist_ok=True)
+        # An old output is removed, not overwritten: it may be a hardlink into the cache
+        final_raster = os.path.join(output_directory, os.path.basename(daily_raster))
+        if os.path.lexists(final_raster):
+            os.remove(final_raster)
+        out = clip_project(daily_raster, output_directory, shapefile)
+        return [out] if out else []
+    return clip
+
+
+def annual_means(input_directory, output_directory, cache):
+    def run():
+        os.makedirs(output_directory, exist_ok=True)
+        rasters_by_year = {}
+        for entry in catalog_files(input_directory, DATASET, kind="daily"):
+            rasters_by_year.setdefault(str(entry.year), []).append(entry)
+        update_group_means(rasters_by_year, output_directory, lambda year: f"{DATASET}_{year}.tif",
+                           divisor="files", desc="Processing years", cache=cache)
+    return run
+
+
+def seasonal_means(input_directory, output_directory, cache):
+    def run():
+        os.makedirs(output_directory, exist_ok=True)
+        # Winter is labelled by its December, as in seasonal_mean_from_daily_data.py
+        rasters_by_year_season = {}
+        for entry in catalog_files(input_directory, DATASET, kind="daily"):
+            key = f"{season_year(entry.year, entry.month)}_{season_of(entry.month)}"
+            rasters_by_year_season.setdefault(key, []).append(entry)
+        update_group_means(rasters_by_year_season, output_directory,
+                           lambda year_season: f"{DATASET}_{year_season}.tif",
+                           divisor="files", desc="Processing years and seasons", cache=cache,
+                           cache_params={'seasons': SEASONS})
+    return run
+
+
+def trend_tests(input_directory, output_directory, trend_seasons, cache):
+    def run():
+        from mk_trend_windows import run_windows
+        run_windows(input_directory, DATASET, output_directory, windows, trend_seasons, test=mk_test,
+                    fdr_alpha=fdr_alpha, slope_ci=slope_ci, tile_workers=mk_tile_workers, cache=cache)
+    return run
+
+
+def build_pipeline():
+    cache = None
+    if cache_dir:
+        cache = StageCache(cache_dir, max_bytes=cache_max_gb * 1024 ** 3, link_mode=cache_link_mode)
+    pipe = Pipeline(state_dir, cache)
+    daily = Port(DAILY_RASTER, temp_dir, f"{DATASET}_*.tif")
+    pipe.add(Node("nc_to_tif", [Port(NETCDF, raw_dir, "*.nc")], [daily], per_file=convert))
+
+    mk_params = {'windows': windows, 'test': mk_test, 'fdr_alpha': fdr_alpha, 'slope_ci': slope_ci}
+    for region, shapefile in regions.items():
+        clipped_dir = os.path.join(data_dir, f"processed_{region}_clipped")
+        annual_dir = clipped_dir + "_annual_mean"
+        seasonal_dir = clipped_dir + "_seasonal_mean"
+        clipped = Port(DAILY_RASTER, clipped_dir, f"{DATASET}_*.tif")
+        annual = Port(ANNUAL_RASTER, annual_dir, f"{DATASET}_????.tif")
+        seasonal = Port(SEASONAL_RASTER, seasonal_dir, f"{DATASET}_????_*.tif")
+
+        # arcpy geoprocessing is not thread-safe: the regions take turns per raster
+        pipe.add(Node(f"clip_{region}", [daily], [clipped], per_file=clipper(clipped_dir, shapefile),
+                      lock="arcpy",
+                      params={'shapefile': shapefile_digest(shapefile), 'nodata': -9999, 'crs': 4326}))
+        pipe.add(Node(f"annual_mean_{region}", [clipped], [annual],
+                      run=annual_means(clipped_dir, annual_dir, cache), params={'divisor': "files"}))
+        pipe.add(Node(f"seasonal_mean_{region}", [clipped], [seasonal],
+                      run=seasonal_means(clipped_dir, seasonal_dir, cache),
+                      params={'divisor': "files", 'seasons': SEASONS}))
+        pipe.add(Node(f"annual_mk_{region}", [annual], [Port(TREND_RASTER, annual_dir + "_mk_test", "*.tif")],
+                      run=trend_tests(annual_dir, annual_dir + "_mk_test", None, cache), params=mk_params))
+        pipe.add(Node(f"seasonal_mk_{region}", [seasonal],
+                      [Port(TREND_RASTER, seasonal_dir + "_mk_test", "*.tif")],
+                      run=trend_tests(seasonal_dir, seasonal_dir + "_mk_test", seasons, cache),
+                      params=dict(mk_params, seasons=seasons)))
+    return pipe
+
+
+if __name__ == "__main__":
+    build_pipeline().run(force=force)
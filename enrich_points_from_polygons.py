@@ -0,0 +1,251 @@
+"""
+=============================================================================
+  Multi-layer point enrichment (generalises the HydroLAKES matcher)
+=============================================================================
+
+Attaches attributes from any number of polygon layers (HydroLAKES, provinces,
+ecoregions, ...) to a point CSV in ONE streaming pass:
+
+- Each layer is described by a spec: path, layer name, fields to copy, the
+  point-in-polygon predicate and an optional fallback search radius.
+- Each layer's envelope index is built once (a single pass over geometries
+  only, attributes ignored); polygon geometries and attributes are then
+  fetched on demand by FID and kept in a small LRU cache.
+- Points are read with pandas in CHUNK_ROWS chunks, visited in Hilbert order
+  inside each chunk (so neighbouring points hit the geometry cache), and the
+  enriched chunk is appended to the output CSV in original row order — the
+  full point table never sits in memory.
+=============================================================================
+"""
+
+import os
+import math
+from collections import OrderedDict
+
+import pandas as pd
+from tqdm import tqdm
+
+from osgeo import ogr, osr
+
+from extract_polygon_attribute_from_point import (
+    build_point,
+    get_field_name_case_insensitive,
+    hilbert_index,
+)
+
+# =============================================================================
+#  CONFIGURATION  — edit these before running
+# =============================================================================
+
+POINTS_CSV = r"E:\publications\noori_5\data\final_clean_2\lakescci_v210.csv"
+OUT_PATH   = r"E:\publications\noori_5\data\final_clean_2\lakescci_v210_enriched.csv"
+LON_COL    = "lon_cntral"
+LAT_COL    = "lat_cntral"
+
+# One dict per polygon layer. Output columns are named "<name>_<field>".
+#   predicate       : "intersects" (includes boundary touches, as the
+#                     HydroLAKES matcher) or "contains" (strictly inside)
+#   fallback_radius : if the predicate finds nothing, take the NEAREST polygon
+#                     within this distance (layer units); 0 disables it
+#   grid_cell       : cell size of the in-memory envelope grid (layer units)
+LAYER_SPECS = [
+    {
+        "name": "hydrolakes",
+        "path": r"F:\work\data\hydrolakes\HydroLAKES_polys_v10.gdb",
+        "layer": "HydroLAKES_polys_v10",
+        "fields": ["Hylak_id"],
+        "predicate": "intersects",
+        "fallback_radius": 5e-4,
+        "grid_cell": 0.25,
+    },
+    # {
+    #     "name": "province",
+    #     "path": r"E:\publications\ashkan_2\revision\figure_provinces\provinces_shapefile\provinces.shp",
+    #     "layer": None,                 # None -> first layer of the dataset
+    #     "fields": ["NAME"],
+    #     "predicate": "contains",
+    #     "fallback_radius": 0,
+    #     "grid_cell": 1.0,
+    # },
+]
+
+CHUNK_ROWS = 200_000          # points per streamed chunk
+GEOMETRY_CACHE_SIZE = 20_000  # polygons kept in memory per layer
+
+# =============================================================================
+
+
+class PolygonLayerIndex:
+    """Envelope grid over one polygon layer plus an LRU cache of features."""
+
+    def __init__(self, spec):
+        self.name = spec["name"]
+        self.predicate = spec.get("predicate", "intersects").lower()
+        if self.predicate not in ("intersects", "contains"):
+            raise RuntimeError(f"[{self.name}] unknown predicate: {self.predicate!r}")
+        self.fallback_radius = float(spec.get("fallback_radius") or 0.0)
+        self.cell = float(spec.get("grid_cell") or 0.25)
+
+        self.ds = ogr.Open(spec["path"], 0)  # read-only
+        if self.ds is None:
+            raise RuntimeError(f"[{self.name}] could not open: {spec['path']}")
+        layer_name = spec.get("layer")
+        self.lyr = self.ds.GetLayerByName(layer_name) if layer_name else self.ds.GetLayer(0)
+        if self.lyr is None:
+            raise RuntimeError(f"[{self.name}] could not find layer {layer_name!r} in {spec['path']}")
+
+        # Resolve requested fields (case-insensitive), keep the user's spelling for output
+        self.fields = []
+        for wanted in spec["fields"]:
+            actual = get_field_name_case_insensitive(self.lyr, wanted)
+            if actual is None:
+                raise RuntimeError(f"[{self.name}] field {wanted!r} (any case) not found")
+            self.fields.append(actual)
+        self.columns = [f"{self.name}_{f}" for f in spec["fields"]]
+
+        # Points come in as WGS84; transform to the layer SRS if needed
+        self.srs_points = osr.SpatialReference()
+        self.srs_points.ImportFromEPSG(4326)
+        srs_layer = self.lyr.GetSpatialRef() or self.srs_points.Clone()
+        self.coord_tx = (None if srs_layer.IsSame(self.srs_points)
+                         else osr.CoordinateTransformation(self.srs_points, srs_layer))
+
+        self.fids = []
+        self.envelopes = []
+        self.grid = {}
+        self.cache = OrderedDict()
+        self._build()
+
+    def _build(self):
+        """Single pass over geometries (attributes ignored) to index envelopes."""
+        defn = self.lyr.GetLayerDefn()
+        all_fields = [defn.GetFieldDefn(i).GetName() for i in range(defn.GetFieldCount())]
+        self.lyr.SetIgnoredFields(all_fields)
+        self.lyr.SetSpatialFilter(None)
+        self.lyr.ResetReading()
+
+        total = self.lyr.GetFeatureCount()
+        for feat in tqdm(self.lyr, total=total, desc=f"Indexing {self.name}"):
+            geom = feat.GetGeometryRef()
+            if geom is None:
+                continue
+            k = len(self.fids)
+            minx, maxx, miny, maxy = geom.GetEnvelope()
+            self.fids.append(feat.GetFID())
+            self.envelopes.append((minx, maxx, miny, maxy))
+            for gx in range(self._gx(minx), self._gx(maxx) + 1):
+                for gy in range(self._gx(miny), self._gx(maxy) + 1):
+                    self.grid.setdefault((gx, gy), []).append(k)
+
+        self.lyr.SetIgnoredFields([])
+        self.lyr.ResetReading()
+
+    def _gx(self, v):
+        return int(math.floor(v / self.cell))
+
+    def _feature(self, k):
+        """(geometry, values) for index k, via the LRU cache."""
+        hit = self.cache.get(k)
+        if hit is not None:
+            self.cache.move_to_end(k)
+            return hit
+        feat = self.lyr.GetFeature(self.fids[k])
+        geom = feat.GetGeometryRef()
+        hit = (geom.Clone() if geom is not None else None,
+               tuple(feat.GetField(f) for f in self.fields))
+        self.cache[k] = hit
+        if len(self.cache) > GEOMETRY_CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return hit
+
+    def _candidates(self, x, y, half_size):
+        found = set()
+        for gx in range(self._gx(x - half_size), self._gx(x + half_size) + 1):
+            for gy in range(self._gx(y - half_size), self._gx(y + half_size) + 1):
+                found.update(self.grid.get((gx, gy), ()))
+        out = []
+        for k in sorted(found):  # layer order, like an OGR spatial filter
+            minx, maxx, miny, maxy = self.envelopes[k]
+            if maxx < x - half_size or minx > x + half_size or maxy < y - half_size or miny > y + half_size:
+                continue
+            out.append(k)
+        return out
+
+    def lookup(self, lon, lat):
+        """Attribute tuple of the matching polygon, or None."""
+        pt = build_point(lon, lat, self.srs_points)
+        if self.coord_tx is not None:
+            pt.Transform(self.coord_tx)
+        x, y = pt.GetX(), pt.GetY()
+
+        for k in self._candidates(x, y, 0.0):
+            geom, values = self._feature(k)
+            if geom is None:
+                continue
+            hit = geom.Contains(pt) if self.predicate == "contains" else geom.Intersects(pt)
+            if hit:
+                return values
+
+        if self.fallback_radius > 0:
+            best, best_d = None, None
+            for k in self._candidates(x, y, self.fallback_radius):
+                geom, values = self._feature(k)
+                if geom is None:
+                    continue
+                d = geom.Distance(pt)
+                if d <= self.fallback_radius and (best_d is None or d < best_d):
+                    best, best_d = values, d
+            return best
+
+        return None
+
+
+def enrich_chunk(chunk, layers, counts):
+    """Add every layer's columns to one chunk of points (in place)."""
+    lon = pd.to_numeric(chunk[LON_COL], errors="coerce").to_numpy()
+    lat = pd.to_numeric(chunk[LAT_COL], errors="coerce").to_numpy()
+    n = len(chunk)
+
+    # Visit points in Hilbert order so consecutive lookups reuse cached polygons
+    valid = [i for i in range(n) if not (math.isnan(lon[i]) or math.isnan(lat[i]))]
+    valid.sort(key=lambda i: hilbert_index(lon[i], lat[i]))
+
+    for layer in layers:
+        out = [[None] * n for _ in layer.columns]
+        for i in valid:
+            values = layer.lookup(float(lon[i]), float(lat[i]))
+            if values is None:
+                continue
+            counts[layer.name] += 1
+            for c, v in enumerate(values):
+                out[c][i] = v
+        for c, col in enumerate(layer.columns):
+            chunk[col] = out[c]
+    return chunk
+
+
+def main():
+    layers = [PolygonLayerIndex(spec) for spec in LAYER_SPECS]
+    counts = {layer.name: 0 for layer in layers}
+
+    os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
+    total = 0
+    first = True
+    with tqdm(unit="pts", desc="Enriching points") as pbar:
+        for chunk in pd.read_csv(POINTS_CSV, chunksize=CHUNK_ROWS, low_memory=False):
+            missing = [c for c in (LON_COL, LAT_COL) if c not in chunk.columns]
+            if missing:
+                raise RuntimeError(f"CSV is missing required columns: {missing}")
+            enrich_chunk(chunk, layers, counts)
+            chunk.to_csv(OUT_PATH, mode="w" if first else "a", header=first, index=False)
+            first = False
+            total += len(chunk)
+            pbar.update(len(chunk))
+
+    print(f"Done. Wrote: {OUT_PATH}")
+    for name, matched in counts.items():
+        print(f"  {name}: matched {matched} of {total} points")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,11 @@
 # python process_3.py
 
 import os
-import rasterio
-import numpy as np
-from glob import glob
-from tqdm import tqdm
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # raster_catalog.py lives in the repository root
+from raster_catalog import catalog_files
+from raster_accumulate import update_group_means
 
 # Define input and output directories
 #input_directory = r"D:\Publications\Bhaleka_1\data\era5_cloud_cover\processed_nwt_clipped"
@@ -20,59 +21,15 @@ output_directory = r"D:\Publications\Bhaleka_1\data\era5_cloud_cover\processed_n
 if not os.path.exists(output_directory):
     os.makedirs(output_directory)
 
-# Function to read raster data
-def read_raster(file_path):
-    with rasterio.open(file_path) as src:
-        return src.read(1), src.meta
-
-# Function to write raster data
-def write_raster(data, meta, output_path):
-    with rasterio.open(output_path, 'w', **meta) as dst:
-        dst.write(data, 1)
-
-# Get list of all raster files in the input directory
-raster_files = glob(os.path.join(input_directory, "era5_cloud_cover_*.tif"))
+# Incremental mode: only new/changed daily rasters are read and only the affected
+# outputs are rewritten (running sums are kept in <output_directory>\.mean_state)
+incremental = True
 
-# Group raster files by year
+# Group the daily rasters by year (file dates come from the raster catalog)
 rasters_by_year = {}
-for file_path in raster_files:
-    year = os.path.basename(file_path).split('_')[3].split('-')[0]
-    if year not in rasters_by_year:
-        rasters_by_year[year] = []
-    rasters_by_year[year].append(file_path)
-
-# Process each year
-for year, files in tqdm(rasters_by_year.items(), desc="Processing years"):
-    # Initialize sum and count arrays
-    data_sum = None
-    count = 0
-
-    for file_path in tqdm(files, desc=f"Processing files for year {year}", leave=False):
-        data, meta = read_raster(file_path)
-
-        if data_sum is None:
-            data_sum = np.zeros_like(data, dtype=np.float64)
-
-        valid_mask = data != meta.get('nodata', -9999)
-        data_sum[valid_mask] += data[valid_mask]
-        count += 1
-
-    # Calculate the mean
-    annual_mean_data = data_sum / count
-    annual_mean_data[~valid_mask] = meta.get('nodata', -9999)
-
-    # Update meta for the output raster
-    meta.update({
-        "driver": "GTiff",
-        "height": annual_mean_data.shape[0],
-        "width": annual_mean_data.shape[1],
-        "transform": meta['transform'],
-        "dtype": 'float32',
-        "compress": 'lzw'
-    })
-
-    # Save the annual mean raster
-    output_file_path = os.path.join(output_directory, f"era5_cloud_cover_{year}.tif")
-    write_raster(annual_mean_data.astype(np.float32), meta, output_file_path)
+for entry in catalog_files(input_directory, "era5_cloud_cover", kind="daily"):
+    rasters_by_year.setdefault(str(entry.year), []).append(entry)
 
-    print(f"Saved annual mean raster for {year} to {output_file_path}")
+# Fold the daily rasters into the per-year means and save the changed years
+update_group_means(rasters_by_year, output_directory, lambda year: f"era5_cloud_cover_{year}.tif",
+                   divisor="files", rebuild=not incremental, desc="Processing years")
@@ -4,13 +4,17 @@
 # python process_6.py
 
 import os
-import numpy as np
+import sys
 import rasterio
 from rasterio.transform import from_origin
-from pymannkendall import original_test
-from tqdm import tqdm  # Progress bar library
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # raster_catalog.py lives in the repository root
+from raster_catalog import catalog_files
+from fdr_raster import fdr_correct_raster
+from mk_trend import TrendStore, seasonal_query
 
 # Define the range of years manually
+# (several windows/seasons in one pass over the rasters: mk_trend_windows.py in the repository root)
 #start_year = 1979
 #end_year = 2023
 
@@ -26,8 +30,24 @@ output_dir = r"D:\Publications\Bhaleka_1\data\era5_cloud_cover\processed_nwt_cli
 # Ensure output directory exists
 os.makedirs(output_dir, exist_ok=True)
 
+# Mann-Kendall test: "original", or an autocorrelation-corrected variant
+# ("hamed_rao", "yue_wang", "prewhitening", "trend_free_prewhitening"; see mk_trend.py)
+mk_test = "original"
+tag = "" if mk_test == "original" else f"{mk_test}_"  # variants get their own output names
+
+# Benjamini-Hochberg FDR q-values + significance mask next to each p_value raster (None: skip)
+fdr_alpha = 0.05
+
+# Confidence bounds of Sen's slope (None: skip): "analytic" (Gilbert 1987) writes
+# sen_slope_lower_* / sen_slope_upper_*; "bootstrap" adds the moving-block bootstrap
+# bounds sen_slope_boot_lower_* / sen_slope_boot_upper_* (ci_resamples per pixel, slower)
+slope_ci = None
+ci_resamples = 1000
+
 # Seasons to process
 seasons = ["autumn", "summer", "spring", "winter"]
+# Also run the seasonal Mann-Kendall test (Hirsch-Slack) over all seasons together
+seasonal_mk = False
 
 # Function to save a raster
 def save_raster(data, template_file, output_file, nodata_value=3.4e+38):
@@ -38,61 +58,48 @@ def save_raster(data, template_file, output_file, nodata_value=3.4e+38):
             dst.write(data.astype(rasterio.float32), 1)
 
 # Process each season separately
+stores = []
 for season in seasons:
     print(f"Processing season: {season}")
 
-    # Get list of all .tif files for the current season within the specified year range
-    tif_files = [f for f in os.listdir(input_dir) if f.endswith(f'_{season}.tif')]
-    valid_tif_files = []
-    years = []
-    for f in tif_files:
-        try:
-            year = int(f.split('_')[3])
-            if start_year <= year <= end_year:
-                valid_tif_files.append(f)
-                years.append(year)
-        except ValueError:
-            print(f"Skipping file with invalid format: {f}")
-
-    years = sorted(years)
-
-    # Read the data into a 3D numpy array
-    data_stack = []
-    for year in tqdm(years, desc=f"Reading data for {season}"):
-        file_path = os.path.join(input_dir, f"era5_cloud_cover_{year}_{season}.tif")
-        with rasterio.open(file_path) as src:
-            data = src.read(1)
-            data[data == src.nodata] = np.nan
-            data_stack.append(data)
-
-    data_stack = np.stack(data_stack, axis=-1)
-
-    # Initialize arrays for the results
-    sen_slope = np.full(data_stack.shape[:-1], np.nan)
-    p_value = np.full(data_stack.shape[:-1], np.nan)
-    kendall_tau = np.full(data_stack.shape[:-1], np.nan)
-
-    # Perform Mann-Kendall test on each pixel
-    total_pixels = data_stack.shape[0] * data_stack.shape[1]
-    with tqdm(total=total_pixels, desc=f"Performing Mann-Kendall test for {season}") as pbar:
-        for i in range(data_stack.shape[0]):
-            for j in range(data_stack.shape[1]):
-                pixel_values = data_stack[i, j, :]
-                if np.isnan(pixel_values).all():
-                    pbar.update(1)
-                    continue
-                result = original_test(pixel_values[~np.isnan(pixel_values)])
-                sen_slope[i, j] = result.slope
-                p_value[i, j] = result.p
-                kendall_tau[i, j] = result.Tau
-                pbar.update(1)
+    # Rasters of the current season within the year range, sorted by year (from the raster catalog)
+    entries = catalog_files(input_dir, "era5_cloud_cover", kind="seasonal", season=season,
+                            start_year=start_year, end_year=end_year)
+
+    # Every raster of this season is kept in an incremental trend store next to the
+    # outputs: only years not stored yet are read, then the analysis window is queried
+    store = TrendStore(os.path.join(output_dir, ".trend_store", season))
+    store.sync(catalog_files(input_dir, "era5_cloud_cover", kind="seasonal", season=season))
+    stores.append(store)
+    sen_slope, p_value, kendall_tau = store.query(start_year, end_year,
+                                                  desc=f"Performing Mann-Kendall test for {season}",
+                                                  test=mk_test)
 
     # Template file for saving the results
-    template_file = os.path.join(input_dir, valid_tif_files[0])
+    template_file = entries[0].path
 
     # Save the results for the current season
-    save_raster(sen_slope, template_file, os.path.join(output_dir, f'sen_slope_{season}_{start_year}-{end_year}.tif'))
-    save_raster(p_value, template_file, os.path.join(output_dir, f'p_value_{season}_{start_year}-{end_year}.tif'))
-    save_raster(kendall_tau, template_file, os.path.join(output_dir, f'kendall_tau_{season}_{start_year}-{end_year}.tif'))
+    save_raster(sen_slope, template_file, os.path.join(output_dir, f'sen_slope_{tag}{season}_{start_year}-{end_year}.tif'))
+    p_value_file = os.path.join(output_dir, f'p_value_{tag}{season}_{start_year}-{end_year}.tif')
+    save_raster(p_value, template_file, p_value_file)
+    save_raster(kendall_tau, template_file, os.path.join(output_dir, f'kendall_tau_{tag}{season}_{start_year}-{end_year}.tif'))
+    if fdr_alpha is not None:
+        fdr_correct_raster(p_value_file, alpha=fdr_alpha)
+    if slope_ci is not None:
+        bounds = store.slope_ci(start_year, end_year, n_boot=ci_resamples if slope_ci == "bootstrap" else 0,
+                                desc=f"Sen's slope confidence bounds for {season}")
+        for key, data in bounds.items():
+            save_raster(data, template_file, os.path.join(output_dir, f'sen_slope_{key}_{tag}{season}_{start_year}-{end_year}.tif'))
+
+# Seasonal Mann-Kendall over the season stores (no raster is read again)
+if seasonal_mk:
+    sen_slope, p_value, kendall_tau = seasonal_query(stores, start_year, end_year,
+                                                     desc="Performing seasonal Mann-Kendall test")
+    save_raster(sen_slope, template_file, os.path.join(output_dir, f'sen_slope_seasonal_mk_{start_year}-{end_year}.tif'))
+    p_value_file = os.path.join(output_dir, f'p_value_seasonal_mk_{start_year}-{end_year}.tif')
+    save_raster(p_value, template_file, p_value_file)
+    save_raster(kendall_tau, template_file, os.path.join(output_dir, f'kendall_tau_seasonal_mk_{start_year}-{end_year}.tif'))
+    if fdr_alpha is not None:
+        fdr_correct_raster(p_value_file, alpha=fdr_alpha)
 
 print("Trend analysis completed and rasters saved for all seasons.")
@@ -1,5 +1,7 @@
 import os
 import math
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import pandas as pd
 from tqdm import tqdm
 
@@ -21,6 +23,18 @@ EPS_PRIMARY = 1e-4
 # Secondary (fallback) bbox half-size (degrees). ~5e-4 deg ≈ 55 m.
 EPS_FALLBACK = 5e-4
 
+# Sharded mode: points are sorted along a Hilbert curve, cut into spatially
+# coherent shards and matched in separate worker processes (each with its own
+# layer handle). Set N_WORKERS = 1 to use the original row-by-row loop.
+N_WORKERS = os.cpu_count() or 1
+SHARDS_PER_WORKER = 4        # more shards than workers keeps the pool busy
+HILBERT_ORDER = 16           # 2^16 x 2^16 grid over lon/lat (~0.005 deg cells)
+# Inside a shard, consecutive points are grouped into clusters whose bbox stays
+# below this span (degrees); each cluster loads its polygons with ONE spatial
+# filter and matches all of its points in memory.
+CLUSTER_MAX_SPAN = 0.5
+CLUSTER_GRID_CELLS = 32      # per-axis grid resolution of the in-memory index
+
 def open_fgdb_layer(gdb_path, layer_name):
     if not os.path.isdir(gdb_path) or not gdb_path.lower().endswith(".gdb"):
         raise RuntimeError(f"Not a valid File Geodatabase directory: {gdb_path}")
@@ -55,17 +69,8 @@ def bbox_filter(layer, x, y, half_size_deg):
     layer.SetSpatialFilterRect(x - half_size_deg, y - half_size_deg, x + half_size_deg, y + half_size_deg)
     layer.ResetReading()
 
-def main():
-    # Load input CSV
-    df = pd.read_csv(CSV_PATH, low_memory=False)
-    missing = [c for c in KEEP_COLS if c not in df.columns]
-    if missing:
-        raise RuntimeError(f"CSV is missing required columns: {missing}")
-
-    # Open HydroLAKES layer
-    ds, lyr = open_fgdb_layer(GDB_PATH, LAYER_NAME)
-
-    # WGS84 for points
+def open_points_transform(lyr):
+    """Return (srs_points, coord_tx) for moving WGS84 points into the layer SRS."""
     srs_points = osr.SpatialReference()
     srs_points.ImportFromEPSG(4326)
 
@@ -73,11 +78,22 @@ def main():
     srs_layer = lyr.GetSpatialRef() or srs_points.Clone()
     need_tx = not srs_layer.IsSame(srs_points)
     coord_tx = osr.CoordinateTransformation(srs_points, srs_layer) if need_tx else None
+    return srs_points, coord_tx
 
-    # Resolve exact Hylak_id field name (case-insensitive)
+def resolve_hylak_field(lyr):
+    """Resolve exact Hylak_id field name (case-insensitive)."""
     hylak_field = get_field_name_case_insensitive(lyr, "Hylak_id")
     if hylak_field is None:
         raise RuntimeError("Could not find a field named 'Hylak_id' (any case) in HydroLAKES layer.")
+    return hylak_field
+
+def match_serial(df):
+    """Original row-by-row matcher: one spatial filter per point."""
+    # Open HydroLAKES layer
+    ds, lyr = open_fgdb_layer(GDB_PATH, LAYER_NAME)
+    srs_points, coord_tx = open_points_transform(lyr)
+    need_tx = coord_tx is not None
+    hylak_field = resolve_hylak_field(lyr)
 
     results = []
     matched = 0
@@ -142,6 +158,195 @@ def main():
 
         results.append((pid, short_name, lat_c, lon_c, hylak_id_val))
 
+    return results, matched, unmatched
+
+# -----------------------------------------------------------------------------
+#  Sharded (multi-process) matching
+# -----------------------------------------------------------------------------
+
+def hilbert_index(lon, lat, order=HILBERT_ORDER):
+    """Position of (lon, lat) along a Hilbert curve over a 2^order grid."""
+    n = 1 << order
+    x = min(n - 1, max(0, int((lon + 180.0) / 360.0 * n)))
+    y = min(n - 1, max(0, int((lat + 90.0) / 180.0 * n)))
+    d = 0
+    s = n >> 1
+    while s > 0:
+        rx = 1 if (x & s) else 0
+        ry = 1 if (y & s) else 0
+        d += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so the curve stays continuous
+        if ry == 0:
+            if rx == 1:
+                x = n - 1 - x
+                y = n - 1 - y
+            x, y = y, x
+        s >>= 1
+    return d
+
+def make_shards(points, n_shards):
+    """
+    Sort (pos, lon, lat) points along the Hilbert curve and cut them into
+    n_shards contiguous, near-equal pieces (neighbours stay in the same shard).
+    """
+    ordered = sorted(points, key=lambda p: hilbert_index(p[1], p[2]))
+    n_shards = max(1, min(n_shards, len(ordered)))
+    size, extra = divmod(len(ordered), n_shards)
+    shards = []
+    start = 0
+    for k in range(n_shards):
+        end = start + size + (1 if k < extra else 0)
+        shards.append(ordered[start:end])
+        start = end
+    return shards
+
+def split_clusters(items, max_span):
+    """Group consecutive (pos, x, y) items while their bbox stays within max_span."""
+    cluster = []
+    minx = miny = maxx = maxy = None
+    for item in items:
+        _, x, y = item
+        if cluster:
+            nminx, nminy = min(minx, x), min(miny, y)
+            nmaxx, nmaxy = max(maxx, x), max(maxy, y)
+            if nmaxx - nminx > max_span or nmaxy - nminy > max_span:
+                yield cluster, (minx, miny, maxx, maxy)
+                cluster = []
+        if not cluster:
+            minx, miny, maxx, maxy = x, y, x, y
+        else:
+            minx, miny, maxx, maxy = nminx, nminy, nmaxx, nmaxy
+        cluster.append(item)
+    if cluster:
+        yield cluster, (minx, miny, maxx, maxy)
+
+def load_cluster_polygons(lyr, hylak_field, bbox, pad):
+    """
+    Load every polygon whose envelope touches the padded cluster bbox, in the
+    layer's own iteration order, and index their envelopes on a small grid.
+    """
+    minx, miny, maxx, maxy = bbox
+    minx, miny, maxx, maxy = minx - pad, miny - pad, maxx + pad, maxy + pad
+    lyr.SetSpatialFilterRect(minx, miny, maxx, maxy)
+    lyr.ResetReading()
+
+    polys = []
+    for feat in lyr:
+        geom = feat.GetGeometryRef()
+        if geom is None:
+            continue
+        polys.append((geom.Clone(), feat.GetField(hylak_field), geom.GetEnvelope()))
+    lyr.SetSpatialFilter(None)
+
+    cell = max((maxx - minx), (maxy - miny)) / CLUSTER_GRID_CELLS or 1.0
+    grid = {}
+    for k, (_, _, (ex0, ex1, ey0, ey1)) in enumerate(polys):
+        # clip to the cluster bbox so huge lakes don't fill thousands of cells
+        gx0 = int(math.floor((max(ex0, minx) - minx) / cell))
+        gx1 = int(math.floor((min(ex1, maxx) - minx) / cell))
+        gy0 = int(math.floor((max(ey0, miny) - miny) / cell))
+        gy1 = int(math.floor((min(ey1, maxy) - miny) / cell))
+        for gx in range(gx0, gx1 + 1):
+            for gy in range(gy0, gy1 + 1):
+                grid.setdefault((gx, gy), []).append(k)
+    return polys, grid, (minx, miny, cell)
+
+def match_in_memory(pt, x, y, polys, grid, origin, half_size):
+    """Same rule as the layer loop: first polygon (layer order) whose envelope
+    touches the bbox and whose geometry Intersects the point."""
+    minx, miny, cell = origin
+    gx0 = int(math.floor((x - half_size - minx) / cell))
+    gx1 = int(math.floor((x + half_size - minx) / cell))
+    gy0 = int(math.floor((y - half_size - miny) / cell))
+    gy1 = int(math.floor((y + half_size - miny) / cell))
+    candidates = set()
+    for gx in range(gx0, gx1 + 1):
+        for gy in range(gy0, gy1 + 1):
+            candidates.update(grid.get((gx, gy), ()))
+    for k in sorted(candidates):
+        geom, value, (ex0, ex1, ey0, ey1) = polys[k]
+        if ex1 < x - half_size or ex0 > x + half_size or ey1 < y - half_size or ey0 > y + half_size:
+            continue
+        if geom.Intersects(pt):
+            return value, True
+    return None, False
+
+def match_shard(gdb_path, layer_name, shard):
+    """
+    Worker: open a private handle on the layer and match one shard of
+    (pos, lon, lat) points. Returns [(pos, hylak_id_or_None), ...].
+    """
+    ds, lyr = open_fgdb_layer(gdb_path, layer_name)
+    srs_points, coord_tx = open_points_transform(lyr)
+    hylak_field = resolve_hylak_field(lyr)
+
+    # Move points into the layer SRS once
+    items = []
+    geoms = {}
+    for pos, lon, lat in shard:
+        pt = build_point(lon, lat, srs_points)
+        if coord_tx is not None:
+            pt.Transform(coord_tx)
+        geoms[pos] = pt
+        items.append((pos, pt.GetX(), pt.GetY()))
+
+    out = []
+    for cluster, bbox in split_clusters(items, CLUSTER_MAX_SPAN):
+        polys, grid, origin = load_cluster_polygons(lyr, hylak_field, bbox, EPS_FALLBACK)
+        for pos, x, y in cluster:
+            pt = geoms[pos]
+            value, found = match_in_memory(pt, x, y, polys, grid, origin, EPS_PRIMARY)
+            if not found:
+                value, found = match_in_memory(pt, x, y, polys, grid, origin, EPS_FALLBACK)
+            out.append((pos, value if found else None))
+    return out
+
+def match_sharded(df, n_workers):
+    """Hilbert-sharded matcher; results come back in original row order."""
+    results = [None] * len(df)
+    points = []
+    for pos, row in enumerate(df.itertuples(index=False)):
+        pid        = getattr(row, "id", None)
+        short_name = getattr(row, "short_name", None)
+        try:
+            lat_c = float(getattr(row, "lat_cntral"))
+            lon_c = float(getattr(row, "lon_cntral"))
+        except Exception:
+            results[pos] = (pid, short_name, float('nan'), float('nan'), None)
+            continue
+        results[pos] = (pid, short_name, lat_c, lon_c, None)
+        if math.isnan(lat_c) or math.isnan(lon_c):
+            continue
+        points.append((pos, lon_c, lat_c))
+
+    shards = make_shards(points, n_workers * SHARDS_PER_WORKER)
+
+    matched = 0
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(match_shard, GDB_PATH, LAYER_NAME, shard) for shard in shards if shard]
+        with tqdm(total=len(points), desc=f"Matching points to HydroLAKES ({n_workers} workers)") as pbar:
+            for fut in as_completed(futures):
+                shard_out = fut.result()
+                for pos, hylak_id_val in shard_out:
+                    if hylak_id_val is not None:
+                        results[pos] = results[pos][:4] + (hylak_id_val,)
+                        matched += 1
+                pbar.update(len(shard_out))
+
+    return results, matched, len(df) - matched
+
+def main():
+    # Load input CSV
+    df = pd.read_csv(CSV_PATH, low_memory=False)
+    missing = [c for c in KEEP_COLS if c not in df.columns]
+    if missing:
+        raise RuntimeError(f"CSV is missing required columns: {missing}")
+
+    if N_WORKERS > 1:
+        results, matched, unmatched = match_sharded(df, N_WORKERS)
+    else:
+        results, matched, unmatched = match_serial(df)
+
     out_df = pd.DataFrame(results, columns=KEEP_COLS + ["Hylak_id"])
     os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
     out_df.to_csv(OUT_PATH, index=False)
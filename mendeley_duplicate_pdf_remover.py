@@ -1,34 +1,186 @@
 import os
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
 
 # Directory containing your PDF files.
 directory = r"C:\Users\alire\OneDrive\Desktop\lake_ontario"
 extension = ".pdf"  # we're working with PDF files
 
-# List all PDF files in the directory.
-files = [f for f in os.listdir(directory) if f.lower().endswith(extension.lower())]
-
-# Group files by their "base key" (filename without extension and with last 20 characters removed)
-groups = {}
-for filename in files:
-    base, ext = os.path.splitext(filename)
-    # Remove the last 20 characters (if the base name is long enough)
-    key = base[:-20] if len(base) > 20 else base
-    groups.setdefault(key, []).append(filename)
-
-# Process each group: if more than one file share the same key, keep one and delete the rest.
-for key, file_list in groups.items():
-    if len(file_list) > 1:
-        print(f"Found duplicates for key:\n  {key}\nFiles: {file_list}")
-        file_to_keep = file_list[0]  # Choose the first file to keep.
-        print(f"Keeping: {file_to_keep}")
-        # Delete the rest of the files.
-        for file_to_delete in file_list[1:]:
-            file_path = os.path.join(directory, file_to_delete)
+# How duplicates are matched:
+#   "content" : byte-identical files (size -> partial hash -> full BLAKE2 hash)
+#   "name"    : old behaviour, same file name once the last 20 characters are cut
+#   "near"    : same text, different bytes (MinHash LSH, see pdf_near_duplicates.py);
+#               groups are only reported or quarantined, never deleted
+match_mode = "content"
+dry_run = False          # True: only report what would be deleted
+near_action = "report"   # "near" mode: "report" | "quarantine"
+hash_workers = min(32, (os.cpu_count() or 1) * 4)  # hashing threads (hashlib releases the GIL)
+partial_bytes = 64 * 1024                          # head + tail bytes for the cheap first hash
+read_block_bytes = 1024 * 1024
+cache_name = ".pdf_hash_cache.json"                # persistent cache, stored in `directory`
+
+
+def scan_pdfs(directory, extension):
+    """(name, path, size, mtime_ns) of every matching file, via one scandir pass."""
+    out = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.lower().endswith(extension.lower()):
+                st = entry.stat()
+                out.append((entry.name, entry.path, st.st_size, st.st_mtime_ns))
+    out.sort()
+    return out
+
+
+def load_hash_cache(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_hash_cache(path, cache):
+    try:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except OSError as e:
+        print(f"Could not save hash cache ({e}); the next run will re-hash.")
+
+
+def partial_hash(path, size):
+    """BLAKE2 of the first and last `partial_bytes` (the whole file if it is small)."""
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        h.update(f.read(partial_bytes))
+        if size > 2 * partial_bytes:
+            f.seek(size - partial_bytes)
+            h.update(f.read(partial_bytes))
+        elif size > partial_bytes:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def full_hash(path):
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(read_block_bytes), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cached_hashes(files, kind, func, cache, desc):
+    """
+    {path: digest} for `files`, taking hashes from the cache when path, size
+    and mtime still match and computing the rest in a thread pool.
+    """
+    result, todo = {}, []
+    for name, path, size, mtime_ns in files:
+        hit = cache.get(path)
+        if hit and hit.get("size") == size and hit.get("mtime_ns") == mtime_ns and kind in hit:
+            result[path] = hit[kind]
+        else:
+            todo.append((path, size, mtime_ns))
+    if todo:
+        with ThreadPoolExecutor(max_workers=hash_workers) as pool:
+            futures = [pool.submit(func, path, size) for path, size, _ in todo]
+            for (path, size, mtime_ns), fut in tqdm(zip(todo, futures), total=len(todo), desc=desc, unit="file"):
+                digest = fut.result()
+                hit = cache.get(path)
+                if not hit or hit.get("size") != size or hit.get("mtime_ns") != mtime_ns:
+                    hit = cache[path] = {"size": size, "mtime_ns": mtime_ns}
+                hit[kind] = digest
+                result[path] = digest
+    return result
+
+
+def regroup(groups, key_of):
+    """Split each group by key_of(file); keep only sub-groups with 2+ files."""
+    out = []
+    for group in groups:
+        sub = {}
+        for f in group:
+            sub.setdefault(key_of(f), []).append(f)
+        out.extend(g for g in sub.values() if len(g) > 1)
+    return out
+
+
+def find_content_duplicates(files, cache):
+    """Groups of byte-identical files: size -> partial hash -> full hash."""
+    by_size = {}
+    for f in files:
+        by_size.setdefault(f[2], []).append(f)
+    groups = [g for size, g in by_size.items() if len(g) > 1 and size > 0]
+    candidates = [f for g in groups for f in g]
+    print(f"{len(files)} files, {len(candidates)} share a size with another file")
+    if not candidates:
+        return []
+
+    partial = cached_hashes(candidates, "partial", partial_hash, cache, "Partial hashes")
+    groups = regroup(groups, lambda f: partial[f[1]])
+
+    candidates = [f for g in groups for f in g]
+    full = cached_hashes(candidates, "full", lambda path, size: full_hash(path), cache, "Full hashes")
+    return regroup(groups, lambda f: full[f[1]])
+
+
+def find_name_duplicates(files):
+    """Old rule: group by file name (without extension) minus its last 20 characters."""
+    groups = {}
+    for f in files:
+        base, ext = os.path.splitext(f[0])
+        # Remove the last 20 characters (if the base name is long enough)
+        key = base[:-20] if len(base) > 20 else base
+        groups.setdefault(key, []).append(f)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def remove_duplicates(groups):
+    """
+    Keep one file per group and delete the rest. The shortest name is kept
+    (copies usually carry an added suffix), ties broken alphabetically.
+    """
+    deleted = 0
+    for group in groups:
+        group = sorted(group, key=lambda f: (len(f[0]), f[0]))
+        names = [f[0] for f in group]
+        print(f"Found duplicates: {names}")
+        print(f"Keeping: {names[0]}")
+        for name, path, size, mtime_ns in group[1:]:
+            if dry_run:
+                print(f"Would delete: {name}")
+                continue
             try:
-                os.remove(file_path)
-                print(f"Deleted: {file_to_delete}")
+                os.remove(path)
+                deleted += 1
+                print(f"Deleted: {name}")
             except Exception as e:
-                print(f"Error deleting {file_to_delete}: {e}")
+                print(f"Error deleting {name}: {e}")
+    return deleted
+
+
+if __name__ == "__main__":
+    files = scan_pdfs(directory, extension)
+
+    if match_mode == "near":
+        from pdf_near_duplicates import run_near_duplicates
+        run_near_duplicates(directory, files, action=near_action)
+        raise SystemExit
+
+    if match_mode == "name":
+        groups = find_name_duplicates(files)
     else:
-        # No duplicates for this key.
-        print(f"Unique file for key '{key}': {file_list[0]}")
+        cache_path = os.path.join(directory, cache_name)
+        cache = load_hash_cache(cache_path)
+        groups = find_content_duplicates(files, cache)
+        # Forget files that no longer exist, then persist
+        present = {f[1] for f in files}
+        save_hash_cache(cache_path, {p: v for p, v in cache.items() if p in present})
+
+    if not groups:
+        print("No duplicates found.")
+    deleted = remove_duplicates(groups)
+    print(f"{len(groups)} duplicate groups, {deleted} files deleted" + (" (dry run)" if dry_run else ""))
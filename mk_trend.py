@@ -0,0 +1,948 @@
+"""
+=============================================================================
+  Vectorized Mann-Kendall / Sen's slope engine with an incremental store
+=============================================================================
+
+The *_mk_test.py scripts called pymannkendall.original_test once per pixel,
+and adding one year to a 1980-2023 run meant re-testing the whole stack.
+
+Vectorized engine
+-----------------
+mk_original_block(values) runs original_test on a block of pixels at once
+(values: pixels x years, NaN = missing, skipped per pixel exactly like
+original_test on the NaN-free series):
+
+- S      : sum of sign(x_j - x_i) over valid pairs i < j
+- var(S) : n(n-1)(2n+5)/18 minus the tie-group correction
+           sum t(t-1)(2t+5)/18 (tie groups found on the sorted rows)
+- z, p   : continuity-corrected z, two-sided normal p-value
+- Tau    : S / (n(n-1)/2)
+- slope  : Sen's slope, median of all (x_j - x_i)/(j - i) with i, j
+           counted along the pixel's valid values (as after NaN removal)
+
+Modified and seasonal tests
+---------------------------
+The same block layout runs the pymannkendall variants (TESTS names):
+
+- hamed_rao               : var(S) x effective-sample-size factor from the
+                            significant lag autocorrelations of the ranks of
+                            the detrended series (Hamed & Rao 1998);
+- yue_wang                : var(S) x (1 + 2 sum (1 - k/n) r_k) of the
+                            detrended series (Yue & Wang 2004);
+- prewhitening            : original test on x_t - r1 x_(t-1);
+- trend_free_prewhitening : the same on the detrended series, trend added back;
+- seasonal (mk_seasonal_block, seasonal_query) : Hirsch-Slack test over a
+  (pixels, years, seasons) stack, S and var(S) summed over the seasons.
+
+Series are left-packed per pixel (pack_valid) so lags and detrending use
+positions in the NaN-free series, as the scripts passed it to pymannkendall.
+Autocorrelations are summed in a different order than pymannkendall's
+np.correlate, so z and p agree to ~1e-12 rather than bitwise; a pre-whitened
+series whose values are tied in theory can break those ties differently.
+
+Incremental trend store
+-----------------------
+TrendStore keeps, per pixel, the running pieces of the test over every
+stored year:
+
+- S            (int32)   — appending year y adds sum_i sign(x_y - x_i);
+- tie term     (float64) — x_y joins a tie group of size k, so the term
+                            grows by f(k+1) - f(k), f(t) = t(t-1)(2t+5);
+- n            (int16)   — valid years;
+- the value stack itself (one float32 .npy per year).
+
+Appending a year therefore costs O(pixels x years) and the full-range p,
+z and Tau come straight from the state. Sen's slope needs the median of
+all pairwise slopes, so it is computed from the stored stack (in pixel
+blocks); any window inside the stored range is answered from the stack the
+same way, without re-reading the rasters.
+
+Confidence bounds of Sen's slope
+--------------------------------
+sens_slope_ci_block / TrendStore.slope_ci give, per pixel,
+
+- lower, upper           : Gilbert (1987) bounds, the ranks
+                           (m -/+ z(1 - alpha/2) sqrt(var S)) / 2 of the m
+                           sorted pairwise slopes (as R's trend::sens.slope);
+- boot_lower, boot_upper : percentile bounds of a moving-block bootstrap of
+                           the (year, value) pairs, which keeps the serial
+                           correlation the analytic bounds ignore.
+
+The bootstrap draws one batch of block starts per tile from a seeded
+generator, so the outputs are reproducible.
+
+Run this file directly to validate the engine and every variant against
+pymannkendall on random pixels (with NaNs, ties and autocorrelation), check
+that appended state equals a full recompute, check the slope bounds and
+their coverage, and benchmark each test.
+=============================================================================
+"""
+
+import os
+import json
+import time
+import warnings
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+from tqdm import tqdm
+
+BLOCK_PIXELS = 20_000   # pixels per block for the pairwise (years^2) arrays
+ALPHA        = 0.05     # Hamed-Rao autocorrelation bounds; Sen's slope CIs are 1 - ALPHA
+BOOT_BLOCK_LENGTH = 5   # years per moving block of the bootstrap CI
+BOOT_SEED         = 12345
+
+
+def tie_term(t):
+    """f(t) = t(t-1)(2t+5), the per-tie-group variance correction (times 18)."""
+    return t * (t - 1) * (2 * t + 5)
+
+
+def mk_score_block(values):
+    """S per pixel: sum of sign(x_j - x_i) over valid pairs i < j (NaN pairs add 0)."""
+    s = np.zeros(values.shape[0], dtype=np.int64)
+    for i in range(values.shape[1] - 1):
+        d = values[:, i + 1:] - values[:, i:i + 1]
+        s += (d > 0).sum(axis=1) - (d < 0).sum(axis=1)
+    return s
+
+
+def tie_correction_block(values):
+    """sum over tie groups of t(t-1)(2t+5), per pixel (NaN never ties)."""
+    p, y = values.shape
+    if y < 2:
+        return np.zeros(p)
+    srt = np.sort(values, axis=1)
+    new_group = np.ones((p, y), dtype=bool)
+    new_group[:, 1:] = srt[:, 1:] != srt[:, :-1]
+    group_id = np.cumsum(new_group, axis=1) - 1 + (np.arange(p) * y)[:, None]
+    sizes = np.bincount(group_id.ravel(), minlength=p * y).reshape(p, y).astype(np.float64)
+    return tie_term(sizes).sum(axis=1)
+
+
+def variance_from_ties(n, ties):
+    n = n.astype(np.float64)
+    return (n * (n - 1) * (2 * n + 5) - ties) / 18
+
+
+def z_p(s, var_s):
+    """Continuity-corrected z and two-sided normal p-value, as in pymannkendall."""
+    s = s.astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sd = np.sqrt(var_s)
+        z = np.where(s > 0, (s - 1) / sd, np.where(s < 0, (s + 1) / sd, 0.0))
+    return z, 2 * (1 - ndtr(np.abs(z)))
+
+
+def z_p_tau(s, var_s, n):
+    """z, p and Kendall's Tau, as in original_test."""
+    z, p = z_p(s, var_s)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = s / (0.5 * n * (n - 1))
+    return z, p, tau
+
+
+def pair_indices(n_years):
+    i, j = np.triu_indices(n_years, k=1)
+    return i, j
+
+
+def pairwise_slopes(values):
+    """
+    All pairwise slopes per pixel (NaN where a value is missing) and their
+    count. The x step between two valid values is their distance in the
+    NaN-free series (rank among the valid values).
+    """
+    p, y = values.shape
+    if y < 2:
+        return np.full((p, 1), np.nan), np.zeros(p, dtype=np.int64)
+    valid = ~np.isnan(values)
+    rank = np.cumsum(valid, axis=1) - 1
+    i, j = pair_indices(y)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (values[:, j] - values[:, i]) / (rank[:, j] - rank[:, i])
+    both = valid[:, i] & valid[:, j]
+    slopes[~both] = np.nan
+    return slopes, both.sum(axis=1)
+
+
+def sens_slope_block(values):
+    """Sen's slope per pixel: median of the pairwise slopes."""
+    return median_valid(*pairwise_slopes(values))
+
+
+def median_valid(slopes, m):
+    """
+    Median of the m non-NaN values of each row: sort (NaN last) and average
+    the middle pair, the same arithmetic as np.nanmedian without its per-row
+    overhead. Sorts `slopes` in place.
+    """
+    slopes.sort(axis=1)
+    lo = np.maximum((m - 1) // 2, 0)[:, None]
+    hi = (m // 2)[:, None]
+    out = 0.5 * (np.take_along_axis(slopes, lo, axis=1) + np.take_along_axis(slopes, hi, axis=1))[:, 0]
+    out[m == 0] = np.nan
+    return out
+
+
+def mk_original_block(values):
+    """
+    original_test on every row of `values` (pixels x years, NaN = missing).
+    Returns a dict of arrays: n, s, var_s, z, p, tau, slope.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = (~np.isnan(values)).sum(axis=1)
+    s = mk_score_block(values)
+    var_s = variance_from_ties(n, tie_correction_block(values))
+    z, p, tau = z_p_tau(s, var_s, n)
+    return {'n': n, 's': s, 'var_s': var_s, 'z': z, 'p': p, 'tau': tau,
+            'slope': sens_slope_block(values)}
+
+
+# -----------------------------------------------------------------------------
+#  Modified tests (autocorrelation) and the seasonal test
+# -----------------------------------------------------------------------------
+
+def pack_valid(values):
+    """
+    Move each row's valid values to the front (order kept, NaN padding after),
+    so that column k is the k-th value of the NaN-free series.
+    """
+    order = np.argsort(np.isnan(values), axis=1, kind='stable')
+    return np.take_along_axis(values, order, axis=1)
+
+
+def average_ranks(packed, n):
+    """scipy.stats.rankdata (ties get their average rank) per row; NaN padding stays NaN."""
+    p, y = packed.shape
+    order = np.argsort(packed, axis=1, kind='stable')
+    srt = np.take_along_axis(packed, order, axis=1)
+    pos = np.broadcast_to(np.arange(y), (p, y))
+    new_group = np.ones((p, y), dtype=bool)
+    new_group[:, 1:] = srt[:, 1:] != srt[:, :-1]
+    first = np.maximum.accumulate(np.where(new_group, pos, 0), axis=1)
+    last_group = np.ones((p, y), dtype=bool)
+    last_group[:, :-1] = new_group[:, 1:]
+    last = np.flip(np.minimum.accumulate(np.flip(np.where(last_group, pos, y - 1), axis=1), axis=1), axis=1)
+    ranks = np.empty((p, y))
+    np.put_along_axis(ranks, order, 0.5 * (first + last) + 1, axis=1)
+    ranks[pos >= n[:, None]] = np.nan
+    return ranks
+
+
+def acf_block(packed, n, nlags):
+    """Autocorrelation at lags 0..nlags of each row's first n values (pymannkendall's __acf)."""
+    p, y = packed.shape
+    inside = np.arange(y) < n[:, None]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(inside, packed, 0).sum(axis=1) / n
+        dev = np.where(inside, packed - mean[:, None], 0)
+        acov = np.zeros((p, nlags + 1))
+        for k in range(min(nlags + 1, y)):
+            acov[:, k] = (dev[:, :y - k] * dev[:, k:]).sum(axis=1) / n
+        return acov / acov[:, :1]
+
+
+def detrend(packed, slope):
+    """x - (1..n) * Sen's slope, as the modified tests detrend the series."""
+    return packed - np.arange(1, packed.shape[1] + 1) * slope[:, None]
+
+
+def lag_mask(n, nlags, lag):
+    """Lags 1..lag (all n-1 lags when lag is None) that each row's series has."""
+    k = np.arange(nlags + 1)
+    last = n - 1 if lag is None else np.minimum(lag, n - 1)
+    return (k >= 1) & (k <= last[:, None])
+
+
+def mk_hamed_rao_block(values, lag=None, alpha=ALPHA):
+    """
+    hamed_rao_modification_test per row: var(S) scaled by the effective
+    sample size from the significant autocorrelations of the ranks of the
+    detrended series. Fewer than 3 valid years give NaN z and p.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    res = mk_original_block(values)
+    n = res['n']
+    y = values.shape[1]
+    packed = pack_valid(values)
+    acf = acf_block(average_ranks(detrend(packed, res['slope']), n), n, y - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bound = ndtri(1 - alpha / 2) / np.sqrt(n)
+        significant = lag_mask(n, y - 1, lag) & ~((acf <= bound[:, None]) & (acf >= -bound[:, None]))
+        k = np.arange(y)
+        m = (n[:, None] - k).astype(np.float64)
+        sni = np.where(significant, m * (m - 1) * (m - 2) * acf, 0).sum(axis=1)
+        n_f = n.astype(np.float64)
+        var_s = res['var_s'] * (1 + 2 / (n_f * (n_f - 1) * (n_f - 2)) * sni)
+    res['var_s'] = var_s
+    res['z'], res['p'] = z_p(res['s'], var_s)
+    return res
+
+
+def mk_yue_wang_block(values, lag=None):
+    """
+    yue_wang_modification_test per row: var(S) scaled by 1 + 2 sum (1 - k/n) r_k,
+    r_k the autocorrelations of the detrended series.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    res = mk_original_block(values)
+    n = res['n']
+    y = values.shape[1]
+    acf = acf_block(detrend(pack_valid(values), res['slope']), n, y - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = 1 - np.arange(y) / n[:, None]
+        sni = np.where(lag_mask(n, y - 1, lag), weight * acf, 0).sum(axis=1)
+    res['var_s'] = res['var_s'] * (1 + 2 * sni)
+    res['z'], res['p'] = z_p(res['s'], res['var_s'])
+    return res
+
+
+def prewhitened_test(series, slope):
+    """original_test statistics of the whitened series (n - 1 values), with the given slope."""
+    n = (~np.isnan(series)).sum(axis=1)
+    s = mk_score_block(series)
+    var_s = variance_from_ties(n, tie_correction_block(series))
+    z, p, tau = z_p_tau(s, var_s, n)
+    return {'n': n, 's': s, 'var_s': var_s, 'z': z, 'p': p, 'tau': tau, 'slope': slope}
+
+
+def mk_prewhitening_block(values):
+    """pre_whitening_modification_test per row: x_t - r1 x_(t-1), then the original test."""
+    values = np.asarray(values, dtype=np.float64)
+    packed = pack_valid(values)
+    n = (~np.isnan(values)).sum(axis=1)
+    r1 = acf_block(packed, n, 1)[:, 1:2]
+    series = packed[:, 1:] - packed[:, :-1] * r1
+    return prewhitened_test(series, sens_slope_block(values))
+
+
+def mk_trend_free_prewhitening_block(values):
+    """trend_free_pre_whitening_modification_test per row: pre-whiten the detrended series, add the trend back."""
+    values = np.asarray(values, dtype=np.float64)
+    slope = sens_slope_block(values)
+    n = (~np.isnan(values)).sum(axis=1)
+    x = detrend(pack_valid(values), slope)
+    r1 = acf_block(x, n, 1)[:, 1:2]
+    series = x[:, 1:] - x[:, :-1] * r1
+    series = detrend(series, -slope)
+    return prewhitened_test(series, slope)
+
+
+def mk_seasonal_block(values):
+    """
+    seasonal_test per pixel (Hirsch-Slack) on values shaped (pixels, years,
+    seasons): S and var(S) summed over the seasons, each season skipping
+    its own missing years. Sen's slope is the median of the within-season
+    pairwise slopes, steps counted in years (as seasonal_sens_slope).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    p, y, n_seasons = values.shape
+    s = np.zeros(p, dtype=np.int64)
+    var_s = np.zeros(p)
+    denom = np.zeros(p)
+    n_all = np.zeros(p, dtype=np.int64)
+    slopes = []
+    i, j = pair_indices(y)
+    for k in range(n_seasons):
+        x = values[:, :, k]
+        n = (~np.isnan(x)).sum(axis=1)
+        s += mk_score_block(x)
+        var_s += variance_from_ties(n, tie_correction_block(x))
+        denom += 0.5 * n * (n - 1)
+        n_all += n
+        slopes.append((x[:, j] - x[:, i]) / (j - i))
+    slopes = np.concatenate(slopes, axis=1) if y > 1 else np.full((p, 1), np.nan)
+    z, p_value = z_p(s, var_s)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = s / denom
+    slope = median_valid(slopes, (~np.isnan(slopes)).sum(axis=1))
+    return {'n': n_all, 's': s, 'var_s': var_s, 'z': z, 'p': p_value, 'tau': tau, 'slope': slope}
+
+
+# Tests available to the stack / store / script level: name -> block function
+TESTS = {
+    'original':                mk_original_block,
+    'hamed_rao':               mk_hamed_rao_block,
+    'yue_wang':                mk_yue_wang_block,
+    'prewhitening':            mk_prewhitening_block,
+    'trend_free_prewhitening': mk_trend_free_prewhitening_block,
+}
+
+
+def mk_stack(stack, test="original", block_pixels=BLOCK_PIXELS, desc="Mann-Kendall test"):
+    """
+    Run a test (a TESTS name) over a (rows, cols, years) stack in pixel
+    blocks, or mk_seasonal_block over a (rows, cols, years, seasons) stack
+    with test="seasonal". All-NaN pixels stay NaN, like the skipped pixels
+    of the per-pixel scripts.
+    Returns (sen_slope, p_value, kendall_tau) as (rows, cols) arrays.
+    """
+    rows, cols = stack.shape[:2]
+    flat = stack.reshape(rows * cols, *stack.shape[2:])
+    block = mk_seasonal_block if test == "seasonal" else TESTS[test]
+    out = {k: np.full(rows * cols, np.nan) for k in ('slope', 'p', 'tau')}
+    todo = np.flatnonzero(~np.isnan(flat.reshape(rows * cols, -1)).all(axis=1))
+    for start in tqdm(range(0, len(todo), block_pixels), desc=desc, unit="block"):
+        idx = todo[start:start + block_pixels]
+        res = block(flat[idx])
+        for k in out:
+            out[k][idx] = res[k]
+    return tuple(out[k].reshape(rows, cols) for k in ('slope', 'p', 'tau'))
+
+
+# -----------------------------------------------------------------------------
+#  Confidence intervals of Sen's slope
+# -----------------------------------------------------------------------------
+
+def analytic_ci(sorted_slopes, m, var_s, alpha=ALPHA):
+    """
+    Gilbert (1987) bounds from the sorted pairwise slopes (NaN last):
+    C = z(1 - alpha/2) sqrt(var S), lower = the round((m - C)/2)-th and
+    upper = the round((m + C)/2 + 1)-th smallest slope (as R's trend::sens.slope).
+    """
+    with np.errstate(invalid='ignore'):
+        c = ndtri(1 - alpha / 2) * np.sqrt(var_s)
+        lo = np.round((m - c) / 2)
+        up = np.round((m + c) / 2 + 1)
+    ok = (m > 0) & np.isfinite(c)
+    lo = np.clip(np.where(ok, lo, 1), 1, np.maximum(m, 1)).astype(np.int64) - 1
+    up = np.clip(np.where(ok, up, 1), 1, np.maximum(m, 1)).astype(np.int64) - 1
+    lower = np.take_along_axis(sorted_slopes, lo[:, None], axis=1)[:, 0]
+    upper = np.take_along_axis(sorted_slopes, up[:, None], axis=1)[:, 0]
+    lower[~ok] = np.nan
+    upper[~ok] = np.nan
+    return lower, upper
+
+
+def sens_slope_xy_block(x, t):
+    """Sen's slope per row for explicit x positions `t`; pairs at the same position are skipped."""
+    i, j = pair_indices(x.shape[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (x[:, j] - x[:, i]) / (t[:, j] - t[:, i])
+    slopes[~np.isfinite(slopes)] = np.nan
+    return median_valid(slopes, (~np.isnan(slopes)).sum(axis=1))
+
+
+def bootstrap_slopes(values, n_boot, block_length, rng):
+    """
+    Sen's slopes of n_boot moving-block bootstrap samples per pixel: blocks
+    of block_length consecutive (year, value) pairs are drawn with
+    replacement (keeping the serial correlation inside a block) and Sen's
+    slope is taken over pairs of distinct years. Resampling the residuals
+    instead would repeat values, put many pairwise slopes exactly on the
+    estimate and make the intervals too narrow.
+    The block starts are ONE batched (n_boot, blocks) array of uniforms for
+    the whole tile, scaled to each pixel's series length. Returns (pixels, n_boot).
+    """
+    packed = pack_valid(values)
+    p, y = packed.shape
+    n = (~np.isnan(values)).sum(axis=1)
+    n_blocks = -(-y // block_length)
+    u = rng.random((n_boot, n_blocks))
+
+    out = np.full((p, n_boot), np.nan)
+    step = max(1, BLOCK_PIXELS // n_boot)
+    for start in range(0, p, step):
+        sl = slice(start, start + step)
+        n_s = n[sl]
+        length = np.clip(np.minimum(block_length, n_s), 1, None)
+        starts = np.floor(u[None] * np.maximum(n_s - length + 1, 1)[:, None, None]).astype(np.int64)
+        offsets = np.arange(block_length)[None, :] % length[:, None]
+        idx = (starts[..., None] + offsets[:, None, None, :]).reshape(len(n_s), n_boot, -1)[:, :, :y]
+        x = np.take_along_axis(np.broadcast_to(packed[sl, None, :], idx.shape), idx, axis=2)
+        x[np.broadcast_to(np.arange(y)[None, None, :] >= n_s[:, None, None], x.shape)] = np.nan
+        out[sl] = sens_slope_xy_block(x.reshape(-1, y), idx.reshape(-1, y).astype(np.float64)).reshape(len(n_s), n_boot)
+    return out
+
+
+def sens_slope_ci_block(values, alpha=ALPHA, n_boot=0, block_length=BOOT_BLOCK_LENGTH, rng=None):
+    """
+    Sen's slope with its 1 - alpha confidence bounds per row of `values`
+    (pixels x years, NaN = missing): analytic 'lower'/'upper' and, with
+    n_boot resamples, moving-block bootstrap percentile 'boot_lower'/'boot_upper'.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = (~np.isnan(values)).sum(axis=1)
+    var_s = variance_from_ties(n, tie_correction_block(values))
+    slopes, m = pairwise_slopes(values)
+    slope = median_valid(slopes, m)  # leaves slopes sorted
+    lower, upper = analytic_ci(slopes, m, var_s, alpha)
+    out = {'slope': slope, 'lower': lower, 'upper': upper}
+    if n_boot:
+        rng = np.random.default_rng(BOOT_SEED) if rng is None else rng
+        boot = bootstrap_slopes(values, n_boot, block_length, rng)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # pixels without any slope stay NaN
+            out['boot_lower'], out['boot_upper'] = np.nanquantile(boot, [alpha / 2, 1 - alpha / 2], axis=1)
+    return out
+
+
+def read_year(path):
+    """Band 1 as float32 with nodata -> NaN, as the MK scripts read it."""
+    import rasterio
+    with rasterio.open(path) as src:
+        data = src.read(1).astype(np.float32)
+        if src.nodata is not None:
+            data[data == src.nodata] = np.nan
+    return data
+
+
+class TrendStore:
+    """
+    Per-pixel Mann-Kendall state over an appendable run of years, stored in
+    `directory`: meta.json, s.npy, ties.npy, n.npy and values_<year>.npy.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self._path("meta.json"), "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        except (OSError, ValueError):
+            self.meta = {'years': [], 'shape': None, 'sources': {}}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @property
+    def years(self):
+        return self.meta['years']
+
+    def _save_meta(self):
+        with open(self._path("meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(self._path("meta.json.tmp"), self._path("meta.json"))
+
+    def _load_state(self):
+        return (np.load(self._path("s.npy")), np.load(self._path("ties.npy")),
+                np.load(self._path("n.npy")))
+
+    def _save_state(self, s, ties, n):
+        for name, arr in (("s.npy", s), ("ties.npy", ties), ("n.npy", n)):
+            np.save(self._path(name + ".tmp.npy"), arr)
+            os.replace(self._path(name + ".tmp.npy"), self._path(name))
+
+    def year_values(self, year, mmap=True):
+        """Flat float32 values of one stored year."""
+        return np.load(self._path(f"values_{year}.npy"), mmap_mode='r' if mmap else None)
+
+    def clear(self):
+        for year in self.years:
+            os.remove(self._path(f"values_{year}.npy"))
+        self.meta = {'years': [], 'shape': None, 'sources': {}}
+        self._save_meta()
+
+    def append(self, year, data, source=None):
+        """
+        Add one year (2-D array, NaN = missing) after the last stored year,
+        updating S, the tie term and n in O(pixels x years).
+        """
+        if self.years and year <= self.years[-1]:
+            raise ValueError(f"Year {year} must come after the last stored year {self.years[-1]}")
+        if self.meta['shape'] is None:
+            self.meta['shape'] = list(data.shape)
+        elif list(data.shape) != self.meta['shape']:
+            raise ValueError(f"Grid {data.shape} differs from the store's {tuple(self.meta['shape'])}")
+
+        new = np.asarray(data, dtype=np.float32).ravel()
+        if self.years:
+            s, ties, n = self._load_state()
+        else:
+            s = np.zeros(new.size, dtype=np.int32)
+            ties = np.zeros(new.size, dtype=np.float64)
+            n = np.zeros(new.size, dtype=np.int16)
+
+        new64 = new.astype(np.float64)
+        for start in range(0, new.size, BLOCK_PIXELS * 16):
+            sl = slice(start, start + BLOCK_PIXELS * 16)
+            x = new64[sl]
+            greater = np.zeros(x.size, dtype=np.int32)
+            less = np.zeros(x.size, dtype=np.int32)
+            equal = np.zeros(x.size, dtype=np.int32)
+            for old_year in self.years:
+                old = self.year_values(old_year)[sl].astype(np.float64)
+                greater += x > old
+                less += x < old
+                equal += x == old
+            s[sl] += greater - less
+            ties[sl] += tie_term(equal + 1.0) - tie_term(equal.astype(np.float64))
+        n += ~np.isnan(new)
+
+        np.save(self._path(f"values_{year}.npy"), new)
+        self._save_state(s, ties, n)
+        self.meta['years'].append(int(year))
+        if source is not None:
+            self.meta['sources'][str(year)] = source
+        self._save_meta()
+
+    def sync(self, entries):
+        """
+        Bring the store in line with catalog entries of annual rasters: new
+        later years are appended; if a stored year's file changed or an
+        earlier year appeared, the store is rebuilt from the files.
+        """
+        wanted = {e.year: [e.path, e.size, e.mtime_ns] for e in entries}
+        sources = self.meta['sources']
+        stale = any(str(y) not in sources or sources[str(y)] != wanted.get(y) for y in self.years)
+        first_new = min((y for y in wanted if y not in self.years), default=None)
+        if stale or (first_new is not None and self.years and first_new < self.years[-1]):
+            self.clear()
+        for year in tqdm(sorted(y for y in wanted if y not in self.years), desc="Appending years"):
+            self.append(year, read_year(wanted[year][0]), source=wanted[year])
+
+    def stack(self, start_year, end_year, pixels=slice(None)):
+        """Stored values of the years in [start_year, end_year] as (pixels, years) float64."""
+        years = [y for y in self.years if start_year <= y <= end_year]
+        return np.stack([self.year_values(y)[pixels] for y in years], axis=1).astype(np.float64)
+
+    def slope_ci(self, start_year=None, end_year=None, alpha=ALPHA, n_boot=0,
+                 block_length=BOOT_BLOCK_LENGTH, seed=BOOT_SEED, block_pixels=BLOCK_PIXELS,
+                 desc="Sen's slope confidence bounds"):
+        """
+        Confidence bounds of Sen's slope for a year window, shaped like the
+        rasters: {'lower', 'upper'} (analytic) plus {'boot_lower', 'boot_upper'}
+        with n_boot bootstrap resamples. Each pixel block draws from its own
+        generator seeded with (seed, first pixel), so repeated runs with the
+        same block size give the same bounds.
+        """
+        start_year = self.years[0] if start_year is None else start_year
+        end_year = self.years[-1] if end_year is None else end_year
+        n_pixels = int(np.prod(self.meta['shape']))
+        keys = ['lower', 'upper'] + (['boot_lower', 'boot_upper'] if n_boot else [])
+        out = {k: np.full(n_pixels, np.nan) for k in keys}
+        if n_boot:
+            block_pixels = max(1, min(block_pixels, 50 * BLOCK_PIXELS // n_boot))
+        for start in tqdm(range(0, n_pixels, block_pixels), desc=desc, unit="block"):
+            values = self.stack(start_year, end_year, slice(start, start + block_pixels))
+            has = ~np.isnan(values).all(axis=1)
+            if not has.any():
+                continue
+            res = sens_slope_ci_block(values[has], alpha, n_boot, block_length,
+                                      np.random.default_rng([seed, start]))
+            idx = np.flatnonzero(has) + start
+            for k in keys:
+                out[k][idx] = res[k]
+        shape = tuple(self.meta['shape'])
+        return {k: v.reshape(shape) for k, v in out.items()}
+
+    def query(self, start_year=None, end_year=None, block_pixels=BLOCK_PIXELS, desc="Trend query",
+              test="original"):
+        """
+        (sen_slope, p_value, kendall_tau) for a year window inside the stored
+        range, shaped like the rasters. The full range of the original test
+        uses the running state; other windows and tests (TESTS names) are
+        recomputed from the stored stack.
+        """
+        if not self.years:
+            raise ValueError("The trend store is empty")
+        start_year = self.years[0] if start_year is None else start_year
+        end_year = self.years[-1] if end_year is None else end_year
+        full = test == "original" and start_year <= self.years[0] and end_year >= self.years[-1]
+        n_pixels = int(np.prod(self.meta['shape']))
+
+        slope = np.full(n_pixels, np.nan)
+        p = np.full(n_pixels, np.nan)
+        tau = np.full(n_pixels, np.nan)
+        if full:
+            s, ties, n = self._load_state()
+            _, p_all, tau_all = z_p_tau(s, variance_from_ties(n, ties), n)
+        for start in tqdm(range(0, n_pixels, block_pixels), desc=desc, unit="block"):
+            sl = slice(start, start + block_pixels)
+            values = self.stack(start_year, end_year, sl)
+            has = ~np.isnan(values).all(axis=1)
+            if not has.any():
+                continue
+            idx = np.flatnonzero(has) + start
+            if full:
+                slope[idx] = sens_slope_block(values[has])
+                p[idx] = p_all[idx]
+                tau[idx] = tau_all[idx]
+            else:
+                res = TESTS[test](values[has])
+                slope[idx], p[idx], tau[idx] = res['slope'], res['p'], res['tau']
+        shape = tuple(self.meta['shape'])
+        return slope.reshape(shape), p.reshape(shape), tau.reshape(shape)
+
+
+def seasonal_query(stores, start_year, end_year, block_pixels=BLOCK_PIXELS, desc="Seasonal trend query"):
+    """
+    Seasonal Mann-Kendall (mk_seasonal_block) over the stores of the seasons,
+    one TrendStore per season on the same grid. Years missing from a season
+    count as missing values. Returns (sen_slope, p_value, kendall_tau).
+    """
+    shapes = {tuple(store.meta['shape']) for store in stores if store.years}
+    if len(shapes) != 1:
+        raise ValueError("The season stores are empty or on different grids")
+    shape = shapes.pop()
+    years = sorted({y for store in stores for y in store.years if start_year <= y <= end_year})
+    n_pixels = int(np.prod(shape))
+
+    out = {k: np.full(n_pixels, np.nan) for k in ('slope', 'p', 'tau')}
+    for start in tqdm(range(0, n_pixels, block_pixels), desc=desc, unit="block"):
+        sl = slice(start, start + block_pixels)
+        values = np.full((len(range(n_pixels)[sl]), len(years), len(stores)), np.nan)
+        for k, store in enumerate(stores):
+            for c, year in enumerate(years):
+                if year in store.years:
+                    values[:, c, k] = store.year_values(year)[sl]
+        has = ~np.isnan(values).all(axis=(1, 2))
+        if not has.any():
+            continue
+        idx = np.flatnonzero(has) + start
+        res = mk_seasonal_block(values[has])
+        for k in out:
+            out[k][idx] = res[k]
+    return tuple(out[k].reshape(shape) for k in ('slope', 'p', 'tau'))
+
+
+# -----------------------------------------------------------------------------
+#  Validation + benchmark
+# -----------------------------------------------------------------------------
+
+def synthetic_stack(n_pixels, n_years, rng, nan_share=0.1, tie_share=0.2):
+    """Trend + noise series with missing years and rounded (tied) values."""
+    t = np.arange(n_years)
+    values = rng.normal(0, 1, (n_pixels, n_years)) + rng.normal(0, 0.1, (n_pixels, 1)) * t
+    tied = rng.random(n_pixels) < tie_share
+    values[tied] = np.round(values[tied])
+    values[rng.random((n_pixels, n_years)) < nan_share] = np.nan
+    return values
+
+
+def main():
+    import tempfile
+    from pymannkendall import original_test
+
+    rng = np.random.default_rng(0)
+    print("Engine vs pymannkendall.original_test ...")
+    values = synthetic_stack(3000, 24, rng)
+    values[:5, :23] = np.nan  # pixels with a single valid year
+    res = mk_original_block(values)
+    for k in range(values.shape[0]):
+        x = values[k][~np.isnan(values[k])]
+        if len(x) < 2:
+            # original_test raises ZeroDivisionError here; the engine gives p = 1, NaN Tau/slope
+            assert res['p'][k] == 1 and np.isnan(res['tau'][k]) and np.isnan(res['slope'][k])
+            continue
+        r = original_test(x)
+        for key, ref in (('s', r.s), ('var_s', r.var_s), ('z', r.z), ('p', r.p),
+                         ('tau', r.Tau), ('slope', r.slope)):
+            got = res[key][k]
+            if not (np.isclose(got, ref, rtol=1e-12, atol=1e-12, equal_nan=True)):
+                raise SystemExit(f"MISMATCH pixel {k} {key}: {got} vs {ref}")
+    print(f"  {values.shape[0]} pixels x {values.shape[1]} years: identical s, var_s, z, p, Tau, slope")
+
+    print("Incremental store vs full recompute ...")
+    grid = synthetic_stack(60 * 70, 30, rng).reshape(60, 70, 30)
+    grid = grid.astype(np.float32).astype(np.float64)  # the store keeps float32, like the rasters
+    with tempfile.TemporaryDirectory() as tmp:
+        store = TrendStore(tmp)
+        for y in range(30):
+            store.append(1990 + y, grid[:, :, y])
+        for window in ((1990, 2019), (1995, 2010), (2001, 2019)):
+            got = store.query(*window, desc=f"Query {window}")
+            w = slice(window[0] - 1990, window[1] - 1990 + 1)
+            ref = mk_stack(grid[:, :, w], desc="Full recompute")
+            for a, b in zip(got, ref):
+                if not np.allclose(a, b, rtol=1e-12, atol=1e-12, equal_nan=True):
+                    raise SystemExit(f"MISMATCH for window {window}")
+        print("  appended state == full recompute for the full range and two sub-windows")
+
+        print("Benchmark (pixels, years: per-pixel pymannkendall s, engine s):")
+        big = synthetic_stack(20_000, 44, rng)
+        t0 = time.perf_counter()
+        for k in range(2_000):
+            x = big[k][~np.isnan(big[k])]
+            original_test(x)
+        t_ref = (time.perf_counter() - t0) * 10
+        t0 = time.perf_counter()
+        mk_original_block(big)
+        t_vec = time.perf_counter() - t0
+        print(f"  {big.shape[0]:>7} {big.shape[1]:>3}  {t_ref:8.2f} (extrapolated) {t_vec:8.2f}")
+
+        store2 = TrendStore(os.path.join(tmp, "big"))
+        grid = big.reshape(100, 200, 44)
+        for y in range(43):
+            store2.append(1980 + y, grid[:, :, y])
+        t0 = time.perf_counter()
+        store2.append(2023, grid[:, :, 43])
+        t_app = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        store2.query(desc="Full-range query")
+        t_q = time.perf_counter() - t0
+        print(f"  append one year to 43: {t_app:.3f} s; full-range query (slope from stack): {t_q:.2f} s")
+
+    validate_variants(rng)
+    benchmark_variants(rng)
+    validate_ci(rng)
+    benchmark_ci(rng)
+
+
+def reference_tests():
+    """(name, engine function, pymannkendall function, fewest valid years it accepts)."""
+    import pymannkendall as mk
+    return [
+        ('hamed_rao',               mk_hamed_rao_block,               mk.hamed_rao_modification_test, 3),
+        ('yue_wang',                mk_yue_wang_block,                mk.yue_wang_modification_test, 2),
+        ('prewhitening',            mk_prewhitening_block,            mk.pre_whitening_modification_test, 3),
+        ('trend_free_prewhitening', mk_trend_free_prewhitening_block, mk.trend_free_pre_whitening_modification_test, 3),
+    ]
+
+
+def whitening_is_ill_posed(name, x, slope):
+    """
+    Pre-whitening is undefined for a constant series (r1 = 0/0), and values
+    that are exactly tied in theory may come out 1 ulp apart, so S then
+    depends on rounding noise in either implementation. Differences on such
+    pixels are tolerated (and counted).
+    """
+    if name not in ('prewhitening', 'trend_free_prewhitening'):
+        return False
+    trend_free = name == 'trend_free_prewhitening'
+    if trend_free:
+        x = x - np.arange(1, len(x) + 1) * slope
+    y = x - x.mean()
+    if not np.any(y):
+        return True
+    w = x[1:] - x[:-1] * (np.dot(y[:-1], y[1:]) / np.dot(y, y))
+    if trend_free:
+        w = w + np.arange(1, len(w) + 1) * slope
+    w = np.sort(w)
+    return bool(np.any(np.diff(w) < 1e-12 * max(1.0, np.abs(w).max())))
+
+
+def validate_variants(rng, n_pixels=2000, n_years=24):
+    """Modified and seasonal tests vs pymannkendall on random, tied and autocorrelated pixels."""
+    import warnings
+    from pymannkendall import seasonal_test
+
+    values = synthetic_stack(n_pixels, n_years, rng)
+    values[:200] = np.cumsum(rng.normal(0, 1, (200, n_years)), axis=1)  # strongly autocorrelated
+    values[200:203] = 5.0                                                # constant
+    values[203:206, 2:] = np.nan                                          # too short for some tests
+    for name, engine, reference, min_n in reference_tests():
+        for lag in ((None, 3) if name in ('hamed_rao', 'yue_wang') else (None,)):
+            kwargs = {} if lag is None else {'lag': lag}
+            res = engine(values, **kwargs)
+            compared = tolerated = 0
+            for k in range(n_pixels):
+                x = values[k][~np.isnan(values[k])]
+                if len(x) < min_n or (lag is not None and lag >= len(x)):
+                    continue  # pymannkendall raises (division by zero / lag beyond the series)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    r = reference(x, **kwargs)
+                compared += 1
+                for key, ref in (('s', r.s), ('var_s', r.var_s), ('z', r.z), ('p', r.p),
+                                 ('tau', r.Tau), ('slope', r.slope)):
+                    got = res[key][k]
+                    # the autocorrelations are summed in a different order: agree to ~1e-12
+                    if not np.isclose(got, ref, rtol=1e-9, atol=1e-12, equal_nan=True):
+                        if whitening_is_ill_posed(name, x, res['slope'][k]):
+                            tolerated += 1
+                            break
+                        raise SystemExit(f"MISMATCH {name} lag={lag} pixel {k} {key}: {got} vs {ref}")
+            print(f"  {name:<24} lag={str(lag):<4} {compared - tolerated}/{compared} pixels agree"
+                  + (f", {tolerated} differ only on rounding-tied whitened values" if tolerated else ""))
+
+    seasons = synthetic_stack(n_pixels // 2, n_years * 4, rng).reshape(-1, n_years, 4)
+    seasons[:5, :, 1] = np.nan  # a season with no data
+    res = mk_seasonal_block(seasons)
+    for k in range(seasons.shape[0]):
+        r = seasonal_test(seasons[k].ravel(), period=4)
+        for key, ref in (('s', r.s), ('var_s', r.var_s), ('z', r.z), ('p', r.p),
+                         ('tau', r.Tau), ('slope', r.slope)):
+            if not np.isclose(res[key][k], ref, rtol=1e-12, atol=1e-12, equal_nan=True):
+                raise SystemExit(f"MISMATCH seasonal pixel {k} {key}: {res[key][k]} vs {ref}")
+    print(f"  {'seasonal':<24} {'':<9} {seasons.shape[0]} pixels x {n_years} years x 4 seasons agree")
+
+
+def benchmark_variants(rng, n_pixels=20_000, n_years=44, n_reference=500):
+    """Per-pixel pymannkendall (extrapolated from n_reference pixels) vs the engine."""
+    import warnings
+    from pymannkendall import seasonal_test
+
+    print("Benchmark (pixels, years: per-pixel pymannkendall s, engine s):")
+    values = synthetic_stack(n_pixels, n_years, rng)
+    seasons = synthetic_stack(n_pixels, n_years * 4, rng).reshape(n_pixels, n_years, 4)
+    cases = [(name, engine, reference, values) for name, engine, reference, _ in reference_tests()]
+    cases.append(('seasonal', mk_seasonal_block, lambda x: seasonal_test(x.ravel(), period=4), seasons))
+    for name, engine, reference, data in cases:
+        t0 = time.perf_counter()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            for k in range(n_reference):
+                x = data[k]
+                reference(x if x.ndim > 1 else x[~np.isnan(x)])
+        t_ref = (time.perf_counter() - t0) * n_pixels / n_reference
+        t0 = time.perf_counter()
+        for start in range(0, n_pixels, BLOCK_PIXELS):
+            engine(data[start:start + BLOCK_PIXELS])
+        t_vec = time.perf_counter() - t0
+        print(f"  {name:<24} {n_pixels:>7} {n_years:>3}  {t_ref:8.2f} (extrapolated) {t_vec:8.2f}")
+
+
+def gilbert_ci(x, alpha=ALPHA):
+    """Per-pixel reference of the analytic bounds (Gilbert 1987, eq. 16.7-16.8)."""
+    from pymannkendall import original_test
+    slopes = sorted((x[j] - x[i]) / (j - i) for i in range(len(x)) for j in range(i + 1, len(x)))
+    c = ndtri(1 - alpha / 2) * np.sqrt(original_test(x).var_s)
+    m = len(slopes)
+    lower = min(max(int(np.round((m - c) / 2)), 1), m)
+    upper = min(max(int(np.round((m + c) / 2 + 1)), 1), m)
+    return slopes[lower - 1], slopes[upper - 1]
+
+
+def ar1_stack(n_pixels, n_years, rho, rng, slope=0.1):
+    """Linear trend `slope` plus AR(1) noise with lag-one correlation rho."""
+    e = rng.normal(0, 1, (n_pixels, n_years))
+    for t in range(1, n_years):
+        e[:, t] = rho * e[:, t - 1] + np.sqrt(1 - rho ** 2) * e[:, t]
+    return slope * np.arange(n_years) + e
+
+
+def validate_ci(rng, n_pixels=1000, n_years=30, n_boot=200):
+    """Analytic bounds vs a per-pixel reference, reproducibility and coverage."""
+    print("Sen's slope confidence bounds ...")
+    values = synthetic_stack(n_pixels, n_years, rng)
+    res = sens_slope_ci_block(values)
+    for k in range(n_pixels):
+        x = values[k][~np.isnan(values[k])]
+        if not np.allclose((res['lower'][k], res['upper'][k]), gilbert_ci(x), rtol=1e-12, atol=1e-12):
+            raise SystemExit(f"MISMATCH analytic CI pixel {k}")
+    if not np.array_equal(res['slope'], mk_original_block(values)['slope'], equal_nan=True):
+        raise SystemExit("MISMATCH: CI slope differs from the engine's Sen's slope")
+    print(f"  analytic bounds of {n_pixels} pixels equal the per-pixel Gilbert (1987) reference")
+
+    a = sens_slope_ci_block(values[:200], n_boot=n_boot, rng=np.random.default_rng(1))
+    b = sens_slope_ci_block(values[:200], n_boot=n_boot, rng=np.random.default_rng(1))
+    if not all(np.array_equal(a[k], b[k], equal_nan=True) for k in a):
+        raise SystemExit("MISMATCH: bootstrap bounds are not reproducible for one seed")
+    print("  bootstrap bounds reproducible for a fixed seed")
+
+    print(f"  coverage of the true slope 0.1 ({n_pixels} pixels x {n_years} years, 1 - alpha = {1 - ALPHA}):")
+    for rho in (0.0, 0.5):
+        x = ar1_stack(n_pixels, n_years, rho, rng)
+        res = sens_slope_ci_block(x, n_boot=n_boot, rng=np.random.default_rng(2))
+        analytic = np.mean((res['lower'] <= 0.1) & (0.1 <= res['upper']))
+        boot = np.mean((res['boot_lower'] <= 0.1) & (0.1 <= res['boot_upper']))
+        print(f"    AR(1) rho={rho:.1f}: analytic {analytic:.3f}, moving-block bootstrap {boot:.3f}")
+
+
+def benchmark_ci(rng, n_pixels=20_000, n_years=44, n_boot=200):
+    print("Benchmark (pixels, years: analytic s, bootstrap s per 1000 pixels):")
+    values = synthetic_stack(n_pixels, n_years, rng)
+    t0 = time.perf_counter()
+    for start in range(0, n_pixels, BLOCK_PIXELS):
+        sens_slope_ci_block(values[start:start + BLOCK_PIXELS])
+    t_an = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    sens_slope_ci_block(values[:1000], n_boot=n_boot, rng=np.random.default_rng(3))
+    t_boot = time.perf_counter() - t0
+    print(f"  {n_pixels:>7} {n_years:>3}  {t_an:8.2f} {t_boot:8.2f} ({n_boot} resamples)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""
+=============================================================================
+  Multi-window Mann-Kendall runner (one tiled pass over the year stack)
+=============================================================================
+
+The *_mk_test.py scripts analyse ONE start_year/end_year window per run, so
+the commented-out windows (1980-2023, 1980-2000, 2001-2023, 2006-2023) meant
+re-running the script, and re-reading every raster, once per window.
+
+run_windows() takes a list of windows and (optionally) seasons and, per
+season (or once for the annual rasters):
+
+- opens every raster of the union of the windows once (raster catalog);
+- walks the grid in strips of TILE_ROWS rows; each strip is read from every
+  year exactly once (READ_WORKERS threads, one file per thread at a time);
+- runs the vectorized test (TEST, one of mk_trend.TESTS) for EVERY window
+  on that strip before moving on, so the stack is never loaded whole;
+- writes the strip into all sen_slope_*, p_value_* and kendall_tau_*
+  outputs, which stay open for the whole pass.
+
+Strips are independent tasks: with TILE_WORKERS > 1 a process pool reads and
+computes several strips at once while this process writes the results in
+order. SLOPE_CI adds confidence bounds of Sen's slope per window
+(sen_slope_lower_* / sen_slope_upper_*, and sen_slope_boot_lower_* /
+sen_slope_boot_upper_* for the moving-block bootstrap); every strip and
+window draws its resamples from a generator seeded with (CI_SEED, first
+row, window), so the bounds do not depend on the number of workers.
+
+Output names, values and metadata are those of the single-window scripts:
+
+    annual   : sen_slope_<start>-<end>.tif, p_value_..., kendall_tau_...
+    seasonal : sen_slope_<season>_<start>-<end>.tif, ...
+
+(any TEST other than "original" adds its name: sen_slope_hamed_rao_...).
+With FDR_ALPHA set, every p_value raster also gets its Benjamini-Hochberg
+q-values and significance mask (fdr_raster.py). Given a stage_cache.StageCache,
+each window whose rasters (by content) and settings were seen before is
+served from the cache and left out of the pass.
+
+Windows with fewer than two rasters are skipped with a message. Edit the
+configuration below and run this file directly.
+=============================================================================
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+from tqdm import tqdm
+
+from raster_catalog import catalog_files, check_single_grid
+from mk_trend import BLOCK_PIXELS, BOOT_BLOCK_LENGTH, BOOT_SEED, TESTS, sens_slope_ci_block
+from fdr_raster import fdr_correct_raster, fdr_paths
+
+# =============================================================================
+#  CONFIGURATION
+# =============================================================================
+
+INPUT_DIR  = r"D:\Publications\Bhaleka_1\data\daymet_srad\processed_nwt_clipped_annual_mean"
+OUTPUT_DIR = r"D:\Publications\Bhaleka_1\data\daymet_srad\processed_nwt_clipped_annual_mean_mk_test"
+DATASET    = "daymet_srad"
+
+WINDOWS = [(1980, 2023), (1980, 2000), (2001, 2023), (2006, 2023)]
+SEASONS = None   # None: annual rasters; or e.g. ["autumn", "summer", "spring", "winter"]
+TEST    = "original"   # or "hamed_rao", "yue_wang", "prewhitening", "trend_free_prewhitening"
+FDR_ALPHA = 0.05       # BH q-values + significance mask per p_value raster; None: skip
+
+SLOPE_CI          = None   # None, "analytic" (Gilbert 1987) or "bootstrap" (analytic + moving-block bootstrap)
+CI_ALPHA          = 0.05   # bounds of the 1 - CI_ALPHA interval
+CI_RESAMPLES      = 1000   # bootstrap resamples per pixel
+CI_BLOCK_LENGTH   = BOOT_BLOCK_LENGTH  # years per bootstrap block
+CI_SEED           = BOOT_SEED
+
+TILE_ROWS     = 256      # raster rows read per strip
+TILE_WORKERS  = os.cpu_count() or 1  # processes working on strips (1: all in this process)
+READ_WORKERS  = 8        # threads reading the strip of each year
+OUTPUT_NODATA = 3.4e+38  # nodata tag of the outputs, as in the MK scripts
+
+# =============================================================================
+
+OUTPUTS = (('slope', 'sen_slope'), ('p', 'p_value'), ('tau', 'kendall_tau'))
+CI_OUTPUTS = (('lower', 'sen_slope_lower'), ('upper', 'sen_slope_upper'))
+BOOT_OUTPUTS = (('boot_lower', 'sen_slope_boot_lower'), ('boot_upper', 'sen_slope_boot_upper'))
+
+
+def output_kinds(slope_ci):
+    if slope_ci is None:
+        return OUTPUTS
+    if slope_ci == "analytic":
+        return OUTPUTS + CI_OUTPUTS
+    if slope_ci == "bootstrap":
+        return OUTPUTS + CI_OUTPUTS + BOOT_OUTPUTS
+    raise ValueError(f"Unknown SLOPE_CI {slope_ci!r}")
+
+
+def output_path(output_dir, prefix, window, season=None, test="original"):
+    label = ("" if test == "original" else f"{test}_") + (f"{season}_" if season else "")
+    return os.path.join(output_dir, f"{prefix}_{label}{window[0]}-{window[1]}.tif")
+
+
+def read_strip(src, window):
+    """One strip of band 1 as float32 with nodata -> NaN (as mk_trend.read_year)."""
+    data = src.read(1, window=window).astype(np.float32)
+    if src.nodata is not None:
+        data[data == src.nodata] = np.nan
+    return data
+
+
+def strip_trends(stack, columns, test="original", ci=None, rng=None):
+    """
+    The test for every pixel of a (pixels, years) strip; all-NaN pixels stay
+    NaN. `columns` selects the years of one window. With `ci` (a dict of
+    sens_slope_ci_block arguments) the slope bounds are added.
+    """
+    block = TESTS[test]
+    values = stack[:, columns]
+    keys = [key for key, _ in OUTPUTS]
+    if ci is not None:
+        keys += ['lower', 'upper'] + (['boot_lower', 'boot_upper'] if ci['n_boot'] else [])
+    out = {key: np.full(values.shape[0], np.nan) for key in keys}
+    todo = np.flatnonzero(~np.isnan(values).all(axis=1))
+    for start in range(0, len(todo), BLOCK_PIXELS):
+        idx = todo[start:start + BLOCK_PIXELS]
+        res = block(values[idx])
+        if ci is not None:
+            res.update(sens_slope_ci_block(values[idx], rng=rng, **ci))
+        for key in keys:
+            out[key][idx] = res[key]
+    return out
+
+
+def process_strip(task):
+    """
+    Worker: read one strip from every raster and compute all windows.
+    Returns (row, {(window, key): float32 strip}).
+    """
+    paths, row, n_rows, width, columns, test, ci, seed, read_workers = task
+    strip = Window(0, row, width, n_rows)
+    sources = [rasterio.open(path) for path in paths]
+    try:
+        with ThreadPoolExecutor(max_workers=read_workers) as pool:
+            layers = list(pool.map(lambda src: read_strip(src, strip), sources))
+    finally:
+        for src in sources:
+            src.close()
+    stack = np.stack([layer.ravel() for layer in layers], axis=1).astype(np.float64)
+    results = {}
+    for window, cols in columns.items():
+        # Seeded by the window itself: its bounds do not change when other windows are
+        # added, reordered or served from the stage cache
+        rng = np.random.default_rng([seed, row, window[0], window[1]]) if ci is not None else None
+        res = strip_trends(stack, cols, test, ci, rng)
+        for key, data in res.items():
+            results[window, key] = data.reshape(n_rows, width).astype(np.float32)
+    return row, results
+
+
+def window_outputs(output_dir, window, season, test, slope_ci, fdr_alpha):
+    """Every raster written for one window, FDR outputs included."""
+    paths = [output_path(output_dir, prefix, window, season, test) for _, prefix in output_kinds(slope_ci)]
+    if fdr_alpha is not None:
+        paths += fdr_paths(output_path(output_dir, 'p_value', window, season, test))
+    return paths
+
+
+def run_group(entries, windows, output_dir, season=None, tile_rows=TILE_ROWS, workers=READ_WORKERS,
+              test=TEST, fdr_alpha=FDR_ALPHA, slope_ci=SLOPE_CI, tile_workers=TILE_WORKERS, cache=None):
+    """
+    All windows for one group of annual (or one season's) rasters in a single
+    tiled pass. Returns the list of written output paths.
+    """
+    years = [e.year for e in entries]
+    if len(set(years)) != len(years):
+        raise ValueError(f"More than one raster per year in {os.path.dirname(entries[0].path)}")
+    check_single_grid(entries)
+
+    # Columns of the year stack that belong to each window
+    columns = {}
+    for window in windows:
+        cols = [k for k, y in enumerate(years) if window[0] <= y <= window[1]]
+        if len(cols) < 2:
+            print(f"Skipping {window[0]}-{window[1]}" + (f" ({season})" if season else "")
+                  + f": {len(cols)} raster(s) in the window")
+            continue
+        columns[window] = np.array(cols)
+
+    written = []
+    keys = {}
+    if cache is not None:
+        for window in list(columns):
+            params = {'window': window, 'season': season, 'test': test, 'fdr_alpha': fdr_alpha,
+                      'slope_ci': slope_ci, 'nodata': OUTPUT_NODATA}
+            if slope_ci is not None:
+                params.update(ci_alpha=CI_ALPHA, resamples=CI_RESAMPLES, block_length=CI_BLOCK_LENGTH,
+                              seed=CI_SEED, tile_rows=tile_rows)  # the resamples are seeded per strip
+            keys[window] = cache.key("mk_trend", [entries[k].path for k in columns[window]], params)
+            served = cache.fetch(keys[window], output_dir, "mk_trend")
+            if served is not None:
+                print(f"{window[0]}-{window[1]}" + (f" ({season})" if season else "") + ": from the stage cache")
+                written += served
+                del columns[window]
+    if not columns:
+        return written
+    used = sorted({k for cols in columns.values() for k in cols})
+    paths = [entries[k].path for k in used]
+    position = {k: i for i, k in enumerate(used)}
+    columns = {w: np.array([position[k] for k in cols]) for w, cols in columns.items()}
+
+    with rasterio.open(paths[0]) as template:
+        meta = template.meta.copy()
+        height, width = template.height, template.width
+    meta.update(dtype=rasterio.float32, count=1, compress='lzw', nodata=OUTPUT_NODATA)
+
+    kinds = output_kinds(slope_ci)
+    ci = None
+    if slope_ci is not None:
+        ci = {'alpha': CI_ALPHA, 'block_length': CI_BLOCK_LENGTH,
+              'n_boot': CI_RESAMPLES if slope_ci == "bootstrap" else 0}
+    tasks = [(paths, row, min(tile_rows, height - row), width, columns, test, ci, CI_SEED, workers)
+             for row in range(0, height, tile_rows)]
+
+    # Outputs are replaced, not rewritten in place: a served one may be a hardlink into the cache
+    for window in columns:
+        for path in window_outputs(output_dir, window, season, test, slope_ci, fdr_alpha):
+            if os.path.lexists(path):
+                os.remove(path)
+
+    outputs = {}
+    pool = ProcessPoolExecutor(max_workers=tile_workers) if tile_workers > 1 else None
+    try:
+        for window in columns:
+            for key, prefix in kinds:
+                path = output_path(output_dir, prefix, window, season, test)
+                outputs[window, key] = rasterio.open(path, 'w', **meta)
+
+        label = f" ({season})" if season else ""
+        results = pool.map(process_strip, tasks) if pool else map(process_strip, tasks)
+        for row, strip_results in tqdm(results, total=len(tasks), desc=f"Mann-Kendall strips{label}", unit="strip"):
+            for (window, key), data in strip_results.items():
+                outputs[window, key].write(data, 1, window=Window(0, row, width, data.shape[0]))
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+        for dst in outputs.values():
+            dst.close()
+
+    if fdr_alpha is not None:
+        for window in columns:
+            fdr_correct_raster(output_path(output_dir, 'p_value', window, season, test), alpha=fdr_alpha)
+    for window in columns:
+        window_paths = window_outputs(output_dir, window, season, test, slope_ci, fdr_alpha)
+        if cache is not None:
+            cache.store(keys[window], "mk_trend", window_paths, output_dir)
+        written += window_paths
+    return written
+
+
+def run_windows(input_dir, dataset, output_dir, windows, seasons=None,
+                tile_rows=TILE_ROWS, workers=READ_WORKERS, test=TEST, fdr_alpha=FDR_ALPHA,
+                slope_ci=SLOPE_CI, tile_workers=TILE_WORKERS, cache=None):
+    """
+    Trend outputs for every window (and season, if given) of `dataset` in
+    `input_dir`, reading each raster strip once per group.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    first = min(w[0] for w in windows)
+    last = max(w[1] for w in windows)
+    written = []
+    for season in seasons or [None]:
+        if season:
+            print(f"Processing season: {season}")
+            entries = catalog_files(input_dir, dataset, kind="seasonal", season=season,
+                                    start_year=first, end_year=last)
+        else:
+            entries = catalog_files(input_dir, dataset, kind="annual", start_year=first, end_year=last)
+        if not entries:
+            print(f"No {season or 'annual'} rasters of {dataset} in {first}-{last}")
+            continue
+        written += run_group(entries, windows, output_dir, season, tile_rows, workers, test, fdr_alpha,
+                             slope_ci, tile_workers, cache)
+    print(f"Trend analysis completed: {len(written)} rasters saved.")
+    return written
+
+
+if __name__ == "__main__":
+    run_windows(INPUT_DIR, DATASET, OUTPUT_DIR, WINDOWS, SEASONS, test=TEST, fdr_alpha=FDR_ALPHA,
+                slope_ci=SLOPE_CI, tile_workers=TILE_WORKERS)
@@ -5,11 +5,13 @@
 
 
 import os
-import rasterio
-import numpy as np
-from glob import glob
+import sys
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # raster_catalog.py lives in the repository root
+from raster_catalog import catalog_files
+from raster_accumulate import update_group_means
+
 # Define start and end years
 start_year = 2006
 end_year = 2023
@@ -23,18 +25,9 @@ output_directory = r"D:\Publications\Bhaleka_1\data\ceres_solar_insolation\proce
 if not os.path.exists(output_directory):
     os.makedirs(output_directory)
 
-# Function to read raster data
-def read_raster(file_path):
-    with rasterio.open(file_path) as src:
-        return src.read(1), src.meta
-
-# Function to write raster data
-def write_raster(data, meta, output_path):
-    with rasterio.open(output_path, 'w', **meta) as dst:
-        dst.write(data, 1)
-
-# Get list of all raster files in the input directory
-raster_files = glob(os.path.join(input_directory, "ceres_solar_insolation_*.TIFF"))
+# Incremental mode: only new/changed daily rasters are read and only the affected
+# outputs are rewritten (running sums are kept in <output_directory>\.mean_state)
+incremental = True
 
 # Define seasons
 seasons = {
@@ -44,65 +37,20 @@ seasons = {
     'winter': ['12', '01', '02']
 }
 
-# Filter raster files by year range
-filtered_raster_files = []
-for file_path in raster_files:
-    basename = os.path.basename(file_path)
-    date_part = basename.split('_')[3]  # Correcting the index to match the date format
-    year = int(date_part.split('-')[0])
-    if start_year <= year <= end_year:
-        filtered_raster_files.append(file_path)
+# Daily rasters within the year range (from the raster catalog)
+daily_entries = catalog_files(input_directory, "ceres_solar_insolation", kind="daily",
+                              start_year=start_year, end_year=end_year)
 
 # Group raster files by season
 rasters_by_season = {season: [] for season in seasons}
-for file_path in tqdm(filtered_raster_files, desc="Grouping files by season"):
-    basename = os.path.basename(file_path)
-    date_part = basename.split('_')[3]  # Correcting the index to match the date format
-    year = date_part.split('-')[0]
-    month = date_part.split('-')[1]
+for entry in tqdm(daily_entries, desc="Grouping files by season"):
+    month = f"{entry.month:02d}"
     for season, months in seasons.items():
         if month in months:
-            rasters_by_season[season].append(file_path)
+            rasters_by_season[season].append(entry)
             break
 
-# Process each season
-for season, files in tqdm(rasters_by_season.items(), desc="Processing seasons"):
-    if not files:
-        continue  # Skip if there are no files for this season
-
-    # Initialize sum and count arrays
-    data_sum = None
-    data_count = None
-
-    for file_path in tqdm(files, desc=f"Processing files for {season}", leave=False):
-        data, meta = read_raster(file_path)
-
-        if data_sum is None:
-            data_sum = np.zeros_like(data, dtype=np.float64)
-            data_count = np.zeros_like(data, dtype=np.float64)
-
-        valid_mask = data != meta.get('nodata', -9999)
-        data_sum[valid_mask] += data[valid_mask]
-        data_count[valid_mask] += 1
-
-    # Calculate the mean
-    valid_pixels = data_count > 0
-    seasonal_mean_data = np.zeros_like(data_sum, dtype=np.float64)
-    seasonal_mean_data[valid_pixels] = data_sum[valid_pixels] / data_count[valid_pixels]
-    seasonal_mean_data[~valid_pixels] = meta.get('nodata', -9999)
-
-    # Update meta for the output raster
-    meta.update({
-        "driver": "GTiff",
-        "height": seasonal_mean_data.shape[0],
-        "width": seasonal_mean_data.shape[1],
-        "transform": meta['transform'],
-        "dtype": 'float32',
-        "compress": 'lzw'
-    })
-
-    # Save the seasonal mean raster
-    output_file_path = os.path.join(output_directory, f"ceres_solar_insolation_{season}_{start_year}-{end_year}.tif")
-    write_raster(seasonal_mean_data.astype(np.float32), meta, output_file_path)
-
-    print(f"Saved seasonal mean raster for {season} {start_year}-{end_year} to {output_file_path}")
\ No newline at end of file
+# Fold the daily rasters into the per-season period means and save the changed seasons
+update_group_means(rasters_by_season, output_directory,
+                   lambda season: f"ceres_solar_insolation_{season}_{start_year}-{end_year}.tif",
+                   divisor="valid", rebuild=not incremental, desc="Processing seasons")
@@ -4,11 +4,13 @@
 # python process_3.py
 
 import os
-import rasterio
-import numpy as np
-from glob import glob
+import sys
 from tqdm import tqdm
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # raster_catalog.py lives in the repository root
+from raster_catalog import catalog_files
+from raster_accumulate import update_group_means
+
 #input_directory = r"D:\Publications\Bhaleka_1\data\ceres_solar_insolation\processed_nwt_clipped"
 input_directory = r"D:\Publications\Bhaleka_1\data\ceres_solar_insolation\processed_ns_clipped"
 
@@ -18,18 +20,9 @@ output_directory = r"D:\Publications\Bhaleka_1\data\ceres_solar_insolation\proce
 if not os.path.exists(output_directory):
     os.makedirs(output_directory)
 
-# Function to read raster data
-def read_raster(file_path):
-    with rasterio.open(file_path) as src:
-        return src.read(1), src.meta
-
-# Function to write raster data
-def write_raster(data, meta, output_path):
-    with rasterio.open(output_path, 'w', **meta) as dst:
-        dst.write(data, 1)
-
-# Get list of all raster files in the input directory
-raster_files = glob(os.path.join(input_directory, "ceres_solar_insolation_*.TIFF"))
+# Incremental mode: only new/changed daily rasters are read and only the affected
+# outputs are rewritten (running sums are kept in <output_directory>\.mean_state)
+incremental = True
 
 # Define seasons
 seasons = {
@@ -39,13 +32,12 @@ seasons = {
     'winter': ['12', '01', '02']
 }
 
-# Group raster files by year and season
+# Group the daily rasters by year and season (file dates come from the raster catalog)
 rasters_by_year_season = {}
-for file_path in tqdm(raster_files, desc="Grouping files by year and season"):
-    basename = os.path.basename(file_path)
-    date_part = basename.split('_')[3]  # Correcting the index to match the date format
-    year = date_part.split('-')[0]
-    month = date_part.split('-')[1]
+daily_entries = catalog_files(input_directory, "ceres_solar_insolation", kind="daily")
+for entry in tqdm(daily_entries, desc="Grouping files by year and season"):
+    year = str(entry.year)
+    month = f"{entry.month:02d}"
     for season, months in seasons.items():
         if month in months:
             if month == '12':
@@ -58,48 +50,10 @@ for file_path in tqdm(raster_files, desc="Grouping files by year and season"):
             key = f"{year}_{season}"
             if key not in rasters_by_year_season:
                 rasters_by_year_season[key] = []
-            rasters_by_year_season[key].append(file_path)
+            rasters_by_year_season[key].append(entry)
             break
 
-# Process each year and season
-for year_season, files in tqdm(rasters_by_year_season.items(), desc="Processing years and seasons"):
-    year, season = year_season.split('_')
-    if not files:
-        continue  # Skip if there are no files for this season
-
-    # Initialize sum and count arrays
-    data_sum = None
-    data_count = None
-
-    for file_path in tqdm(files, desc=f"Processing files for {season} {year}", leave=False):
-        data, meta = read_raster(file_path)
-
-        if data_sum is None:
-            data_sum = np.zeros_like(data, dtype=np.float64)
-            data_count = np.zeros_like(data, dtype=np.float64)
-
-        valid_mask = data != meta.get('nodata', -9999)
-        data_sum[valid_mask] += data[valid_mask]
-        data_count[valid_mask] += 1
-
-    # Calculate the mean
-    valid_pixels = data_count > 0
-    seasonal_mean_data = np.zeros_like(data_sum, dtype=np.float64)
-    seasonal_mean_data[valid_pixels] = data_sum[valid_pixels] / data_count[valid_pixels]
-    seasonal_mean_data[~valid_pixels] = meta.get('nodata', -9999)
-
-    # Update meta for the output raster
-    meta.update({
-        "driver": "GTiff",
-        "height": seasonal_mean_data.shape[0],
-        "width": seasonal_mean_data.shape[1],
-        "transform": meta['transform'],
-        "dtype": 'float32',
-        "compress": 'lzw'
-    })
-
-    # Save the seasonal mean raster
-    output_file_path = os.path.join(output_directory, f"ceres_solar_insolation_{year}_{season}.tif")
-    write_raster(seasonal_mean_data.astype(np.float32), meta, output_file_path)
-
-    print(f"Saved seasonal mean raster for {season} {year} to {output_file_path}")
+# Fold the daily rasters into the per-season means and save the changed seasons
+update_group_means(rasters_by_year_season, output_directory,
+                   lambda year_season: f"ceres_solar_insolation_{year_season}.tif",
+                   divisor="valid", rebuild=not incremental, desc="Processing years and seasons")
@@ -0,0 +1,241 @@
+"""
+=============================================================================
+  Near-duplicate PDF detection (text shingles + MinHash LSH)
+=============================================================================
+
+Finds papers saved twice with DIFFERENT bytes (annotated vs clean copy,
+preprint vs published version), which exact hashing cannot see:
+
+- The text of the first N_PAGES pages is extracted (PyMuPDF, else pypdf),
+  lower-cased and split into words; every SHINGLE_WORDS consecutive words form
+  a shingle (CRC32-hashed).
+- Each document gets a NUM_PERM-value MinHash signature
+  (min over shingles of (a*x + b) mod p for NUM_PERM random (a, b)).
+- Signatures are cut into LSH_BANDS bands; documents sharing any band bucket
+  become candidate pairs — no all-pairs comparison. Candidates are kept when
+  their estimated Jaccard similarity (share of equal signature values) is at
+  least SIMILARITY_THRESHOLD, and joined into groups.
+- Signatures are cached in .pdf_minhash_cache.json (key: path, size, mtime
+  and the MinHash parameters), so re-scans only parse new or changed PDFs.
+- Groups are only REPORTED (near_duplicates_report.json) or QUARANTINED
+  (all but one file moved to QUARANTINE_DIR_NAME); nothing is ever deleted.
+
+Used by mendeley_duplicate_pdf_remover.py with match_mode = "near", or run
+directly on DIRECTORY.
+=============================================================================
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from tqdm import tqdm
+
+try:
+    import fitz  # PyMuPDF
+except ImportError:
+    fitz = None
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        print("Near-duplicate mode needs 'pymupdf' or 'pypdf'. Install one with: pip install pymupdf")
+        sys.exit(1)
+
+# =============================================================================
+#  CONFIGURATION
+# =============================================================================
+
+DIRECTORY = r"C:\Users\alire\OneDrive\Desktop\lake_ontario"
+EXTENSION = ".pdf"
+
+N_PAGES              = 3      # pages of text used per PDF
+SHINGLE_WORDS        = 5      # words per shingle
+NUM_PERM             = 128    # MinHash signature length
+LSH_BANDS            = 16     # bands x rows = NUM_PERM; 16 x 8 -> pairs above ~0.7 collide
+SIMILARITY_THRESHOLD = 0.8    # estimated Jaccard needed to call two PDFs near-duplicates
+MIN_SHINGLES         = 20     # PDFs with less text (scans, empty pages) are skipped
+SEED                 = 1
+
+ACTION              = "report"   # "report" | "quarantine" (never deletes)
+QUARANTINE_DIR_NAME = "_near_duplicates"
+REPORT_NAME         = "near_duplicates_report.json"
+CACHE_NAME          = ".pdf_minhash_cache.json"
+N_WORKERS           = os.cpu_count() or 1
+
+# =============================================================================
+
+PRIME = np.uint64(4294967291)  # largest prime < 2^32: hashes mod PRIME fit the uint32 signatures
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+def permutations(num_perm=NUM_PERM, seed=SEED):
+    """(a, b) coefficients of the NUM_PERM hash permutations."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2**32, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, 2**32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def cache_params():
+    return {"pages": N_PAGES, "shingle": SHINGLE_WORDS, "num_perm": NUM_PERM, "seed": SEED,
+            "prime": int(PRIME)}
+
+
+def extract_text(path, n_pages=N_PAGES):
+    """Text of the first n_pages pages ('' if the PDF cannot be read)."""
+    try:
+        if fitz is not None:
+            with fitz.open(path) as doc:
+                return "\n".join(doc[i].get_text() for i in range(min(n_pages, doc.page_count)))
+        reader = PdfReader(path)
+        return "\n".join((reader.pages[i].extract_text() or "") for i in range(min(n_pages, len(reader.pages))))
+    except Exception:
+        return ""
+
+
+def shingle_hashes(text, k=SHINGLE_WORDS):
+    """Distinct CRC32 hashes of the k-word shingles of `text`."""
+    words = WORD_RE.findall(text.lower())
+    if len(words) < k:
+        return np.empty(0, dtype=np.uint64)
+    shingles = {zlib.crc32(" ".join(words[i:i + k]).encode("utf-8")) for i in range(len(words) - k + 1)}
+    return np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+
+
+def minhash(shingles, a, b):
+    """MinHash signature: per permutation, min over shingles of (a*x + b) mod p."""
+    # a, x < 2^32 -> a*x + b < 2^64, no uint64 overflow
+    values = (np.outer(shingles, a) + b) % PRIME
+    return values.min(axis=0).astype(np.uint32)
+
+
+def signature_for(path):
+    """Worker: (path, signature hex or None, shingle count)."""
+    a, b = permutations()
+    shingles = shingle_hashes(extract_text(path))
+    if len(shingles) < MIN_SHINGLES:
+        return path, None, len(shingles)
+    return path, minhash(shingles, a, b).tobytes().hex(), len(shingles)
+
+
+def load_signatures(files, cache_path):
+    """{path: signature array} for every PDF with enough text, using the cache."""
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+        if cache.get("params") != cache_params():
+            cache = {}
+    except (OSError, ValueError):
+        cache = {}
+    entries = cache.get("files", {})
+
+    todo = []
+    for name, path, size, mtime_ns in files:
+        hit = entries.get(path)
+        if not (hit and hit["size"] == size and hit["mtime_ns"] == mtime_ns):
+            todo.append((path, size, mtime_ns))
+    if todo:
+        meta = {path: (size, mtime_ns) for path, size, mtime_ns in todo}
+        with ProcessPoolExecutor(max_workers=N_WORKERS) as pool:
+            results = pool.map(signature_for, [t[0] for t in todo], chunksize=4)
+            for path, sig, n_shingles in tqdm(results, total=len(todo), desc="MinHash signatures", unit="pdf"):
+                size, mtime_ns = meta[path]
+                entries[path] = {"size": size, "mtime_ns": mtime_ns, "sig": sig, "shingles": n_shingles}
+
+    present = {f[1] for f in files}
+    entries = {p: v for p, v in entries.items() if p in present}
+    try:
+        with open(cache_path, "w", encoding="utf-8") as f:
+            json.dump({"params": cache_params(), "files": entries}, f)
+    except OSError as e:
+        print(f"Could not save signature cache ({e}).")
+
+    return {p: np.frombuffer(bytes.fromhex(v["sig"]), dtype=np.uint32)
+            for p, v in entries.items() if v["sig"] is not None}
+
+
+def lsh_candidate_pairs(signatures, bands=LSH_BANDS):
+    """Pairs of paths that share at least one LSH band bucket."""
+    rows = NUM_PERM // bands
+    pairs = set()
+    for band in range(bands):
+        buckets = {}
+        for path, sig in signatures.items():
+            key = sig[band * rows:(band + 1) * rows].tobytes()
+            buckets.setdefault(key, []).append(path)
+        for members in buckets.values():
+            if len(members) > 1:
+                members.sort()
+                for i in range(len(members)):
+                    for j in range(i + 1, len(members)):
+                        pairs.add((members[i], members[j]))
+    return pairs
+
+
+def near_duplicate_groups(signatures, threshold=SIMILARITY_THRESHOLD):
+    """Groups (with pairwise similarities) of PDFs above the threshold."""
+    parent = {}
+
+    def find(x):
+        while parent.get(x, x) != x:
+            parent[x] = parent.get(parent[x], parent[x])
+            x = parent[x]
+        return x
+
+    edges = []
+    for p, q in lsh_candidate_pairs(signatures):
+        sim = float(np.mean(signatures[p] == signatures[q]))
+        if sim >= threshold:
+            edges.append((p, q, sim))
+            parent[find(p)] = find(q)
+
+    groups = {}
+    for p, q, sim in edges:
+        g = groups.setdefault(find(p), {"files": set(), "pairs": []})
+        g["files"].update((p, q))
+        g["pairs"].append({"a": os.path.basename(p), "b": os.path.basename(q), "similarity": round(sim, 3)})
+    return [{"files": sorted(g["files"]), "pairs": g["pairs"]} for g in groups.values()]
+
+
+def run_near_duplicates(directory, files, action=ACTION):
+    """Find near-duplicate groups among `files`, then report or quarantine them."""
+    signatures = load_signatures(files, os.path.join(directory, CACHE_NAME))
+    skipped = len(files) - len(signatures)
+    print(f"{len(signatures)} PDFs with text ({skipped} skipped: unreadable or too little text)")
+
+    groups = near_duplicate_groups(signatures)
+    quarantine_dir = os.path.join(directory, QUARANTINE_DIR_NAME)
+    for g in groups:
+        # Keep the largest file (annotated/published copies tend to be bigger)
+        g["files"].sort(key=lambda p: (-os.path.getsize(p), os.path.basename(p)))
+        g["keep"] = os.path.basename(g["files"][0])
+        print(f"Near-duplicates: {[os.path.basename(p) for p in g['files']]}")
+        print(f"  keeping: {g['keep']}")
+        if action == "quarantine":
+            os.makedirs(quarantine_dir, exist_ok=True)
+            for path in g["files"][1:]:
+                target = os.path.join(quarantine_dir, os.path.basename(path))
+                stem, ext = os.path.splitext(target)
+                n = 1
+                while os.path.exists(target):  # never overwrite an earlier quarantined copy
+                    target = f"{stem}_{n}{ext}"
+                    n += 1
+                shutil.move(path, target)
+                print(f"  quarantined: {os.path.basename(path)}")
+        g["files"] = [os.path.basename(p) for p in g["files"]]
+
+    report_path = os.path.join(directory, REPORT_NAME)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump({"threshold": SIMILARITY_THRESHOLD, "action": action, "groups": groups}, f, indent=2)
+    print(f"{len(groups)} near-duplicate groups. Report: {report_path}")
+    return groups
+
+
+if __name__ == "__main__":
+    from mendeley_duplicate_pdf_remover import scan_pdfs
+    run_near_duplicates(DIRECTORY, scan_pdfs(DIRECTORY, EXTENSION))
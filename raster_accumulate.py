@@ -0,0 +1,180 @@
+"""
+=============================================================================
+  Incremental annual / seasonal / period means from daily rasters
+=============================================================================
+
+The mean scripts recomputed every year and season from all daily rasters on
+each run, even when only a few new days had been downloaded. This module
+keeps, for every output raster, the running pieces of its mean:
+
+- <output_dir>/.mean_state/<output name>.npz : per-pixel float64 sum, int32
+  valid count and the number of contributing files;
+- <output_dir>/.mean_state/manifest.json     : the fingerprint (size, mtime)
+  of every daily raster already folded into each output.
+
+update_group_means() then compares each group's current files (from the
+raster catalog) with the manifest:
+
+- nothing new            -> the output is left untouched;
+- only new files         -> just those are read and folded into the stored
+                            sums, and the output is rewritten;
+- a file changed/removed -> that one group is rebuilt from its files (a sum
+                            cannot subtract values it no longer has).
+
+So after downloading a few days only the affected year, season and period
+outputs are read and written again. With a stage_cache.StageCache, a group
+whose files (by content) and parameters were seen before is served from the
+cache together with its running sums instead of being recomputed.
+
+Mean rules (as in the original scripts):
+- divisor="files" : sum of valid values / number of files  (Daymet, ERA5)
+- divisor="valid" : sum of valid values / per-pixel valid count (NASA NEO)
+Pixels never valid are written as the input nodata value (-9999 if unset).
+=============================================================================
+"""
+
+import os
+import json
+
+import numpy as np
+import rasterio
+from tqdm import tqdm
+
+STATE_DIR_NAME = ".mean_state"
+MANIFEST_NAME = "manifest.json"
+
+
+def nodata_of(meta):
+    nodata = meta.get('nodata')
+    return -9999 if nodata is None else nodata
+
+
+def load_manifest(state_dir):
+    try:
+        with open(os.path.join(state_dir, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(state_dir, manifest):
+    path = os.path.join(state_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(path + ".tmp", path)
+
+
+def load_accumulator(path):
+    try:
+        with np.load(path) as z:
+            return {'sum': z['sum'], 'count': z['count'], 'n_files': int(z['n_files'])}
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def save_accumulator(path, acc):
+    tmp = path + ".tmp.npz"
+    np.savez_compressed(tmp, sum=acc['sum'], count=acc['count'], n_files=acc['n_files'])
+    os.replace(tmp, path)
+
+
+def fold(acc, file_path):
+    """Add one daily raster to the accumulator; returns (acc, meta)."""
+    with rasterio.open(file_path) as src:
+        data = src.read(1)
+        meta = src.meta
+    if acc is None:
+        acc = {'sum': np.zeros(data.shape, dtype=np.float64),
+               'count': np.zeros(data.shape, dtype=np.int32),
+               'n_files': 0}
+    valid_mask = data != nodata_of(meta)
+    acc['sum'][valid_mask] += data[valid_mask]
+    acc['count'][valid_mask] += 1
+    acc['n_files'] += 1
+    return acc, meta
+
+
+def mean_of(acc, divisor, nodata):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if divisor == "files":
+            mean = acc['sum'] / acc['n_files']
+        else:
+            mean = np.true_divide(acc['sum'], acc['count'])
+    mean[acc['count'] == 0] = nodata
+    return mean
+
+
+def write_mean(mean, meta, output_path):
+    """Written next to the output and renamed over it (a cached output may be a hardlink)."""
+    meta = dict(meta)
+    meta.update({
+        "driver": "GTiff",
+        "height": mean.shape[0],
+        "width": mean.shape[1],
+        "dtype": 'float32',
+        "compress": 'lzw'
+    })
+    tmp = output_path + ".tmp.tif"
+    with rasterio.open(tmp, 'w', **meta) as dst:
+        dst.write(mean.astype(np.float32), 1)
+    os.replace(tmp, output_path)
+
+
+def update_group_means(groups, output_directory, output_name, divisor="files",
+                       rebuild=False, desc="Processing groups", cache=None, cache_params=None):
+    """
+    groups       : {key: [raster_catalog.Entry, ...]}  daily rasters per output
+    output_name  : key -> output file name
+    rebuild      : True ignores the stored state and recomputes every group
+    cache        : optional stage_cache.StageCache for whole groups
+    cache_params : settings the groups depend on beyond their files (e.g. seasons)
+    Returns the list of output paths that were (re)written.
+    """
+    state_dir = os.path.join(output_directory, STATE_DIR_NAME)
+    os.makedirs(state_dir, exist_ok=True)
+    manifest = {} if rebuild else load_manifest(state_dir)
+
+    written = []
+    for key, entries in tqdm(groups.items(), desc=desc):
+        if not entries:
+            continue
+        name = output_name(key)
+        output_path = os.path.join(output_directory, name)
+        state_path = os.path.join(state_dir, name + ".npz")
+
+        current = {e.path: [e.size, e.mtime_ns] for e in entries}
+        stored = manifest.get(name, {})
+        acc = None
+        if stored and os.path.exists(output_path) and all(current.get(p) == fp for p, fp in stored.items()):
+            todo = [p for p in current if p not in stored]
+            if not todo:
+                continue  # up to date
+            acc = load_accumulator(state_path)
+        if acc is None:
+            stored, todo = {}, list(current)  # first run, or a contributing file changed: rebuild
+
+        key = None
+        if cache is not None:
+            params = dict(cache_params or {}, divisor=divisor, name=name)
+            key = cache.key("group_mean", [e.path for e in entries], params)
+            if cache.fetch(key, output_directory, "group_mean") is not None:
+                manifest[name] = current
+                save_manifest(state_dir, manifest)
+                written.append(output_path)
+                print(f"Saved {name} (from the stage cache)")
+                continue
+
+        meta = None
+        for file_path in tqdm(todo, desc=f"Folding files into {name}", leave=False):
+            acc, meta = fold(acc, file_path)
+            stored[file_path] = current[file_path]
+
+        save_accumulator(state_path, acc)
+        write_mean(mean_of(acc, divisor, nodata_of(meta)), meta, output_path)
+        manifest[name] = stored
+        save_manifest(state_dir, manifest)
+        if key is not None:
+            cache.store(key, "group_mean", [output_path, state_path], output_directory)
+        written.append(output_path)
+        print(f"Saved {name} ({len(todo)} new of {len(current)} files)")
+    return written
@@ -0,0 +1,297 @@
+"""
+=============================================================================
+  Date-indexed raster catalog for the dataset processing scripts
+=============================================================================
+
+The aggregation and trend scripts used to glob() / os.listdir() their input
+folder on every run and pull dates out of file names with positional
+split('_')[2] / [3] — a different index per dataset, and a full rescan of
+folders holding 100k+ daily rasters each time.
+
+This module scans a folder ONCE with os.scandir and keeps a SQLite index
+(.raster_catalog.sqlite inside the folder) of
+
+    path, name, dataset, product, kind, date, year, month, day, season,
+    region, size, mtime_ns, grid
+
+- Names are parsed by a per-dataset PATTERN REGISTRY (DATASETS below): one
+  regex per naming scheme with named groups (year, month, day, season), so
+  "daymet_srad_2006-01-31.tif", "era5_cloud_cover_2006.tif",
+  "ceres_solar_insolation_2006_winter.tif" and the raw NEO downloads
+  ("CERES_INSOL_D_2006-01-31_...TIFF") all resolve without split indices.
+  kind = daily | annual | seasonal, from the pattern that matched.
+- region comes from the folder name (processed_<region>_clipped...).
+- grid is a short hash of width/height/transform/CRS, read from the raster
+  header (rasterio) only for new or changed files; stacks can check that all
+  their inputs share one grid.
+- Updates are incremental: unchanged files (same size + mtime) keep their
+  row, new/changed files are parsed, vanished files are dropped. With
+  TRUST_DIR_MTIME the scan itself is skipped while the folder's own mtime
+  has not moved (only safe if files are never rewritten in place).
+
+Scripts query it instead of globbing:
+
+    from raster_catalog import catalog_files
+    for e in catalog_files(input_dir, "daymet_srad", kind="daily", start_year=2006):
+        e.path, e.year, e.month, e.season ...
+
+Run this file directly to (re)index DIRECTORY and print a summary.
+=============================================================================
+"""
+
+import os
+import re
+import sqlite3
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+
+try:
+    import rasterio
+except ImportError:
+    rasterio = None  # grid signatures are left empty
+
+# =============================================================================
+#  CONFIGURATION
+# =============================================================================
+
+DIRECTORY = r"D:\Publications\Bhaleka_1\data\daymet_srad\processed_nwt_clipped"
+
+CATALOG_NAME     = ".raster_catalog.sqlite"   # stored inside each indexed folder
+TRUST_DIR_MTIME  = False   # True: skip the scan when the folder mtime is unchanged
+                           # (misses files rewritten in place, which do not touch it)
+GRID_SIGNATURE   = True    # read raster headers of new files (needs rasterio)
+HEADER_WORKERS   = 8       # threads reading raster headers
+
+# =============================================================================
+
+SEASONS = {
+    'spring': ['03', '04', '05'],
+    'summer': ['06', '07', '08'],
+    'autumn': ['09', '10', '11'],
+    'winter': ['12', '01', '02']
+}
+
+DATE = r"(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})"
+SEASON = r"(?P<season>spring|summer|autumn|winter)"
+RASTER_EXT = r"\.(?:tif|tiff)$"
+
+
+def processed_patterns(product):
+    """Naming schemes written by nc_to_tif / clipping and the mean scripts."""
+    p = re.escape(product)
+    return [
+        ('daily',    rf"^{p}_{DATE}{RASTER_EXT}"),
+        ('seasonal', rf"^{p}_(?P<year>\d{{4}})_{SEASON}{RASTER_EXT}"),
+        ('annual',   rf"^{p}_(?P<year>\d{{4}}){RASTER_EXT}"),
+    ]
+
+
+# dataset -> [(kind, regex)]; the first matching pattern wins
+DATASETS = {
+    'daymet_srad':            processed_patterns('daymet_srad'),
+    'era5_cloud_cover':       processed_patterns('era5_cloud_cover'),
+    'ceres_solar_insolation': processed_patterns('ceres_solar_insolation'),
+    'modis_cloud_fraction':   processed_patterns('modis_cloud_fraction'),
+    # raw NASA NEO downloads
+    'ceres_insol_raw':        [('daily', rf"^CERES_INSOL_D_{DATE}.*{RASTER_EXT}")],
+    'modis_cloud_raw':        [('daily', rf"^(?:MYDAL2|MODAL2)_D_CLD_FR_{DATE}.*{RASTER_EXT}")],
+}
+
+# dataset -> product (variable) it holds; processed datasets are their own product
+PRODUCTS = {
+    'ceres_insol_raw': 'ceres_solar_insolation',
+    'modis_cloud_raw': 'modis_cloud_fraction',
+}
+
+REGION_RE = re.compile(r"processed_(?P<region>[a-z]+)_clipped", re.IGNORECASE)
+
+Entry = namedtuple('Entry', ['path', 'name', 'dataset', 'product', 'kind', 'date', 'year',
+                             'month', 'day', 'season', 'region', 'size', 'mtime_ns', 'grid'])
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    name TEXT PRIMARY KEY, dataset TEXT, product TEXT, kind TEXT, date TEXT,
+    year INTEGER, month INTEGER, day INTEGER, season TEXT, region TEXT,
+    size INTEGER, mtime_ns INTEGER, grid TEXT
+);
+CREATE INDEX IF NOT EXISTS files_by_date ON files (dataset, kind, year, month);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+COLUMNS = 'name, dataset, product, kind, date, year, month, day, season, region, size, mtime_ns, grid'
+
+_compiled = {}
+
+
+def register_dataset(dataset, patterns):
+    """Add (or replace) the naming schemes of a dataset: [(kind, regex), ...]."""
+    DATASETS[dataset] = patterns
+    _compiled.pop(dataset, None)
+
+
+def compiled_patterns(dataset):
+    if dataset not in _compiled:
+        _compiled[dataset] = [(kind, re.compile(rx, re.IGNORECASE)) for kind, rx in DATASETS[dataset]]
+    return _compiled[dataset]
+
+
+def parse_name(name, datasets=None):
+    """(dataset, product, kind, year, month, day, season) for a file name, or None."""
+    for dataset in datasets or DATASETS:
+        for kind, rx in compiled_patterns(dataset):
+            m = rx.match(name)
+            if m is None:
+                continue
+            g = m.groupdict()
+            year = int(g['year'])
+            month = int(g['month']) if g.get('month') else None
+            day = int(g['day']) if g.get('day') else None
+            season = g.get('season')
+            season = season.lower() if season else None
+            return dataset, PRODUCTS.get(dataset, dataset), kind, year, month, day, season
+    return None
+
+
+def grid_signature(path):
+    """Short hash of the raster grid (size, transform, CRS); None if unreadable."""
+    try:
+        with rasterio.open(path) as src:
+            crs = src.crs.to_wkt() if src.crs else ''
+            key = f"{src.width}x{src.height}|{tuple(src.transform)[:6]}|{crs}"
+    except Exception:
+        return None
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def open_catalog(directory, catalog_path=None):
+    path = catalog_path or os.path.join(directory, CATALOG_NAME)
+    try:
+        conn = sqlite3.connect(path)
+        # No -journal file: creating one would bump the folder mtime on every update
+        conn.execute("PRAGMA journal_mode = MEMORY")
+        conn.executescript(SCHEMA)
+    except sqlite3.DatabaseError:
+        # The catalog is only an index; rebuild it if it is damaged
+        conn.close()
+        os.remove(path)
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = MEMORY")
+        conn.executescript(SCHEMA)
+    return conn
+
+
+def update_catalog(directory, datasets=None, catalog_path=None, force=False):
+    """
+    Bring the catalog of `directory` up to date and return the open connection.
+    Only new or changed files are parsed (and their raster headers read).
+    """
+    conn = open_catalog(directory, catalog_path)
+    # Taken after open_catalog(), which may have just created the catalog file
+    dir_mtime = str(os.stat(directory).st_mtime_ns)
+    row = conn.execute("SELECT value FROM meta WHERE key = 'dir_mtime_ns'").fetchone()
+    if TRUST_DIR_MTIME and not force and row and row[0] == dir_mtime:
+        return conn
+
+    known = {name: (size, mtime_ns) for name, size, mtime_ns in
+             conn.execute("SELECT name, size, mtime_ns FROM files")}
+    region_m = REGION_RE.search(os.path.basename(os.path.normpath(directory)))
+    region = region_m.group('region').lower() if region_m else None
+
+    seen, changed = set(), []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.is_file():
+                continue
+            seen.add(entry.name)
+            st = entry.stat()
+            if known.get(entry.name) == (st.st_size, st.st_mtime_ns):
+                continue
+            parsed = parse_name(entry.name, datasets)
+            if parsed is None:
+                continue
+            changed.append((entry.name, entry.path, parsed, st.st_size, st.st_mtime_ns))
+
+    grids = [None] * len(changed)
+    if GRID_SIGNATURE and rasterio is not None and changed:
+        with ThreadPoolExecutor(max_workers=HEADER_WORKERS) as pool:
+            grids = list(tqdm(pool.map(grid_signature, [c[1] for c in changed]),
+                              total=len(changed), desc="Indexing rasters", unit="file"))
+
+    rows = []
+    for (name, path, parsed, size, mtime_ns), grid in zip(changed, grids):
+        dataset, product, kind, year, month, day, season = parsed
+        date = f"{year:04d}-{month:02d}-{day:02d}" if day else None
+        rows.append((name, dataset, product, kind, date, year, month, day, season, region,
+                     size, mtime_ns, grid))
+
+    with conn:
+        gone = [(name,) for name in known if name not in seen]
+        conn.executemany("DELETE FROM files WHERE name = ?", gone)
+        conn.executemany(f"INSERT OR REPLACE INTO files ({COLUMNS}) VALUES ({', '.join('?' * 13)})", rows)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('dir_mtime_ns', ?)", (dir_mtime,))
+    return conn
+
+
+def catalog_files(directory, dataset=None, kind=None, start_year=None, end_year=None,
+                  season=None, months=None, update=True):
+    """
+    Catalog entries of `directory` (updated first), sorted by date then name.
+    Filters: dataset, kind (daily/annual/seasonal), inclusive year range,
+    season (seasonal files) and calendar months (daily files).
+    """
+    conn = update_catalog(directory) if update else open_catalog(directory)
+    where, args = [], []
+    for col, val in (('dataset', dataset), ('kind', kind), ('season', season)):
+        if val is not None:
+            where.append(f"{col} = ?")
+            args.append(val)
+    if start_year is not None:
+        where.append("year >= ?")
+        args.append(start_year)
+    if end_year is not None:
+        where.append("year <= ?")
+        args.append(end_year)
+    if months:
+        where.append(f"month IN ({', '.join('?' * len(months))})")
+        args.extend(int(m) for m in months)
+    sql = f"SELECT {COLUMNS} FROM files"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY year, month, day, season, name"
+    try:
+        return [Entry(os.path.join(directory, r[0]), *r) for r in conn.execute(sql, args)]
+    finally:
+        conn.close()
+
+
+def season_of(month):
+    """Season name of a calendar month (1-12), as in the seasonal mean scripts."""
+    mm = f"{month:02d}"
+    for season, months in SEASONS.items():
+        if mm in months:
+            return season
+    return None
+
+
+def season_year(year, month):
+    """Winter is labelled by its December: Jan/Feb belong to the previous year's winter."""
+    return year - 1 if month in (1, 2) else year
+
+
+def check_single_grid(entries):
+    """Raise if the entries do not all share one grid signature (unknown grids are ignored)."""
+    grids = {e.grid for e in entries if e.grid}
+    if len(grids) > 1:
+        raise ValueError(f"Rasters are on {len(grids)} different grids; they cannot be stacked.")
+
+
+if __name__ == "__main__":
+    conn = update_catalog(DIRECTORY, force=True)
+    print(f"Catalog: {os.path.join(DIRECTORY, CATALOG_NAME)}")
+    query = ("SELECT dataset, kind, region, COUNT(*), MIN(year), MAX(year), COUNT(DISTINCT grid) "
+             "FROM files GROUP BY dataset, kind, region")
+    for dataset, kind, region, n, y0, y1, n_grids in conn.execute(query):
+        print(f"  {dataset:<24} {kind:<9} region={region}  {n:>7} files  {y0}-{y1}  grids={n_grids}")
+    conn.close()
@@ -0,0 +1,283 @@
+"""
+=============================================================================
+  Content-addressed cache of stage outputs (inputs + parameters -> files)
+=============================================================================
+
+Re-running a chain with a different end_year or region rebuilt outputs whose
+inputs had not changed at all. StageCache keeps the outputs of every unit of
+stage work under a key that only depends on what they are made from:
+
+    key = hash(stage, parameters, [(input name, input content digest), ...])
+
+Units are as small as the stage allows:
+- nc_to_tif : one netCDF file           -> its daily rasters
+- clipping  : one daily raster + region -> one clipped raster
+              (the shapefile enters the parameters as a digest, shapefile_digest)
+- means     : one year / season group    -> the mean raster + its running sums
+- MK tests  : one year window (season)   -> sen_slope / p_value / kendall_tau /
+                                            FDR / CI rasters of that window
+
+Storage (CACHE_DIR):
+- objects/<key[:2]>/<key>/... : the output files of one unit, stored under
+  their path relative to the unit's output folder;
+- index.sqlite                : entries (size, last use, hits), the content
+  digests of input files (memoized by size + mtime, so each file is read
+  once) and the cumulative hit / miss / store / evict counters.
+
+A hit is served by hardlink (LINK_MODE = "hardlink", falling back to a copy
+across drives) or by copy. A served file shares its inode with the cache, so
+stages must replace outputs (write + rename, or remove first) rather than
+rewrite them in place; the means, the trend runner and the pipeline's
+clipping step do. Entries are evicted least-recently-used once the cache
+exceeds MAX_BYTES.
+
+Run this file directly for a self-check of store / serve / eviction in a
+temporary folder; pipeline runs print report() at the end.
+=============================================================================
+"""
+
+import os
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import threading
+
+# =============================================================================
+#  CONFIGURATION
+# =============================================================================
+
+CACHE_DIR  = r"D:\Publications\Bhaleka_1\data\.stage_cache"
+MAX_BYTES  = 200 * 1024 ** 3   # evict least-recently-used entries beyond this size
+LINK_MODE  = "hardlink"        # "hardlink" (copy when linking fails) or "copy"
+
+# =============================================================================
+
+DIGEST_CHUNK = 1 << 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY, stage TEXT, size INTEGER, created REAL, last_used REAL, hits INTEGER
+);
+CREATE INDEX IF NOT EXISTS entries_by_use ON entries (last_used);
+CREATE TABLE IF NOT EXISTS digests (path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT);
+CREATE TABLE IF NOT EXISTS stats (stage TEXT, event TEXT, count INTEGER, bytes INTEGER,
+                                  PRIMARY KEY (stage, event));
+"""
+
+
+def file_digest(path):
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(DIGEST_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def shapefile_digest(shapefile):
+    """Digest of a shapefile and the sidecar files that define its geometry and CRS."""
+    h = hashlib.blake2b(digest_size=20)
+    base = os.path.splitext(shapefile)[0]
+    for ext in (".shp", ".shx", ".dbf", ".prj"):
+        if os.path.exists(base + ext):
+            h.update(ext.encode() + file_digest(base + ext).encode())
+    return h.hexdigest()
+
+
+def tree_size(directory):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(directory) for f in files)
+
+
+class StageCache:
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES, link_mode=LINK_MODE):
+        if link_mode not in ("hardlink", "copy"):
+            raise ValueError(f"Unknown link mode {link_mode!r}")
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.link_mode = link_mode
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self.session = {}   # (stage, event) -> [count, bytes] of this run
+
+    def close(self):
+        self._conn.close()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.directory, "objects", key[:2], key)
+
+    def _count(self, stage, event, nbytes=0):
+        c = self.session.setdefault((stage, event), [0, 0])
+        c[0] += 1
+        c[1] += nbytes
+        self._conn.execute("INSERT OR IGNORE INTO stats VALUES (?, ?, 0, 0)", (stage, event))
+        self._conn.execute("UPDATE stats SET count = count + 1, bytes = bytes + ? WHERE stage = ? AND event = ?",
+                           (nbytes, stage, event))
+
+    def digest(self, path):
+        """Content digest of an input file, recomputed only when its size or mtime changed."""
+        st = os.stat(path)
+        key = os.path.normcase(os.path.abspath(path))
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime_ns, digest FROM digests WHERE path = ?", (key,)).fetchone()
+        if row and row[0] == st.st_size and row[1] == st.st_mtime_ns:
+            return row[2]
+        digest = file_digest(path)
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?)",
+                               (key, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def key(self, stage, inputs, params=None):
+        """Key of one unit of work: the stage, its parameters and the names + contents of its inputs."""
+        h = hashlib.blake2b(digest_size=20)
+        h.update(json.dumps({'stage': stage, 'params': params or {}}, sort_keys=True, default=str).encode())
+        for path in inputs:
+            h.update(f"|{os.path.basename(path)}:{self.digest(path)}".encode())
+        return h.hexdigest()
+
+    def fetch(self, key, root, stage):
+        """
+        Serve a cached unit into `root` (the files keep their relative paths).
+        Returns the served paths, or None on a miss.
+        """
+        entry = self._entry_dir(key)
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or not os.path.isdir(entry):
+                self._count(stage, "miss")
+                return None
+            self._conn.execute("UPDATE entries SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+            self._count(stage, "hit", row[0])
+        served = []
+        for d, _, files in os.walk(entry):
+            for name in files:
+                blob = os.path.join(d, name)
+                dest = os.path.join(root, os.path.relpath(blob, entry))
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                if os.path.lexists(dest):
+                    os.remove(dest)
+                try:
+                    if self.link_mode != "hardlink":
+                        raise OSError
+                    os.link(blob, dest)
+                except OSError:
+                    shutil.copyfile(blob, dest)
+                os.utime(dest)  # served now: newer than the inputs it was made from
+                served.append(dest)
+        return sorted(served)
+
+    def store(self, key, stage, outputs, root):
+        """Keep copies of a unit's outputs (paths under `root`) and evict down to max_bytes."""
+        rel = [os.path.relpath(path, root) for path in outputs]
+        if any(r.startswith(os.pardir) or os.path.isabs(r) for r in rel):
+            raise ValueError(f"Outputs of {stage} are not all inside {root}")
+        entry = self._entry_dir(key)
+        tmp = f"{entry}.tmp-{os.getpid()}-{threading.get_ident()}"
+        for path, r in zip(outputs, rel):
+            os.makedirs(os.path.dirname(os.path.join(tmp, r)), exist_ok=True)
+            shutil.copyfile(path, os.path.join(tmp, r))
+        size = tree_size(tmp)
+        if size > self.max_bytes:
+            shutil.rmtree(tmp)
+            return
+        # Same key, same outputs: an entry stored meanwhile (another branch) is kept
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            os.replace(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)
+            if not os.path.isdir(entry):
+                raise
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, 0)", (key, stage, size, now, now))
+            self._count(stage, "store", size)
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        while total > self.max_bytes:
+            key, stage, size = self._conn.execute(
+                "SELECT key, stage, size FROM entries ORDER BY last_used LIMIT 1").fetchone()
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._count(stage, "evict", size)
+            total -= size
+
+    def stats(self):
+        """{stage: {event: (count, bytes)}} over the cache's lifetime, plus its current size."""
+        with self._lock:
+            rows = self._conn.execute("SELECT stage, event, count, bytes FROM stats").fetchall()
+            n, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        out = {}
+        for stage, event, count, nbytes in rows:
+            out.setdefault(stage, {})[event] = (count, nbytes)
+        return out, n, size
+
+    def report(self):
+        totals, n, size = self.stats()
+        print(f"Stage cache {self.directory}: {n} entries, {size / 1024 ** 3:.2f} of "
+              f"{self.max_bytes / 1024 ** 3:.0f} GB")
+        print(f"  {'stage':<28} {'hits':>7} {'misses':>7} {'rate':>6} {'served GB':>10}   "
+              f"{'all-time hits':>13} {'stored':>7} {'evicted':>7}")
+        for stage in sorted(totals):
+            hits, served = self.session.get((stage, "hit"), (0, 0))
+            misses = self.session.get((stage, "miss"), (0, 0))[0]
+            rate = f"{hits / (hits + misses):.0%}" if hits + misses else "-"
+            t = totals[stage]
+            print(f"  {stage:<28} {hits:>7} {misses:>7} {rate:>6} {served / 1024 ** 3:>10.2f}   "
+                  f"{t.get('hit', (0, 0))[0]:>13} {t.get('store', (0, 0))[0]:>7} {t.get('evict', (0, 0))[0]:>7}")
+
+
+# -----------------------------------------------------------------------------
+#  Self-check
+# -----------------------------------------------------------------------------
+
+def main():
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        inputs, outputs = os.path.join(tmp, "in"), os.path.join(tmp, "out")
+        os.makedirs(inputs)
+        os.makedirs(os.path.join(outputs, ".state"))
+        cache = StageCache(os.path.join(tmp, "cache"), max_bytes=2500)
+
+        src = os.path.join(inputs, "daymet_srad_2006-01-01.tif")
+        with open(src, "wb") as f:
+            f.write(b"a" * 1000)
+        key = cache.key("clip", [src], {'region': "nwt"})
+        assert cache.fetch(key, outputs, "clip") is None
+        made = [os.path.join(outputs, "daymet_srad_2006-01-01.tif"), os.path.join(outputs, ".state", "sums.npz")]
+        for path in made:
+            with open(path, "wb") as f:
+                f.write(b"b" * 500)
+        cache.store(key, "clip", made, outputs)
+        for path in made:
+            os.remove(path)
+
+        # same content under a new mtime: same key, served back
+        os.utime(src, ns=(time.time_ns() + 10**9,) * 2)
+        assert cache.key("clip", [src], {'region': "nwt"}) == key
+        assert cache.key("clip", [src], {'region': "ns"}) != key
+        assert cache.fetch(key, outputs, "clip") == sorted(made)
+        assert os.path.getsize(made[1]) == 500
+        if cache.link_mode == "hardlink":
+            print(f"served by hardlink: {os.stat(made[0]).st_nlink > 1}")
+
+        # two more entries of 1000 bytes exceed 2500: the least recently used goes
+        for region in ("a", "b"):
+            k = cache.key("clip", [src], {'region': region})
+            with open(made[0], "wb") as f:
+                f.write(b"c" * 1000)
+            cache.store(k, "clip", made[:1], outputs)
+        assert cache.fetch(key, outputs, "clip") is None
+        cache.report()
+        cache.close()
+    print("OK: keys, serving and LRU eviction behave as expected")
+
+
+if __name__ == "__main__":
+    main()
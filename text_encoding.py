@@ -0,0 +1,150 @@
+"""
+=============================================================================
+  Shared encoding detection for the text cleaners and the CSV tools
+=============================================================================
+
+The file (or a leading sample of it) is read ONCE as bytes:
+
+- A byte-order mark decides the encoding outright (UTF-8-SIG, UTF-32 LE/BE,
+  UTF-16 LE/BE; UTF-32 is checked before UTF-16 as their BOMs overlap). The
+  codecs named for it consume the mark, so decoded text never starts with
+  U+FEFF.
+- Otherwise each candidate encoding runs an incremental decoder over the
+  in-memory buffer in DECODE_BLOCK_BYTES-byte blocks; a candidate that fails
+  stops at the first bad block instead of decoding the whole file again.
+- For whole files the decoded text is returned with the encoding, so the
+  cleaners never re-open the file. detect_stream_encoding() makes the same
+  decision in constant memory (decoded blocks are discarded) for callers
+  that stream the file afterwards. For samples (the CSV tools) the decoder
+  is not finalised, so a multi-byte character cut at the sample boundary does
+  not disqualify UTF-8.
+=============================================================================
+"""
+
+import codecs
+
+# Candidate order used when a caller does not pass its own list
+DEFAULT_ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
+
+# Bytes handed to the incremental decoder per step
+DECODE_BLOCK_BYTES = 1 << 20
+
+# 'utf-16' / 'utf-32' read the byte order from the BOM and drop it ('utf-16-le'
+# and friends would keep it as a leading U+FEFF)
+BOMS = [
+    (codecs.BOM_UTF8,     'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+
+def bom_encoding(raw):
+    """Encoding named by a leading byte-order mark, or None."""
+    for bom, enc in BOMS:
+        if raw.startswith(bom):
+            return enc
+    return None
+
+
+def is_seekable_encoding(encoding):
+    """
+    True if byte offsets can be resynced on b'\n' (ASCII-compatible encodings);
+    UTF-16/32 text can only be read from the start.
+    """
+    enc = encoding.lower().replace("_", "-")
+    return not (enc.startswith("utf-16") or enc.startswith("utf-32"))
+
+
+def decode_incremental(raw, encoding, final=True, errors='strict'):
+    """
+    Decode `raw` block by block with an incremental decoder. Returns the text,
+    or None as soon as a block fails (strict mode) or the codec is unknown.
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    except LookupError:
+        return None
+    view = memoryview(raw)
+    parts = []
+    try:
+        for pos in range(0, len(view), DECODE_BLOCK_BYTES):
+            parts.append(decoder.decode(view[pos:pos + DECODE_BLOCK_BYTES]))
+        if final:
+            parts.append(decoder.decode(b'', final=True))
+    except UnicodeDecodeError:
+        return None
+    return ''.join(parts)
+
+
+def detect_bytes_encoding(raw, encodings=None, final=True):
+    """
+    (encoding, text) for an in-memory buffer: BOM first, then the first
+    candidate that decodes it strictly. (None, None) if nothing fits.
+    `final=False` treats `raw` as a sample that may end mid-character.
+    """
+    bom = bom_encoding(raw)
+    if bom is not None:
+        # The BOM is authoritative; stray bad bytes are replaced, not fatal
+        return bom, decode_incremental(raw, bom, final=final, errors='replace')
+    for enc in encodings or DEFAULT_ENCODINGS:
+        text = decode_incremental(raw, enc, final=final)
+        if text is not None:
+            return enc, text
+    return None, None
+
+
+def translate_newlines(text):
+    """'\\r\\n' and '\\r' -> '\\n', as open(..., 'r') does in text mode."""
+    if '\r' not in text:
+        return text
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+
+def read_text(filepath, encodings=None):
+    """
+    Read a whole text file once and return (text, encoding) with universal
+    newlines; (None, None) if no candidate decodes it.
+    """
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+    enc, text = detect_bytes_encoding(raw, encodings)
+    if enc is None:
+        return None, None
+    return translate_newlines(text), enc
+
+
+def detect_stream_encoding(filepath, encodings=None):
+    """
+    Encoding read_text() would pick, found without holding the file or its
+    text in memory: BOM, then each candidate decodes the file block by block.
+    None if nothing fits.
+    """
+    with open(filepath, 'rb') as f:
+        bom = bom_encoding(f.read(4))
+    if bom is not None:
+        return bom
+    for enc in encodings or DEFAULT_ENCODINGS:
+        try:
+            decoder = codecs.getincrementaldecoder(enc)(errors='strict')
+        except LookupError:
+            continue
+        try:
+            with open(filepath, 'rb') as f:
+                for block in iter(lambda: f.read(DECODE_BLOCK_BYTES), b''):
+                    decoder.decode(block)
+            decoder.decode(b'', final=True)
+            return enc
+        except UnicodeDecodeError:
+            continue
+    return None
+
+
+def detect_file_encoding(filepath, encodings=None, sample_bytes=2_000_000, fallback='latin-1'):
+    """Encoding of a (possibly huge) file judged from its first `sample_bytes`."""
+    with open(filepath, 'rb') as f:
+        raw = f.read(sample_bytes)
+    # A full-length sample may end mid-character; a shorter read is the whole file
+    enc, _ = detect_bytes_encoding(raw, encodings, final=len(raw) < sample_bytes)
+    return enc or fallback
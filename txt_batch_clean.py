@@ -0,0 +1,215 @@
+"""
+=============================================================================
+  Batch cleaner for a directory of PDF-extracted manuscripts
+=============================================================================
+
+Runs the Elsevier, T&F or AGU line-number cleaner over every file matched by a
+directory or glob, picking the strategy per file:
+
+- T&F       : bare margin numbers — many lines that are nothing but an
+              integer, forming a contiguous run that repeats page after page
+              (detect_margin_number_range of the T&F cleaner).
+- AGU       : a gap-constrained number sequence that sits at the START of
+              most lines (max gap AGU_MAX_GAP). Only numbers up to about that
+              sequence's last value are line-number candidates for the cleaner,
+              so years and other larger numbers in the text are left alone.
+- Elsevier  : everything else; the universal cleaner that also finds line
+              numbers absorbed into long single-line paragraphs.
+
+Files are cleaned in parallel worker processes; each file is read and decoded
+once, and the text is handed to the chosen cleaner. Each output is written next
+to its input (or into OUTPUT_DIR) as "<stem>_cleaned<ext>", and a combined
+JSON report lists the chosen strategy, the detection evidence and every
+removal count per file.
+
+Usage:  python txt_batch_clean.py "D:\\corpus\\proofs" [--workers 8]
+        python txt_batch_clean.py "D:\\corpus\\**\\*.txt" --strategy elsevier
+Without arguments the CONFIGURATION values below are used.
+=============================================================================
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from tqdm import tqdm
+
+import txt_line_number_removal_for_agu as agu
+import txt_line_number_removal_for_elsevier as elsevier
+import txt_line_number_removal_for_tandf as tandf
+from text_encoding import read_text
+from txt_line_number_core import longest_gap_chain
+
+# =============================================================================
+#  CONFIGURATION  — edit these before running (or pass them on the command line)
+# =============================================================================
+
+INPUT_PATTERN = r"C:\Users\arsha\OneDrive\Desktop\proofs"  # directory or glob
+OUTPUT_DIR    = None            # None -> write next to each input file
+OUTPUT_SUFFIX = "_cleaned"
+REPORT_FILE   = "cleaning_report.json"  # written to OUTPUT_DIR / the input directory
+N_WORKERS     = os.cpu_count() or 1
+FORCE_STRATEGY = None           # None (auto) | "elsevier" | "tandf" | "agu"
+
+# --- Detection heuristics ---
+TANDF_MIN_NUMBER_LINES = 0.05   # share of non-blank lines that are bare integers
+TANDF_MIN_RANGE        = 10     # margin run must cover at least this many values
+AGU_MAX_GAP            = 25
+AGU_MAX_LINE_NUMBER    = 9999   # line-start values considered during detection only
+AGU_MIN_LINE_START     = 0.5    # share of non-blank lines starting with a chain number
+
+# Outputs of earlier runs are never picked up as inputs
+SKIP_SUFFIXES = ("_cleaned", "_clean")
+
+# =============================================================================
+
+STRATEGIES = ("elsevier", "tandf", "agu")
+LINE_START_NUMBER = re.compile(r'^[ \t]*(\d+)(?![\S])', re.MULTILINE)
+
+
+def find_input_files(pattern):
+    """Text files in a directory (non-recursive), or every match of a glob."""
+    if os.path.isdir(pattern):
+        paths = glob.glob(os.path.join(pattern, "*.txt"))
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    out = []
+    for p in sorted(paths):
+        stem = os.path.splitext(os.path.basename(p))[0]
+        if os.path.isfile(p) and not stem.endswith(SKIP_SUFFIXES):
+            out.append(p)
+    return out
+
+
+def build_output_path(input_file, output_dir=None):
+    base, ext = os.path.splitext(input_file)
+    if output_dir:
+        base = os.path.join(output_dir, os.path.basename(base))
+    return f"{base}{OUTPUT_SUFFIX}{ext or '.txt'}"
+
+
+def line_start_chain(text):
+    """Values of the longest gap-constrained increasing run of line-start numbers."""
+    values = [int(m.group(1)) for m in LINE_START_NUMBER.finditer(text)]
+    values = [v for v in values if 1 <= v <= AGU_MAX_LINE_NUMBER]
+    return [values[i] for i in longest_gap_chain(values, AGU_MAX_GAP)]
+
+
+def detect_strategy(text):
+    """(strategy, evidence) for one document, see the module docstring."""
+    lines = text.split('\n')
+    non_blank = [ln for ln in lines if ln.strip()]
+    n = max(1, len(non_blank))
+
+    number_lines = sum(1 for ln in non_blank if ln.strip().isdigit())
+    range_min, range_max = tandf.detect_margin_number_range(non_blank, tandf.MIN_OCCURRENCES)
+    margin_span = (range_max - range_min + 1) if range_min is not None else 0
+    evidence = {
+        'non_blank_lines':   len(non_blank),
+        'number_line_share': round(number_lines / n, 4),
+        'margin_range':      [range_min, range_max] if range_min is not None else None,
+    }
+    if number_lines / n >= TANDF_MIN_NUMBER_LINES and margin_span >= TANDF_MIN_RANGE:
+        return 'tandf', evidence
+
+    chain = line_start_chain(text)
+    evidence['line_start_chain_share'] = round(len(chain) / n, 4)
+    evidence['line_start_chain_max'] = chain[-1] if chain else None
+    if len(chain) / n >= AGU_MIN_LINE_START:
+        return 'agu', evidence
+
+    return 'elsevier', evidence
+
+
+def clean_one(input_file, output_file, force_strategy=None):
+    """Worker: detect, clean, and return this file's report entry."""
+    t0 = time.perf_counter()
+    entry = {'input': input_file, 'output': output_file}
+    try:
+        # The one read of this file; the cleaner gets the decoded text
+        decoded = read_text(input_file, elsevier.ENCODINGS)
+        if decoded[1] is None:
+            raise ValueError(f"Could not decode with any of {elsevier.ENCODINGS}")
+        if force_strategy:
+            strategy, evidence = force_strategy, {}
+        else:
+            strategy, evidence = detect_strategy(decoded[0])
+
+        if strategy == 'tandf':
+            counts = tandf.clean_document(input_file, output_file, verbose=False, decoded=decoded)
+        elif strategy == 'agu':
+            # Candidates up to the detected sequence's last line number (plus one gap
+            # for numbers after it that do not start a line)
+            chain_max = evidence.get('line_start_chain_max') if evidence else None
+            if chain_max is None:
+                chain = line_start_chain(decoded[0])
+                chain_max = chain[-1] if chain else agu.LAST_LINE_NUMBER
+            counts = agu.clean_document(input_file, output_file, max_line_number=chain_max + AGU_MAX_GAP,
+                                        max_gap=AGU_MAX_GAP, verbose=False, decoded=decoded)
+        else:
+            counts = elsevier.clean_document(input_file, output_file, verbose=False, decoded=decoded)
+
+        entry.update(status='ok', strategy=strategy, evidence=evidence, counts=counts)
+    except (Exception, SystemExit) as e:  # the single-file cleaners sys.exit() on bad input
+        entry.update(status='error', error=f"{type(e).__name__}: {e}")
+    entry['seconds'] = round(time.perf_counter() - t0, 3)
+    return entry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Clean a directory/glob of PDF-extracted manuscripts.")
+    parser.add_argument("inputs", nargs="*", default=[INPUT_PATTERN], help="directories or glob patterns")
+    parser.add_argument("--out-dir", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=N_WORKERS)
+    parser.add_argument("--strategy", choices=STRATEGIES, default=FORCE_STRATEGY)
+    parser.add_argument("--report", default=REPORT_FILE, help="report file name or path")
+    args = parser.parse_args()
+
+    files = []
+    for pattern in args.inputs:
+        files.extend(p for p in find_input_files(pattern) if p not in files)
+    if not files:
+        print(f"No input files found for: {args.inputs}")
+        return
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+
+    jobs = {p: build_output_path(p, args.out_dir) for p in files}
+    entries = []
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [pool.submit(clean_one, p, out, args.strategy) for p, out in jobs.items()]
+        for fut in tqdm(as_completed(futures), total=len(futures), desc="Cleaning", unit="file"):
+            entries.append(fut.result())
+    entries.sort(key=lambda e: e['input'])
+
+    report_path = args.report
+    if not os.path.dirname(report_path):
+        report_dir = args.out_dir or os.path.dirname(os.path.abspath(files[0]))
+        report_path = os.path.join(report_dir, report_path)
+    by_strategy = {s: sum(1 for e in entries if e.get('strategy') == s) for s in STRATEGIES}
+    report = {
+        'created':     datetime.now().isoformat(timespec='seconds'),
+        'inputs':      args.inputs,
+        'files':       len(entries),
+        'failed':      sum(1 for e in entries if e['status'] != 'ok'),
+        'by_strategy': by_strategy,
+        'results':     entries,
+    }
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print(f"Cleaned {len(entries) - report['failed']} of {len(entries)} files "
+          f"({', '.join(f'{k}: {v}' for k, v in by_strategy.items())})")
+    for e in entries:
+        if e['status'] != 'ok':
+            print(f"  FAILED {e['input']}: {e['error']}")
+    print(f"Report: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+=============================================================================
+  Precompiled single-pass line filter engine for the text cleaners
+=============================================================================
+
+The Elsevier and T&F cleaners drop whole lines that are watermark letters,
+"Page X of Y" markers or margin line numbers, rewrite the whitespace of the
+lines they keep, and normalise blank runs. Instead of one re.fullmatch() per
+filter per line (and an uncompiled re.sub for inner spaces), LineFilter:
+
+- compiles ONE alternation regex with a named group per enabled filter, so
+  each stripped line is classified by a single fullmatch scan;
+- rewrites only the lines it keeps (strip / collapse inner spaces);
+- is a generator, so filters and the blank-run normalisers below chain into a
+  streaming pipeline and the output is produced line by line.
+
+Blank-run normalisers (also generators):
+- collapse_blank_runs : Elsevier rule — drop leading/trailing blank lines,
+                        collapse interior runs to one blank line.
+- join_blank_runs     : T&F rule — a blank run followed by a line starting
+                        lowercase is a mid-paragraph split and is joined;
+                        otherwise the run becomes exactly one blank line.
+=============================================================================
+"""
+
+import re
+from collections import Counter
+
+WATERMARK_PATTERN   = r'[A-Za-z]'
+PAGE_MARKER_PATTERN = r'(?i:page)\s+\d+\s+(?i:of)\s+\d+'
+NUMBER_PATTERN      = r'\d+'
+
+WATERMARK_RE   = re.compile(WATERMARK_PATTERN)
+PAGE_MARKER_RE = re.compile(PAGE_MARKER_PATTERN)
+NUMBER_RE      = re.compile(NUMBER_PATTERN)
+INNER_SPACES_RE = re.compile(r'[ \t]{2,}')
+
+
+def is_watermark_line(stripped):
+    """A line whose entire content is a single A–Z / a–z character."""
+    return WATERMARK_RE.fullmatch(stripped) is not None
+
+
+def is_page_marker_line(stripped):
+    """Lines like 'Page 5 of 47', case-insensitive, full-line only."""
+    return PAGE_MARKER_RE.fullmatch(stripped) is not None
+
+
+class LineFilter:
+    """
+    Classify + rewrite lines in one pass. Counts of dropped lines are kept in
+    `counts` ('watermark_chars', 'page_markers', 'margin_numbers') and the
+    removed margin values in `margin_values`.
+    """
+
+    def __init__(
+        self,
+        *,
+        drop_watermark    = False,
+        drop_page_markers = False,
+        margin_range      = None,
+        strip_trailing    = False,
+        strip_leading     = False,
+        collapse_inner    = False,
+    ):
+        alternatives = []
+        if drop_watermark:
+            alternatives.append(f'(?P<watermark_chars>{WATERMARK_PATTERN})')
+        if drop_page_markers:
+            alternatives.append(f'(?P<page_markers>{PAGE_MARKER_PATTERN})')
+        if margin_range is not None and margin_range[0] is not None:
+            alternatives.append(f'(?P<margin_numbers>{NUMBER_PATTERN})')
+            self.margin_min, self.margin_max = margin_range
+        self.classifier = re.compile('|'.join(alternatives)) if alternatives else None
+
+        self.strip_trailing = strip_trailing
+        self.strip_leading  = strip_leading
+        self.collapse_inner = collapse_inner
+
+        self.counts = {'watermark_chars': 0, 'page_markers': 0, 'margin_numbers': 0}
+        self.margin_values = Counter()
+        self.lines_read = 0
+
+    def classify(self, stripped):
+        """Name of the filter that drops this (stripped) line, or None to keep it."""
+        if self.classifier is None:
+            return None
+        m = self.classifier.fullmatch(stripped)
+        if m is None:
+            return None
+        kind = m.lastgroup
+        if kind == 'margin_numbers':
+            val = int(stripped)
+            if not (self.margin_min <= val <= self.margin_max):
+                return None
+            self.margin_values[val] += 1
+        return kind
+
+    def filter(self, lines):
+        """Yield the kept lines (rewritten), counting the dropped ones."""
+        classify = self.classify
+        counts = self.counts
+        rewrite = self.strip_trailing or self.strip_leading or self.collapse_inner
+        for line in lines:
+            self.lines_read += 1
+            kind = classify(line.strip())
+            if kind is not None:
+                counts[kind] += 1
+                continue
+            if rewrite:
+                if self.strip_trailing:
+                    line = line.rstrip(' \t')
+                if self.strip_leading:
+                    line = line.lstrip(' \t')
+                if self.collapse_inner and ('  ' in line or '\t' in line):
+                    line = INNER_SPACES_RE.sub(' ', line)
+            yield line
+
+
+def collapse_blank_runs(lines, stats=None):
+    """
+    Drop leading and trailing blank lines and collapse interior runs of >=2
+    blank lines to the first one. stats['blank_lines'] gets the number of
+    interior blank lines removed.
+    """
+    removed = 0
+    started = False
+    pending_blank = None  # first blank of the current run, emitted only if content follows
+    run_extra = 0
+    for line in lines:
+        if line.strip() == '':
+            if not started:
+                continue
+            if pending_blank is None:
+                pending_blank = line
+            else:
+                run_extra += 1
+            continue
+        if pending_blank is not None:
+            yield pending_blank
+            removed += run_extra
+            pending_blank, run_extra = None, 0
+        started = True
+        yield line
+    if stats is not None:
+        stats['blank_lines'] = removed
+
+
+def join_blank_runs(lines, stats=None):
+    """
+    T&F blank-line normalisation (lines keep their '\\n').
+
+    A blank run between two text lines is a MID-PARAGRAPH split if and only
+    if the first non-blank line that follows starts with a LOWERCASE letter
+    ("suffer from...", "et al., 2025"); new paragraphs, headings, captions
+    and references start uppercase. (Joining a reference with its own DOI
+    URL is the one natural exception, and is actually correct.)
+
+    The last content line is held back until the next non-blank line shows
+    which case applies:
+      • next starts LOWERCASE  →  blanks removed, lines joined with one space
+                                  (chains of split lines merge in one pass)
+      • otherwise              →  exactly ONE blank line is kept
+    Leading and trailing blank lines are discarded. stats['blank_lines']
+    gets input lines minus output lines.
+    """
+    n_in = n_out = 0
+    pending = None      # last content line, may still get a continuation joined on
+    blank_run = False
+    for line in lines:
+        n_in += 1
+        stripped = line.strip()
+        if stripped == '':
+            blank_run = True
+            continue
+        if pending is not None:
+            if blank_run and stripped[0].islower():
+                pending = pending.rstrip('\n').rstrip() + ' ' + line.lstrip()
+                blank_run = False
+                continue
+            yield pending
+            n_out += 1
+            if blank_run:
+                yield '\n'
+                n_out += 1
+        pending = line
+        blank_run = False
+    if pending is not None:
+        yield pending
+        n_out += 1
+    if stats is not None:
+        stats['blank_lines'] = n_in - n_out
@@ -0,0 +1,311 @@
+"""
+=============================================================================
+  Shared line-number detection core for the text cleaners
+=============================================================================
+
+Line numbers are recovered as the longest chain of numeric candidates (in
+document order) whose values strictly increase by at most `max_gap` per step.
+The cleaners used an O(n^2) DP over every candidate pair; longest_gap_chain()
+gives the identical chain in O(n log V) with a max segment tree keyed by
+value:
+
+- tree[v] holds the best chain ending at value v seen so far, packed into one
+  integer (chain length, value, -position) so a plain max() applies the DP's
+  tie-breaks: longest chain, then the smallest jump (largest predecessor
+  value), then the earliest predecessor.
+- Candidate i queries the value window [v - max_gap, v - 1] and is inserted
+  at v afterwards, so only earlier candidates are ever seen.
+
+The detected spans are then deleted in ONE pass: spans are sorted once and
+the kept segments are joined, instead of rebuilding the whole document with
+text[:start] + text[end:] per line number (O(n*k) copies). Both cleaners'
+whitespace rules are kept exactly:
+
+- remove_spans              (Elsevier): span + ALL trailing spaces/tabs
+- remove_spans_single_space (AGU)     : span + ONE trailing space/tab, or
+                                        else ONE leading space/tab
+
+Run this file directly to check both algorithms against the reference
+implementations on random documents and to benchmark them.
+=============================================================================
+"""
+
+import random
+import re
+import time
+
+
+def longest_gap_chain_dp(values, max_gap):
+    """Reference O(n^2) DP (the cleaners' original algorithm); returns indices."""
+    n = len(values)
+    if n == 0:
+        return []
+    dp     = [1] * n
+    parent = [-1] * n
+
+    for i in range(1, n):
+        for j in range(i):
+            d = values[i] - values[j]
+            if 0 < d <= max_gap:
+                if dp[j] + 1 > dp[i]:
+                    dp[i]     = dp[j] + 1
+                    parent[i] = j
+                # tie-break: prefer the smaller numeric jump
+                elif dp[j] + 1 == dp[i] and parent[i] != -1:
+                    if d < values[i] - values[parent[i]]:
+                        parent[i] = j
+
+    best_end = max(range(n), key=lambda k: dp[k])
+    seq = []
+    cur = best_end
+    while cur != -1:
+        seq.append(cur)
+        cur = parent[cur]
+    seq.reverse()
+    return seq
+
+
+def longest_gap_chain(values, max_gap):
+    """
+    Indices of the longest chain of strictly increasing values whose steps
+    are all 0 < d <= max_gap, in O(n log V). Same chain (and tie-breaks) as
+    longest_gap_chain_dp. Values must be non-negative integers.
+    """
+    n = len(values)
+    if n == 0:
+        return []
+
+    vmax = max(values)
+    size = 1
+    while size < vmax + 1:
+        size <<= 1
+    tree = [0] * (2 * size)
+
+    # key = (dp, value, pos_mask - index): larger is better on every tie-break
+    pos_bits = n.bit_length()
+    val_bits = vmax.bit_length()
+    pos_mask = (1 << pos_bits) - 1
+    dp_shift = pos_bits + val_bits
+
+    dp     = [1] * n
+    parent = [-1] * n
+    best_end = 0
+
+    for i, v in enumerate(values):
+        lo = v - max_gap
+        if lo < 0:
+            lo = 0
+        best = 0
+        if lo < v:
+            left, right = lo + size, v + size  # query [lo, v - 1]
+            while left < right:
+                if left & 1:
+                    if tree[left] > best:
+                        best = tree[left]
+                    left += 1
+                if right & 1:
+                    right -= 1
+                    if tree[right] > best:
+                        best = tree[right]
+                left >>= 1
+                right >>= 1
+        if best:
+            dp[i]     = (best >> dp_shift) + 1
+            parent[i] = pos_mask - (best & pos_mask)
+        if dp[i] > dp[best_end]:
+            best_end = i
+
+        key = (((dp[i] << val_bits) | v) << pos_bits) | (pos_mask - i)
+        node = v + size
+        while node and tree[node] < key:
+            tree[node] = key
+            node >>= 1
+
+    seq = []
+    cur = best_end
+    while cur != -1:
+        seq.append(cur)
+        cur = parent[cur]
+    seq.reverse()
+    return seq
+
+
+# -----------------------------------------------------------------------------
+#  Span removal
+# -----------------------------------------------------------------------------
+
+HSPACE = (' ', '\t')
+
+
+def remove_spans(text, spans):
+    """
+    Delete each (start, end) span from `text` along with its trailing
+    horizontal whitespace, joining the kept segments once.
+
+    We deliberately consume only TRAILING spaces/tabs (not the preceding
+    space): when the number is at column 1 of a line the preceding char
+    is '\\n' (untouched), and when the number is inline like
+    "line 138 denotes", removing "138 " (number + one trailing space)
+    leaves the natural "line denotes".
+    """
+    n = len(text)
+    pieces = []
+    cursor = 0
+    for start, end in sorted(spans):
+        if start > cursor:
+            pieces.append(text[cursor:start])
+        e = max(end, cursor)
+        while e < n and text[e] in HSPACE:
+            e += 1
+        cursor = e
+    pieces.append(text[cursor:])
+    return ''.join(pieces)
+
+
+def remove_spans_single_space(text, spans):
+    """
+    Delete each (start, end) span; if the character after it (in the text
+    left once later spans are gone) is a space/tab, drop that one as well,
+    otherwise drop one preceding space/tab. Same result as deleting spans
+    back to front, built from kept segments in a single join.
+    """
+    pieces = []  # kept segments, last segment first
+    cursor = len(text)
+    for start, end in sorted(spans, reverse=True):
+        keep = text[end:cursor]
+        if keep:
+            pieces.append(keep)
+        if pieces and pieces[-1][0] in HSPACE:
+            pieces[-1] = pieces[-1][1:]
+            if not pieces[-1]:
+                pieces.pop()
+            cursor = start
+        elif start > 0 and text[start - 1] in HSPACE:
+            cursor = start - 1
+        else:
+            cursor = start
+    pieces.append(text[:cursor])
+    return ''.join(reversed(pieces))
+
+
+def remove_spans_reference(text, spans):
+    """Reference O(n*k) removal (the Elsevier cleaner's original loop)."""
+    for start, end in sorted(spans, key=lambda s: s[0], reverse=True):
+        e = end
+        while e < len(text) and text[e] in HSPACE:
+            e += 1
+        text = text[:start] + text[e:]
+    return text
+
+
+def remove_spans_single_space_reference(text, spans):
+    """Reference O(n*k) removal (the AGU cleaner's original loop)."""
+    for start, end in sorted(spans, key=lambda s: s[0], reverse=True):
+        remove_start, remove_end = start, end
+        if remove_end < len(text) and text[remove_end] in HSPACE:
+            remove_end += 1
+        elif remove_start > 0 and text[remove_start - 1] in HSPACE:
+            remove_start -= 1
+        text = text[:remove_start] + text[remove_end:]
+    return text
+
+
+# -----------------------------------------------------------------------------
+#  Equivalence check + benchmark
+# -----------------------------------------------------------------------------
+
+def synthetic_values(n_lines, noise_ratio, max_gap, value_max, rng):
+    """Candidate values like a proof: a gappy 1..n_lines run mixed with noise."""
+    values = []
+    line = 0
+    while line < n_lines:
+        line += 1 if rng.random() < 0.9 else rng.randint(2, max(2, max_gap))
+        values.append(line)
+        while rng.random() < noise_ratio:
+            values.append(rng.randint(1, value_max))
+    return values
+
+
+def synthetic_document(n_bytes, rng):
+    """Proof-like text: numbered lines, inline numbers, varied spacing."""
+    words = ['the', 'lake', 'ice', 'cover', 'trend', '(2015)', 'R2', '=', '0.98', 'Fig.', '3', 'and']
+    seps = [' ', '  ', '\t', ' \t ']
+    lines = []
+    size = 0
+    line_no = 0
+    while size < n_bytes:
+        line_no += 1
+        body = rng.choice(seps).join(rng.choice(words) for _ in range(rng.randint(0, 12)))
+        line = f"{line_no}{rng.choice(seps)}{body}{rng.choice(['', ' ', '  '])}\n"
+        lines.append(line)
+        size += len(line)
+    return ''.join(lines)
+
+
+def number_spans(text):
+    return [(m.start(), m.end()) for m in re.finditer(r'(?<![\S])\d+(?![\S])', text)]
+
+
+def main():
+    rng = random.Random(0)
+
+    print("Equivalence vs reference DP ...")
+    for trial in range(300):
+        n = rng.randint(0, 300)
+        value_max = rng.choice([5, 30, 500, 9999])
+        max_gap = rng.choice([1, 2, 5, 25, 150])
+        if rng.random() < 0.5:
+            values = [rng.randint(1, value_max) for _ in range(n)]
+        else:
+            values = synthetic_values(n, 0.5, max_gap, value_max, rng)
+        fast = longest_gap_chain(values, max_gap)
+        ref  = longest_gap_chain_dp(values, max_gap)
+        if fast != ref:
+            raise SystemExit(f"MISMATCH (trial {trial}, max_gap={max_gap}): {fast[:10]} vs {ref[:10]}")
+    print("  300 random cases: identical chains")
+
+    print("Benchmark (candidates, DP s, segment tree s):")
+    for n_lines in (10_000, 20_000, 40_000, 400_000):
+        values = synthetic_values(n_lines, 0.6, 150, 9999, rng)
+        t0 = time.perf_counter()
+        fast = longest_gap_chain(values, 150)
+        t_fast = time.perf_counter() - t0
+        if len(values) <= 12_000:  # the DP takes seconds beyond this
+            t0 = time.perf_counter()
+            ref = longest_gap_chain_dp(values, 150)
+            t_dp = f"{time.perf_counter() - t0:8.3f}"
+            assert fast == ref
+        else:
+            t_dp = "   (skip)"
+        print(f"  {len(values):>8} {t_dp} {t_fast:8.3f}")
+
+    print("Span removal equivalence vs reference ...")
+    for trial in range(300):
+        text = synthetic_document(rng.randint(0, 2_000), rng)
+        spans = [s for s in number_spans(text) if rng.random() < 0.7]
+        for fast, ref in ((remove_spans, remove_spans_reference),
+                          (remove_spans_single_space, remove_spans_single_space_reference)):
+            if fast(text, spans) != ref(text, spans):
+                raise SystemExit(f"MISMATCH in {fast.__name__} (trial {trial})")
+    print("  300 random documents: identical output (both whitespace rules)")
+
+    print("Span removal benchmark (doc MB, spans, reference s, single join s):")
+    for mb in (1, 10):
+        text = synthetic_document(mb * 1_000_000, rng)
+        spans = number_spans(text)
+        for fast, ref in ((remove_spans, remove_spans_reference),
+                          (remove_spans_single_space, remove_spans_single_space_reference)):
+            t0 = time.perf_counter()
+            out = fast(text, spans)
+            t_fast = time.perf_counter() - t0
+            if mb == 1:
+                t0 = time.perf_counter()
+                assert ref(text, spans) == out
+                t_ref = f"{time.perf_counter() - t0:8.2f}"
+            else:
+                t_ref = "   (skip)"  # minutes of string copies at 10 MB
+            print(f"  {fast.__name__:<26} {mb:>3} {len(spans):>8} {t_ref} {t_fast:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
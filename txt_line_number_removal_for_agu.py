@@ -1,18 +1,22 @@
 import re
 import os
 
+from text_encoding import read_text
+from txt_line_number_core import longest_gap_chain, remove_spans_single_space
+
 # ==========================================
 # --- SET YOUR PARAMETERS HERE ---
 # ==========================================
 INPUT_FILE = r"C:\Users\arsha\OneDrive\Desktop\content.txt"
 LAST_LINE_NUMBER = 995
 MAX_GAP = 25  # Maximum expected missing consecutive line numbers (e.g., due to figures/tables)
+ENCODINGS = ['utf-8', 'cp1252']  # tried in order after a BOM check
 # ==========================================
 
-def remove_line_numbers_dp(text: str, max_line_number: int, max_gap: int) -> str:
+def find_line_number_spans(text: str, max_line_number: int, max_gap: int):
     """
-    Removes sequence-based line numbers from a document using Dynamic Programming 
-    to find the Longest Increasing Subsequence (LIS) of numeric candidates.
+    (spans, values) of the sequence-based line numbers: the gap-constrained
+    Longest Increasing Subsequence (LIS) of numeric candidates (txt_line_number_core).
     """
     # 1. Extract all numeric candidates <= the max line number
     # \b ensures we get distinct integers, even if attached to soft hyphens
@@ -28,49 +32,24 @@ def remove_line_numbers_dp(text: str, max_line_number: int, max_gap: int) -> str
             })
     
     if not candidates:
+        return [], []
+
+    # 2-4. Longest strictly increasing chain with steps within the gap tolerance;
+    # ties prefer the smaller numerical gap (O(n log V) segment tree instead of
+    # the O(n^2) pairwise DP, identical result)
+    seq_indices = longest_gap_chain([c['val'] for c in candidates], max_gap)
+
+    spans = [(candidates[idx]['start'], candidates[idx]['end']) for idx in seq_indices]
+    values = [candidates[idx]['val'] for idx in seq_indices]
+    return spans, values
+
+
+def print_qa_report(identified_numbers, max_line_number):
+    """QA/QC summary of the identified line-number sequence."""
+    if not identified_numbers:
         print("No numeric candidates found in the document.")
-        return text
-        
-    n = len(candidates)
-    dp = [1] * n
-    parent = [-1] * n
-    
-    # 2. Dynamic Programming to map the optimal sequence path
-    for i in range(1, n):
-        for j in range(i):
-            val_diff = candidates[i]['val'] - candidates[j]['val']
-            
-            # Valid connection: Strictly increasing, but within the expected gap tolerance
-            if 0 < val_diff <= max_gap:
-                if dp[j] + 1 > dp[i]:
-                    dp[i] = dp[j] + 1
-                    parent[i] = j
-                # Tie-breaker: If sequence lengths are equal, prefer the one with the smaller numerical gap
-                elif dp[j] + 1 == dp[i]:
-                    old_val_diff = candidates[i]['val'] - candidates[parent[i]]['val']
-                    if val_diff < old_val_diff:
-                        parent[i] = j
-
-    # 3. Find the endpoint of the longest valid sequence
-    max_len = 0
-    best_end = -1
-    for i in range(n):
-        if dp[i] > max_len:
-            max_len = dp[i]
-            best_end = i
-            
-    # 4. Reconstruct the sequence mathematically
-    seq_indices = []
-    curr = best_end
-    while curr != -1:
-        seq_indices.append(curr)
-        curr = parent[curr]
-        
-    seq_indices.reverse()
-    
-    identified_numbers = [candidates[idx]['val'] for idx in seq_indices]
-    
-    # --- QA/QC Built-in Checks ---
+        return
+
     print("\n--- QA/QC Report ---")
     print(f"Total line numbers identified and flagged for removal: {len(identified_numbers)}")
     print(f"Sequence span: {identified_numbers[0]} to {identified_numbers[-1]}")
@@ -86,39 +65,60 @@ def remove_line_numbers_dp(text: str, max_line_number: int, max_gap: int) -> str
         print(f"Note: {len(missing)} line numbers were skipped/missing in the sequence (likely obscured by figures or poor PDF extraction).")
     print("--------------------\n")
 
-    # 5. Remove the identified numbers safely
-    # We delete from back to front so character indices don't shift during processing
-    spans_to_remove = [(candidates[idx]['start'], candidates[idx]['end']) for idx in seq_indices]
-    spans_to_remove.sort(key=lambda x: x[0], reverse=True)
-    
-    clean_text = text
-    for start, end in spans_to_remove:
-        remove_start = start
-        remove_end = end
-        
-        # Context-aware space removal:
-        # Prevent leaving behind double spaces if the number was surrounded by spaces
-        if remove_end < len(clean_text) and clean_text[remove_end] in (' ', '\t'):
-            remove_end += 1
-        elif remove_start > 0 and clean_text[remove_start - 1] in (' ', '\t'):
-            remove_start -= 1
-            
-        clean_text = clean_text[:remove_start] + clean_text[remove_end:]
-        
-    return clean_text
+
+def remove_line_numbers_dp(text: str, max_line_number: int, max_gap: int) -> str:
+    """
+    Removes sequence-based line numbers from a document by finding the gap-constrained
+    Longest Increasing Subsequence (LIS) of numeric candidates (txt_line_number_core).
+    """
+    spans_to_remove, identified_numbers = find_line_number_spans(text, max_line_number, max_gap)
+
+    # --- QA/QC Built-in Checks ---
+    print_qa_report(identified_numbers, max_line_number)
+
+    # 5. Remove the identified numbers safely, in one pass over kept segments
+    # Context-aware space removal: drop one trailing space/tab, else one leading
+    # one, so no double spaces are left behind
+    return remove_spans_single_space(text, spans_to_remove)
+
+
+def clean_document(input_file, output_file=None, max_line_number=LAST_LINE_NUMBER,
+                   max_gap=MAX_GAP, encodings=None, verbose=True, decoded=None):
+    """
+    Clean one file; returns a dict of removal counts (used by txt_batch_clean.py).
+    `decoded` = (text, encoding) from read_text() skips reading input_file again.
+    """
+    if output_file is None:
+        output_file = input_file.replace(".txt", "_cleaned.txt")
+    raw_text, encoding = decoded if decoded is not None else read_text(input_file, encodings or ENCODINGS)
+    if encoding is None:
+        raise ValueError(f"Could not decode {input_file} with any of {encodings or ENCODINGS}")
+
+    spans, values = find_line_number_spans(raw_text, max_line_number, max_gap)
+    if verbose:
+        print_qa_report(values, max_line_number)
+    cleaned_text = remove_spans_single_space(raw_text, spans)
+
+    with open(output_file, 'w', encoding='utf-8', errors='ignore') as file:
+        file.write(cleaned_text)
+
+    return {
+        'encoding': encoding,
+        'line_numbers': len(values),
+        'line_number_range': [values[0], values[-1]] if values else None,
+    }
 
 # --- MAIN EXECUTION ---
 if __name__ == "__main__":
     
     try:
-        with open(INPUT_FILE, 'r', encoding='utf-8') as file:
-            raw_text = file.read()
-    except UnicodeDecodeError:
-        with open(INPUT_FILE, 'r', encoding='cp1252') as file:
-            raw_text = file.read()
+        raw_text, encoding = read_text(INPUT_FILE, ENCODINGS)
     except FileNotFoundError:
         print(f"Error: Could not find the file at {INPUT_FILE}")
         exit()
+    if encoding is None:
+        print(f"Error: Could not decode {INPUT_FILE} with any of {ENCODINGS}")
+        exit()
 
     print(f"Processing file to extract line sequence up to {LAST_LINE_NUMBER}...")
 
@@ -21,6 +21,10 @@ import os
 import sys
 from collections import Counter
 
+from text_encoding import read_text
+from txt_line_filter import LineFilter, collapse_blank_runs
+from txt_line_number_core import longest_gap_chain, remove_spans
+
 # =============================================================================
 #  CONFIGURATION  — edit these before running
 # =============================================================================
@@ -68,25 +72,14 @@ COLLAPSE_INNER_SPACES  = True   # "in  the  SO" -> "in the SO" (PDF justify fix)
 NORMALIZE_BLANK_LINES  = True   # collapse N>=2 blank lines to a single blank
 
 # --- Encoding detection ---
-ENCODINGS = ['utf-8', 'utf-8-sig', 'cp1252', 'latin-1']
+# A BOM (UTF-8/16/32) wins; otherwise the first of these that decodes the file.
+ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
 
 # =============================================================================
 #  IMPLEMENTATION
 # =============================================================================
 
 
-def detect_encoding(filepath, encodings):
-    """Return the first encoding that decodes the whole file without error."""
-    for enc in encodings:
-        try:
-            with open(filepath, 'r', encoding=enc) as f:
-                f.read()
-            return enc
-        except (UnicodeDecodeError, LookupError):
-            continue
-    return None
-
-
 # -----------------------------------------------------------------------------
 #  Mechanism 1 — line numbers via Longest Increasing Subsequence
 # -----------------------------------------------------------------------------
@@ -142,58 +135,15 @@ def find_line_number_spans(text, value_max, max_gap, skip_leading_zero):
     if not candidates:
         return [], []
 
-    n = len(candidates)
-    dp     = [1] * n
-    parent = [-1] * n
-
-    for i in range(1, n):
-        for j in range(i):
-            d = candidates[i]['val'] - candidates[j]['val']
-            if 0 < d <= max_gap:
-                if dp[j] + 1 > dp[i]:
-                    dp[i]     = dp[j] + 1
-                    parent[i] = j
-                # tie-break: prefer the smaller numeric jump
-                elif dp[j] + 1 == dp[i] and parent[i] != -1:
-                    old_d = candidates[i]['val'] - candidates[parent[i]]['val']
-                    if d < old_d:
-                        parent[i] = j
-
-    # endpoint of the longest path
-    best_end = max(range(n), key=lambda k: dp[k])
-
-    seq = []
-    cur = best_end
-    while cur != -1:
-        seq.append(cur)
-        cur = parent[cur]
-    seq.reverse()
+    # Longest chain with 0 < jump <= max_gap, ties -> smallest jump
+    # (O(n log V) segment tree, same result as the pairwise DP)
+    seq = longest_gap_chain([c['val'] for c in candidates], max_gap)
 
     spans  = [(candidates[i]['start'], candidates[i]['end']) for i in seq]
     values = [candidates[i]['val'] for i in seq]
     return spans, values
 
 
-def remove_spans(text, spans):
-    """
-    Delete each (start, end) span from `text` along with its trailing
-    horizontal whitespace.  Processed back-to-front so earlier offsets stay
-    valid as later text shrinks.
-
-    We deliberately consume only TRAILING spaces/tabs (not the preceding
-    space): when the number is at column 1 of a line the preceding char
-    is '\\n' (untouched), and when the number is inline like
-    "line 138 denotes", removing "138 " (number + one trailing space)
-    leaves the natural "line denotes".
-    """
-    for start, end in sorted(spans, key=lambda s: s[0], reverse=True):
-        e = end
-        while e < len(text) and text[e] in (' ', '\t'):
-            e += 1
-        text = text[:start] + text[e:]
-    return text
-
-
 # -----------------------------------------------------------------------------
 #  Mechanism 2 — soft hyphens
 # -----------------------------------------------------------------------------
@@ -219,80 +169,11 @@ def fix_soft_hyphens(text):
 
 
 # -----------------------------------------------------------------------------
-#  Mechanism 3/4 — line-level filters
+#  Mechanism 3/4 + whitespace + blank-line normalisation
 # -----------------------------------------------------------------------------
-
-def is_watermark_line(stripped):
-    """A line whose entire content is a single A–Z / a–z character."""
-    return bool(re.fullmatch(r'[A-Za-z]', stripped))
-
-
-def is_page_marker_line(stripped):
-    """Lines like 'Page 5 of 47', case-insensitive, full-line only."""
-    return bool(re.fullmatch(r'page\s+\d+\s+of\s+\d+', stripped, re.IGNORECASE))
-
-
-# -----------------------------------------------------------------------------
-#  Whitespace + blank-line normalisation
-# -----------------------------------------------------------------------------
-
-def normalize_lines(
-    text,
-    *,
-    strip_trailing,
-    strip_leading,
-    collapse_inner,
-    drop_watermark,
-    drop_page_markers,
-):
-    """One linear pass that performs the per-line cleaning steps and the
-    line-level filters in a single traversal."""
-    counts = {'watermark_chars': 0, 'page_markers': 0}
-    out = []
-    for line in text.split('\n'):
-        if strip_trailing:
-            line = line.rstrip(' \t')
-        if strip_leading:
-            line = line.lstrip(' \t')
-        if collapse_inner:
-            line = re.sub(r'[ \t]{2,}', ' ', line)
-
-        s = line.strip()
-        if drop_watermark and is_watermark_line(s):
-            counts['watermark_chars'] += 1
-            continue
-        if drop_page_markers and is_page_marker_line(s):
-            counts['page_markers'] += 1
-            continue
-
-        out.append(line)
-
-    return '\n'.join(out), counts
-
-
-def collapse_blank_runs(text):
-    """Collapse any run of >=2 blank lines down to exactly one blank line.
-    Also strips leading and trailing blank lines from the document."""
-    lines = text.split('\n')
-
-    # strip leading blanks
-    while lines and lines[0].strip() == '':
-        lines.pop(0)
-    # strip trailing blanks
-    while lines and lines[-1].strip() == '':
-        lines.pop()
-
-    out = []
-    prev_blank = False
-    removed = 0
-    for line in lines:
-        blank = (line.strip() == '')
-        if blank and prev_blank:
-            removed += 1
-            continue
-        out.append(line)
-        prev_blank = blank
-    return '\n'.join(out), removed
+#  Handled by the shared line filter engine (txt_line_filter.py): one
+#  precompiled alternation regex classifies each line in a single scan, kept
+#  lines are rewritten, and collapse_blank_runs streams over the result.
 
 
 # =============================================================================
@@ -316,16 +197,17 @@ def clean_document(
     normalize_blank_lines  = NORMALIZE_BLANK_LINES,
     encodings              = None,
     verbose                = True,
+    decoded                = None,
 ):
     if encodings is None:
         encodings = ENCODINGS
 
     # ---- Read ---------------------------------------------------------------
-    enc = detect_encoding(input_file, encodings)
+    # One read + one decode: the detected text is used directly; `decoded`
+    # ((text, encoding) from read_text, e.g. txt_batch_clean.py) skips the read
+    text, enc = decoded if decoded is not None else read_text(input_file, encodings)
     if enc is None:
         sys.exit(f"ERROR: Could not decode {input_file!r} with any of {encodings}")
-    with open(input_file, 'r', encoding=enc, errors='replace') as f:
-        text = f.read()
 
     original_chars  = len(text)
     original_lines  = text.count('\n') + (0 if text.endswith('\n') else 1)
@@ -350,31 +232,46 @@ def clean_document(
         soft_hyphen_count = text.count('\u00ad')
         text = fix_soft_hyphens(text)
 
-    # ---- 3+4 + per-line cleanup --------------------------------------------
-    text, line_filter_counts = normalize_lines(
-        text,
+    # ---- 3+4 + per-line cleanup (one classifying scan per line) ------------
+    line_filter = LineFilter(
+        drop_watermark    = remove_watermark_lines,
+        drop_page_markers = remove_page_markers,
         strip_trailing    = strip_trailing_ws,
         strip_leading     = strip_leading_ws,
         collapse_inner    = collapse_inner_spaces,
-        drop_watermark    = remove_watermark_lines,
-        drop_page_markers = remove_page_markers,
     )
+    lines = line_filter.filter(text.split('\n'))
+    del text
 
     # ---- Blank-line normalisation ------------------------------------------
-    blanks_collapsed = 0
+    blank_stats = {'blank_lines': 0}
     if normalize_blank_lines:
-        text, blanks_collapsed = collapse_blank_runs(text)
+        lines = collapse_blank_runs(lines, blank_stats)
 
-    if not text.endswith('\n'):
-        text += '\n'
-
-    # ---- Write --------------------------------------------------------------
+    # ---- Write (streamed; output always ends with a newline) ----------------
+    final_chars = 0
+    final_lines = 0
+    n_written = 0
+    last = None
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(text)
+        for line in lines:
+            if n_written:
+                f.write('\n')
+                final_chars += 1
+                final_lines += 1
+            f.write(line)
+            final_chars += len(line)
+            n_written += 1
+            last = line
+        if not (n_written >= 2 and last == ''):
+            f.write('\n')
+            final_chars += 1
+            final_lines += 1
+    line_filter_counts = line_filter.counts
+    blanks_collapsed = blank_stats['blank_lines']
 
     # ---- Report -------------------------------------------------------------
     if verbose:
-        final_lines = text.count('\n')
         bar = '─' * 60
         print(bar)
         print(f"  Input  : {input_file}")
@@ -400,11 +297,21 @@ def clean_document(
         print(f"  'Page X of Y' lines     : {line_filter_counts['page_markers']:>7}")
         print(f"  Blank lines collapsed   : {blanks_collapsed:>7}")
         print(bar)
-        print(f"  Final size              : {len(text):>7} chars,"
+        print(f"  Final size              : {final_chars:>7} chars,"
               f" {final_lines:>4} lines")
         print(bar)
         print("  Done.")
 
+    return {
+        'encoding':          enc,
+        'line_numbers':      len(line_no_values),
+        'line_number_range': [line_no_values[0], line_no_values[-1]] if line_no_values else None,
+        'soft_hyphens':      soft_hyphen_count,
+        'watermark_chars':   line_filter_counts['watermark_chars'],
+        'page_markers':      line_filter_counts['page_markers'],
+        'blank_lines':       blanks_collapsed,
+    }
+
 
 # =============================================================================
 #  Entry point
@@ -1,8 +1,11 @@
-import re
+import io
 import os
 import sys
 from collections import Counter
 
+from text_encoding import detect_stream_encoding, read_text
+from txt_line_filter import NUMBER_RE, LineFilter, join_blank_runs
+
 # =============================================================================
 #  CONFIGURATION  — edit these before running
 # =============================================================================
@@ -36,22 +39,16 @@ REMOVE_PAGE_MARKERS = True
 # one blank line.
 NORMALIZE_BLANK_LINES = True
 
-# --- Encodings to try, in order ---
-ENCODINGS = ['utf-8', 'utf-8-sig', 'cp1252', 'latin-1']
-
-# =============================================================================
+# --- Encodings to try, in order (a UTF-8/16/32 BOM always wins) ---
+ENCODINGS = ['utf-8', 'cp1252', 'latin-1']
 
+# --- Streaming mode ---
+# True: constant memory — the file is read twice (pass 1 counts standalone
+# integers, pass 2 filters and writes line by line) and never held in memory.
+# False: the file is read and decoded once into memory (faster on small files).
+STREAM_INPUT = True
 
-def detect_encoding(filepath, encodings):
-    """Try each encoding in order; return the first one that works."""
-    for enc in encodings:
-        try:
-            with open(filepath, 'r', encoding=enc) as f:
-                f.read()
-            return enc
-        except (UnicodeDecodeError, LookupError):
-            continue
-    return None
+# =============================================================================
 
 
 def detect_margin_number_range(lines, min_occurrences):
@@ -73,7 +70,7 @@ def detect_margin_number_range(lines, min_occurrences):
     value_counts = Counter()
     for line in lines:
         stripped = line.strip()
-        if re.fullmatch(r'\d+', stripped):
+        if NUMBER_RE.fullmatch(stripped):
             value_counts[int(stripped)] += 1
 
     if not value_counts:
@@ -91,104 +88,6 @@ def detect_margin_number_range(lines, min_occurrences):
     return range_min, range_max
 
 
-def is_watermark_line(stripped):
-    """
-    True if the line is a single alphabetic character — the hallmark of a
-    diagonal PDF watermark fragment.
-
-    Why safe: legitimate prose never has a lone letter on its own line.
-    Covers any watermark text: "For Peer Review", "Confidential", "Draft",
-    "Do Not Distribute", etc. — they all produce isolated single characters.
-    """
-    return bool(re.fullmatch(r'[A-Za-z]', stripped))
-
-
-def is_page_marker_line(stripped):
-    """
-    True for lines like "Page 5 of 47", "page 12 of 100", "PAGE 3 OF 20".
-    Anchored to the full line, so "described on Page 5 of 47" is kept.
-    """
-    return bool(re.fullmatch(r'page\s+\d+\s+of\s+\d+', stripped, re.IGNORECASE))
-
-
-def normalize_blank_lines(lines):
-    """
-    Mechanism 4 — fix the blank lines left behind after mechanisms 1–3.
-
-    Core insight
-    ------------
-    A blank run between two text lines is a MID-PARAGRAPH split if and only
-    if the first non-blank line that follows starts with a LOWERCASE letter.
-
-    This is the most reliable signal in English prose:
-      - A sentence continuing within a paragraph starts with lowercase
-        ("suffer from...", "et al., 2025", "optical imagery...", etc.)
-      - A new paragraph, heading, figure caption, reference entry, or formula
-        always starts with an uppercase letter.
-
-    The one natural exception is URLs ("https://...") — but joining a
-    reference line with its own DOI URL is actually CORRECT behaviour, because
-    in a reference list the DOI immediately follows the citation details.
-
-    Algorithm
-    ---------
-    Scan linearly; when a blank run is encountered:
-      • Next line starts LOWERCASE  →  remove all blanks, join the previous
-        content line and the next line with a single space (cascades correctly
-        because after joining, i advances to the NEXT blank/content, so a
-        chain of split lines gets progressively merged in one pass).
-      • Next line starts UPPERCASE  →  keep exactly ONE blank line.
-    Trailing blank lines at the end of the file are discarded.
-    Leading blank lines at the top of the file are discarded.
-    """
-    result = []
-    i = 0
-
-    while i < len(lines):
-        line = lines[i]
-
-        if line.strip() == '':
-            # ── Collect the entire consecutive blank run ──
-            while i < len(lines) and lines[i].strip() == '':
-                i += 1
-
-            if i >= len(lines):
-                # Trailing blanks — discard silently
-                break
-
-            next_line  = lines[i]
-            next_strip = next_line.strip()
-
-            if next_strip and next_strip[0].islower():
-                # ── Mid-paragraph continuation ──
-                # Join the previous content line with next_line, no blank between.
-                if result and result[-1].strip():
-                    prev   = result.pop()
-                    joined = prev.rstrip('\n').rstrip() + ' ' + next_line.lstrip()
-                    result.append(joined)
-                    i += 1  # next_line has been consumed into the join
-                else:
-                    # Nothing to join to (e.g. blank at top of file) —
-                    # keep one blank and let next_line be processed normally.
-                    result.append('\n')
-                    # Do NOT advance i; next_line is processed next iteration.
-            else:
-                # ── Legitimate paragraph / section break ──
-                # Collapse the entire blank run to exactly one blank line.
-                result.append('\n')
-                # Do NOT advance i; next_line is processed next iteration.
-
-        else:
-            result.append(line)
-            i += 1
-
-    # Remove any blank lines that remain at the very top of the document
-    while result and result[0].strip() == '':
-        result.pop(0)
-
-    return result
-
-
 def clean_document(
     input_file,
     output_file=None,
@@ -200,6 +99,8 @@ def clean_document(
     normalize_blanks=NORMALIZE_BLANK_LINES,
     encodings=None,
     verbose=True,
+    stream=STREAM_INPUT,
+    decoded=None,
 ):
     """
     Clean a plain-text document by applying four independent mechanisms:
@@ -221,6 +122,10 @@ def clean_document(
     remove_page_markers: bool      Strip "Page X of Y" lines.
     normalize_blanks  : bool       Run mechanism 4.
     encodings         : list|None  Encodings to attempt in order.
+    stream            : bool       Two streaming passes over the file instead
+                                   of loading it (constant memory).
+    decoded           : tuple|None (text, encoding) from text_encoding.read_text;
+                                   input_file is then not read (no streaming).
     verbose           : bool       Print a detailed summary report.
     """
 
@@ -232,20 +137,33 @@ def clean_document(
         base, ext = os.path.splitext(input_file)
         output_file = f"{base}_clean{ext}"
 
-    # ── Detect encoding ──
-    enc = detect_encoding(input_file, encodings)
+    # ── Detect encoding; in memory the file is read and decoded once ──
+    if decoded is not None:
+        text, enc = decoded
+        stream = False
+    elif stream:
+        enc = detect_stream_encoding(input_file, encodings)
+    else:
+        text, enc = read_text(input_file, encodings)
     if enc is None:
         print("ERROR: Could not decode the file with any of the tried encodings:", encodings)
         sys.exit(1)
     if verbose:
         print(f"Encoding detected        : {enc!r}")
 
-    # ── Read file ──
-    with open(input_file, 'r', encoding=enc, errors='replace') as f:
-        lines = f.readlines()
+    if stream:
+        # Pass 1 (margin counts) and pass 2 (filter + write) each re-open the
+        # file; lines are split like readlines()
+        def read_lines():
+            with open(input_file, 'r', encoding=enc, errors='replace') as f:
+                yield from f
+    else:
+        # Split into lines (on '\n' only, like readlines())
+        lines = io.StringIO(text).readlines()
+        del text
 
-    if verbose:
-        print(f"Total lines read         : {len(lines)}")
+        def read_lines():
+            return iter(lines)
 
     # ── Mechanism 1: detect margin line number range ──
     if force_min is not None and force_max is not None:
@@ -253,7 +171,7 @@ def clean_document(
         if verbose:
             print(f"Margin range (manual)    : {range_min} – {range_max}")
     else:
-        range_min, range_max = detect_margin_number_range(lines, min_occurrences)
+        range_min, range_max = detect_margin_number_range(read_lines(), min_occurrences)
         if range_min is None:
             if verbose:
                 print("Margin numbers           : none detected "
@@ -264,48 +182,34 @@ def clean_document(
             if verbose:
                 print(f"Margin range (auto)      : {range_min} – {range_max}")
 
-    # ── Mechanisms 1–3: line-by-line filtering ──
-    output_lines = []
-    counts = {
-        'margin_numbers':  0,
-        'watermark_chars': 0,
-        'page_markers':    0,
-        'blank_lines':     0,
-    }
-    removed_margin_values = Counter()
-
-    for line in lines:
-        stripped = line.strip()
-
-        # Mechanism 1 — margin line number
-        if range_min is not None and re.fullmatch(r'\d+', stripped):
-            val = int(stripped)
-            if range_min <= val <= range_max:
-                counts['margin_numbers'] += 1
-                removed_margin_values[val] += 1
-                continue
-
-        # Mechanism 2 — watermark single-character line
-        if remove_watermark and is_watermark_line(stripped):
-            counts['watermark_chars'] += 1
-            continue
-
-        # Mechanism 3 — page marker
-        if remove_page_markers and is_page_marker_line(stripped):
-            counts['page_markers'] += 1
-            continue
-
-        output_lines.append(line)
+    # ── Mechanisms 1–3: line filtering (txt_line_filter engine, one
+    #    precompiled regex classifies each line in a single scan) ──
+    line_filter = LineFilter(
+        drop_watermark=remove_watermark,
+        drop_page_markers=remove_page_markers,
+        margin_range=(range_min, range_max),
+    )
+    output_lines = line_filter.filter(read_lines())
 
-    # ── Mechanism 4: blank line normalisation ──
+    # ── Mechanism 4: blank line normalisation (see join_blank_runs) ──
+    blank_stats = {'blank_lines': 0}
     if normalize_blanks:
-        lines_before = len(output_lines)
-        output_lines  = normalize_blank_lines(output_lines)
-        counts['blank_lines'] = lines_before - len(output_lines)
+        output_lines = join_blank_runs(output_lines, blank_stats)
 
-    # ── Write output ──
+    # ── Write output (streamed through the generator pipeline) ──
+    n_output_lines = 0
     with open(output_file, 'w', encoding='utf-8') as f:
-        f.writelines(output_lines)
+        for line in output_lines:
+            f.write(line)
+            n_output_lines += 1
+
+    counts = {
+        'margin_numbers':  line_filter.counts['margin_numbers'],
+        'watermark_chars': line_filter.counts['watermark_chars'],
+        'page_markers':    line_filter.counts['page_markers'],
+        'blank_lines':     blank_stats['blank_lines'],
+    }
+    removed_margin_values = line_filter.margin_values
 
     # ── Verbose report ──
     if verbose:
@@ -333,11 +237,18 @@ def clean_document(
         print(f"{'─' * 48}")
         total = sum(counts.values())
         print(f"  Total lines removed          : {total}")
-        print(f"  Lines in output              : {len(output_lines)}")
+        print(f"  Lines read                   : {line_filter.lines_read}")
+        print(f"  Lines in output              : {n_output_lines}")
         print(f"{'─' * 48}")
         print(f"\n  Output saved to: {output_file}")
         print("  Done.\n")
 
+    return {
+        'encoding':     enc,
+        'margin_range': [range_min, range_max] if range_min is not None else None,
+        **counts,
+    }
+
 
 # =============================================================================
 #  Entry point